@@ -0,0 +1,84 @@
+"""
+Memory and throughput comparison of the Person and CompactPerson agent types.
+
+Usage:
+    python benchmark_agents.py [num_agents]
+"""
+import contextlib
+import io
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from navigation import ExitNavigationField
+from population import CompactPerson, PathCursor
+from simulation import Person, FireSimulator, ALERT_DISTANCE
+
+
+def make_grid(size=200):
+    """Open floor with a border wall, a row of rooms and two exits."""
+    grid = np.zeros((size, size), dtype=np.int32)
+    grid[0, :] = grid[-1, :] = grid[:, 0] = grid[:, -1] = 1
+    for x in range(40, size, 40):
+        grid[1:size // 2, x] = 1
+        grid[size // 4 - 2:size // 4 + 2, x] = 2  # Door into the next room
+    exits = [(size // 2, 0), (size - 1, size // 2)]
+    for x, y in exits:
+        grid[y, x] = 0
+    return grid, exits
+
+
+def measure_memory(agent_class, positions):
+    """Bytes allocated per agent for freshly created agents."""
+    tracemalloc.start()
+    agents = [agent_class(position=pos) for pos in positions]
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return allocated / len(agents)
+
+
+def measure_steps(agent_class, grid, exits, positions, steps=100):
+    """Seconds spent in agent updates (fire excluded) while walking full exit paths."""
+    np.random.seed(0)
+    fire_sim = FireSimulator(grid)
+    fire_sim.reset(ignition_points=[(grid.shape[0] // 2, grid.shape[1] // 2)])
+    field = ExitNavigationField(grid, exits, fire_sim.fire_map)
+    agents = [agent_class(position=pos) for pos in positions]
+    for agent in agents:
+        # Whole route up front, as an A* plan would be
+        path = field.path_from(agent.pos, grid.size)
+        agent.path = path if agent_class is Person else PathCursor(path)
+    elapsed = 0.0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(steps):
+            fire_sim.step()
+            fire_distance = fire_sim.fire_distance(ALERT_DISTANCE)
+            start = time.perf_counter()
+            for agent in agents:
+                if agent.status == 'evacuating':
+                    agent.update_state(fire_sim.fire_map, fire_distance)
+                    agent.move(grid, fire_sim.fire_map)
+                    agent.check_status(fire_sim.fire_map, exits)
+            elapsed += time.perf_counter() - start
+    return elapsed, sum(agent.status == 'escaped' for agent in agents)
+
+
+def main():
+    num_agents = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    grid, exits = make_grid()
+    free = np.argwhere(grid == 0)
+    rng = np.random.default_rng(0)
+    positions = [(int(x), int(y)) for y, x in free[rng.choice(len(free), num_agents)]]
+
+    print(f"{num_agents} agents on a {grid.shape[0]}x{grid.shape[1]} grid")
+    for agent_class in (Person, CompactPerson):
+        memory = measure_memory(agent_class, positions)
+        elapsed, escaped = measure_steps(agent_class, grid, exits, positions)
+        print(f"{agent_class.__name__:>14}: {memory:5.0f} bytes/agent, "
+              f"{elapsed:6.2f} s for 100 steps, {escaped} escaped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import base64
+import json
+import struct
+import zlib
+from itertools import chain
+
+import numpy as np
+
+from population import STATUS_NAMES, STATE_NAMES
+
+# File layout:
+#   MAGIC (8 bytes) | header length (uint32, little-endian) | header (UTF-8 JSON) | array data
+# The header lists every array with its dtype, shape and the offset/length of its
+# zlib-compressed bytes, counted from the start of the array data. Arrays are
+# compressed independently, so a client can fetch the header with one Range request
+# and then only the arrays it needs.
+MAGIC = b"BFPSIM\x00\x01"
+BINARY_RESULT_VERSION = 1
+COMPRESSION_LEVEL = 6
+
+
+def encode_binary_result(history, ignition_step, metadata=None, num_frames=None):
+    """
+    Pack an animation history into the binary result format.
+
+    Args:
+        history: Frames with an "agents" list ({"pos": [row, col], "status", "state", "tripped"}),
+            any iterable when num_frames is given
+        ignition_step: (rows, cols) int16 raster of the first frame each cell burns in (-1 = never)
+        metadata: Optional JSON-serializable dict stored in the header
+        num_frames: Number of frames in history, if it has no len() (e.g. a spool reader)
+
+    Returns:
+        bytes
+    """
+    status_codes = {name: code for code, name in enumerate(STATUS_NAMES)}
+    state_codes = {name: code for code, name in enumerate(STATE_NAMES)}
+    if num_frames is None:
+        num_frames = len(history)
+    frames = iter(history)
+    first = next(frames, None)
+    num_agents = len(first["agents"]) if first is not None else 0
+
+    positions = np.zeros((num_frames, num_agents, 2), dtype='<i2')  # [row, col]
+    status = np.zeros((num_frames, num_agents), dtype=np.uint8)
+    state = np.zeros((num_frames, num_agents), dtype=np.uint8)
+    tripped = np.zeros((num_frames, num_agents), dtype=np.uint8)
+    for t, frame in enumerate(chain([first], frames) if first is not None else ()):
+        agents = frame["agents"]
+        positions[t] = [agent["pos"] for agent in agents]
+        status[t] = [status_codes[agent["status"]] for agent in agents]
+        state[t] = [state_codes[agent["state"]] for agent in agents]
+        tripped[t] = [agent["tripped"] for agent in agents]
+
+    arrays = {
+        "positions": positions,
+        "status": status,
+        "state": state,
+        "tripped": tripped,
+        "ignition_step": np.asarray(ignition_step, dtype='<i2'),
+    }
+    entries, blobs, offset = [], [], 0
+    for name, array in arrays.items():
+        blob = zlib.compress(np.ascontiguousarray(array).tobytes(), COMPRESSION_LEVEL)
+        entries.append({
+            "name": name,
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+            "length": len(blob),
+            "compression": "zlib",
+        })
+        blobs.append(blob)
+        offset += len(blob)
+
+    header = json.dumps({
+        "version": BINARY_RESULT_VERSION,
+        "metadata": metadata or {},
+        "status_names": list(STATUS_NAMES),
+        "state_names": list(STATE_NAMES),
+        "arrays": entries,
+    }).encode("utf-8")
+    return b"".join([MAGIC, struct.pack("<I", len(header)), header] + blobs)
+
+
+def decode_binary_result(data):
+    """
+    Read a binary result back into its header and NumPy arrays.
+
+    Returns:
+        (header dict, {name: array})
+    """
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a binary simulation result")
+    (header_length,) = struct.unpack_from("<I", data, len(MAGIC))
+    start = len(MAGIC) + 4
+    header = json.loads(data[start:start + header_length].decode("utf-8"))
+    data_start = start + header_length
+    arrays = {}
+    for entry in header["arrays"]:
+        blob = data[data_start + entry["offset"]:data_start + entry["offset"] + entry["length"]]
+        arrays[entry["name"]] = np.frombuffer(zlib.decompress(blob), dtype=entry["dtype"]).reshape(entry["shape"])
+    return header, arrays
+
+
+def ignition_raster_from_result(animation_data):
+    """Ignition-step raster of an 'ignition_raster' animation_data entry, in either encoding."""
+    raster = animation_data["ignition_step"]
+    if isinstance(raster, dict):
+        flat = np.frombuffer(base64.b64decode(raster["data"]), dtype='<i2')
+        return flat.reshape(animation_data["grid_shape"])
+    return np.array(raster, dtype=np.int16)
+
+
+def parse_byte_range(range_header, size):
+    """
+    Parse a single-range HTTP Range header ("bytes=start-end", "bytes=start-" or "bytes=-suffix").
+
+    Returns:
+        (start, end) inclusive, or None to send the whole body. Headers that are not
+        a valid single byte range are ignored, as RFC 7233 requires.
+
+    Raises:
+        ValueError: If the range is valid but cannot be satisfied
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None  # Unsupported units and multi-range requests get the full body
+    first, dash, last = spec.strip().partition("-")
+    if not dash or (first and not first.isdecimal()) or (last and not last.isdecimal()) or not (first or last):
+        return None
+    if first:
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start > end or start >= size:
+        raise ValueError(f"Range '{range_header}' not satisfiable for {size} bytes")
+    return start, end
@@ -0,0 +1,106 @@
+import cv2
+import numpy as np
+
+from simulation import CELL_FREE, CELL_EXTERIOR
+
+
+def boundary_paths(grid, inset=0):
+    """
+    The building outline as closed paths of cells, each an (n, 2) array of (x, y)
+    with consecutive cells (and the last and first) touching.
+
+    On a grid padded with an exterior band (every edge cell CELL_EXTERIOR, as
+    inference produces) these are the borders of the non-exterior region, courtyards
+    included. On other grids it is the ring of cells inset cells in from the grid
+    edges, clockwise from its top-left corner.
+    """
+    cells = np.asarray(grid)
+    rows, cols = cells.shape
+    if _has_exterior_band(cells):
+        inside = (cells != CELL_EXTERIOR).view(np.uint8)
+        contours, _ = cv2.findContours(inside, cv2.RETR_LIST, cv2.CHAIN_APPROX_NONE)
+        return [contour.reshape(-1, 2) for contour in contours]
+    top, left, bottom, right = inset, inset, rows - 1 - inset, cols - 1 - inset
+    if bottom < top or right < left:
+        return []
+    if bottom == top or right == left:  # Degenerate ring: one row or column
+        ys, xs = np.mgrid[top:bottom + 1, left:right + 1]
+        return [np.column_stack((xs.ravel(), ys.ravel()))]
+    xs = np.concatenate((np.arange(left, right), np.full(bottom - top, right),
+                         np.arange(right, left, -1), np.full(bottom - top, left)))
+    ys = np.concatenate((np.full(right - left, top), np.arange(top, bottom),
+                         np.full(right - left, bottom), np.arange(bottom, top, -1)))
+    return [np.column_stack((xs, ys))]
+
+
+def _has_exterior_band(cells):
+    return bool((cells[0] == CELL_EXTERIOR).all() and (cells[-1] == CELL_EXTERIOR).all()
+                and (cells[:, 0] == CELL_EXTERIOR).all() and (cells[:, -1] == CELL_EXTERIOR).all())
+
+
+def _open_runs(is_open):
+    """(start, length) of each run of True in a closed path, by start; a run may wrap past the end."""
+    n = len(is_open)
+    if is_open.all():
+        return [(0, n)]
+    shift = int(np.argmin(is_open))  # Start the path on a closed cell so no run wraps
+    edges = np.diff(np.concatenate(([0], np.roll(is_open, -shift).view(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    return sorted(((start + shift) % n, end - start) for start, end in zip(starts.tolist(), ends.tolist()))
+
+
+def detect_exits(grid, inset=0, spacing=None):
+    """
+    One exit per opening in the building boundary.
+
+    An opening is a run of free cells along a boundary path (see boundary_paths),
+    and its exit is the middle cell of the run. Doors and windows on the boundary
+    are not openings, as in the edge scans this replaced. With spacing, an
+    opening longer than spacing + 1 cells is first cut into equal pieces of more
+    than spacing cells, each with its own exit, so open sides keep several exits.
+
+    Returns:
+        (x, y) exits, in order along the boundary
+    """
+    cells = np.asarray(grid)
+    exits = []
+    for path in boundary_paths(cells, inset):
+        path_cells = cells[path[:, 1], path[:, 0]]
+        is_open = path_cells == CELL_FREE
+        for start, length in _open_runs(is_open):
+            pieces = max(1, length // (spacing + 1)) if spacing is not None else 1
+            for piece in range(pieces):
+                x, y = path[(start + (2 * piece + 1) * length // (2 * pieces)) % len(path)]
+                exits.append((int(x), int(y)))
+    return list(dict.fromkeys(exits))  # A contour can pass a one-cell-wide opening twice
+
+
+def spaced_exits(exits, min_spacing, max_exits=None):
+    """The exits, in order, that are more than min_spacing (Euclidean) from every exit kept before them."""
+    kept = []
+    min_spacing_sq = min_spacing * min_spacing
+    for x, y in exits:
+        if all((x - kx) ** 2 + (y - ky) ** 2 > min_spacing_sq for kx, ky in kept):
+            kept.append((x, y))
+            if max_exits is not None and len(kept) >= max_exits:
+                break
+    return kept
+
+
+def capped_exits(exits, count):
+    """
+    Exactly count exits, e.g. for the PPO model's fixed action space.
+
+    Surplus exits are thinned evenly along the list; with fewer exits each gets an
+    equal block of consecutive slots (earlier exits one more), like
+    simulation_jobs.distribute_exits_to_model. No exits gives count copies of (0, 0).
+    """
+    if not exits:
+        return [(0, 0)] * count
+    if len(exits) >= count:
+        return [exits[i] for i in np.linspace(0, len(exits) - 1, count).round().astype(int)]
+    per_exit, remainder = divmod(count, len(exits))
+    capped = []
+    for i, exit_pos in enumerate(exits):
+        capped.extend([exit_pos] * (per_exit + (1 if i < remainder else 0)))
+    return capped
@@ -0,0 +1,159 @@
+import numpy as np
+
+from simulation import spread_tables
+
+# Arrival time used for cells that never ignite within the horizon
+NEVER_BURNED = np.iinfo(np.int16).max
+# Arrival time used while simulating for cells that cannot burn at all
+NOT_FLAMMABLE = -1
+
+
+def run_fire_ensemble(grid, fire_position, num_realizations=100, max_steps=2000,
+                      percentiles=(10, 50, 90), spread_probability=0.25, seed=None):
+    """
+    Run many independent FireSimulator realizations together and aggregate them.
+
+    All realizations share one stacked arrival-time array, stored cell-major as
+    (H, W, N) with a one-cell border so that realizations of the same cell sit next to
+    each other in memory, and all of them advance one time step at a time. In
+    FireSimulator every burning cell gives each unburned neighbour an independent trial
+    per step, so the delay between a cell igniting and it igniting a given neighbour is
+    geometric with that neighbour's spread probability. The ensemble draws that delay
+    once per (cell, unburned neighbour) pair when the cell ignites and keeps pending
+    ignitions in per-step buckets, so each ignition is processed once instead of being
+    re-tried every step. The arrival-time distribution is the same as stepping each
+    realization with FireSimulator.
+
+    Args:
+        grid: 2D numpy array of cell types
+        fire_position: (x, y) tuple for fire start
+        num_realizations: Number of independent realizations (N)
+        max_steps: Time horizon; cells igniting later count as not burned
+        percentiles: Percentiles of time-of-arrival to report per cell
+        spread_probability: Fallback probability for unknown cell types
+        seed: Optional seed for reproducible ensembles
+
+    Returns:
+        Dict with per-cell rasters in [row][col] order and burned-area curves
+    """
+    rng = np.random.default_rng(seed)
+    rows, cols = grid.shape
+    stride = cols + 2
+    cells_per_run = (rows + 2) * stride
+    # Pending ignition steps are kept as int16 and stay below 2 * max_steps + 1
+    max_steps = int(min(max_steps, NEVER_BURNED // 2 - 1))
+
+    padded_probs = np.zeros((rows + 2, cols + 2), dtype=np.float64)
+    padded_probs[1:-1, 1:-1] = spread_tables(grid, spread_probability)[0]
+    flammable = (padded_probs > 0).ravel()
+    # Geometric delay: floor(log(u) / log(1 - p)) + 1 steps for u in (0, 1]
+    with np.errstate(divide='ignore'):
+        inv_log_q = np.where(padded_probs < 1, 1.0 / np.log1p(-np.minimum(padded_probs, 0.999999)), 0.0)
+    inv_log_q = inv_log_q.ravel().astype(np.float32)
+
+    n = num_realizations
+    arrival = np.full((cells_per_run, n), NEVER_BURNED, dtype=np.int16)
+    arrival[~flammable] = NOT_FLAMMABLE
+    arrival = arrival.ravel()
+    offsets = np.array([-stride, stride, -1, 1], dtype=np.int64) * n
+    buckets = {}
+    area_increments = np.zeros((max_steps + 1, n), dtype=np.int32)
+
+    fire_x, fire_y = int(fire_position[0]), int(fire_position[1])
+    if not (0 <= fire_y < rows and 0 <= fire_x < cols):
+        raise ValueError(f"Fire position ({fire_x}, {fire_y}) is outside the {cols}x{rows} grid")
+    origin = (fire_y + 1) * stride + fire_x + 1
+    ignited = origin * n + np.arange(n, dtype=np.int64)
+
+    # np.compress is used instead of boolean indexing: it is several times faster
+    # on the poorly predictable masks produced here.
+    t = 0
+    last_step = 0
+    while True:
+        arrival[ignited] = t
+        area_increments[t] = np.bincount(ignited % n, minlength=n)
+        last_step = t
+
+        # Schedule the first successful trial on every unburned, flammable neighbour
+        targets = (offsets[:, None] + ignited).ravel()
+        targets = np.compress(arrival.take(targets) == NEVER_BURNED, targets)
+
+        u = 1.0 - rng.random(targets.size, dtype=np.float32)
+        delays = np.minimum(np.log(u) * inv_log_q.take(targets // n), max_steps)
+        due = delays.astype(np.int16) + np.int16(t + 1)
+        if targets.size:
+            order = np.argsort(due, kind='stable')
+            targets, due = targets.take(order), due.take(order)
+            steps, starts = np.unique(due, return_index=True)
+            ends = np.append(starts[1:], due.size)
+            for step, start, end in zip(steps.tolist(), starts.tolist(), ends.tolist()):
+                if step > max_steps:
+                    break
+                buckets.setdefault(step, []).append(targets[start:end])
+
+        # Next step with pending ignitions; cells already burning are dropped
+        ignited = None
+        while buckets:
+            t = min(buckets)
+            pending = np.concatenate(buckets.pop(t))
+            pending = np.compress(arrival.take(pending) == NEVER_BURNED, pending)
+            if pending.size:
+                pending.sort()
+                ignited = np.compress(np.concatenate(([True], pending[1:] != pending[:-1])), pending)
+                break
+        if ignited is None:
+            break
+
+    arrival[arrival == NOT_FLAMMABLE] = NEVER_BURNED
+    return _summarize_ensemble(arrival.reshape(rows + 2, cols + 2, n)[1:-1, 1:-1],
+                               area_increments[:last_step + 1], max_steps, percentiles)
+
+
+def _summarize_ensemble(arrival, area_increments, max_steps, percentiles):
+    """Reduce stacked (H, W, N) arrival times to per-cell rasters and area curves."""
+    num_realizations = arrival.shape[-1]
+    burned = arrival != NEVER_BURNED
+    burn_counts = burned.sum(axis=-1)
+    ignition_probability = burn_counts / num_realizations
+
+    arrival_sum = np.where(burned, arrival, 0).sum(axis=-1, dtype=np.int64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_arrival = arrival_sum / burn_counts
+
+    # Nearest-rank percentiles; never-burned realizations sort last
+    ranks = [min(num_realizations - 1, max(0, int(np.ceil(q / 100 * num_realizations)) - 1)) for q in percentiles]
+    ordered = np.sort(arrival, axis=-1, kind='stable')  # radix sort for int16
+    percentile_maps = {}
+    for q, rank in zip(percentiles, ranks):
+        values = ordered[..., rank]
+        percentile_maps[f"p{q:g}"] = _raster_to_list(values.astype(np.float64), values == NEVER_BURNED)
+
+    burned_area = np.cumsum(area_increments, axis=0)
+    area_percentiles = {
+        f"p{q:g}": np.percentile(burned_area, q, axis=1).round(1).tolist() for q in percentiles
+    }
+
+    return {
+        "num_realizations": num_realizations,
+        "max_steps": max_steps,
+        "grid_shape": list(arrival.shape[:2]),
+        "ignition_probability": np.round(ignition_probability, 4).tolist(),
+        "mean_arrival_time": _raster_to_list(mean_arrival, burn_counts == 0),
+        "arrival_time_percentiles": percentile_maps,
+        "burned_area": {
+            "mean": burned_area.mean(axis=1).round(2).tolist(),
+            "percentiles": area_percentiles,
+        },
+        "final_burned_area": {
+            "mean": float(burned_area[-1].mean()),
+            "min": int(burned_area[-1].min()),
+            "max": int(burned_area[-1].max()),
+        },
+    }
+
+
+def _raster_to_list(values, missing):
+    """Convert a float raster to nested lists with None where data is missing."""
+    rounded = np.round(values, 2).astype(object)
+    rounded[missing] = None
+    return rounded.tolist()
@@ -0,0 +1,166 @@
+import base64
+import json
+
+import numpy as np
+
+# Animation history formats: a full list of burning cells in every frame, one
+# ignition-time raster for the whole run plus per-frame agent data, or frames holding
+# only what changed since the previous frame with a full keyframe every so often
+HISTORY_FORMATS = ('frames', 'ignition_raster', 'delta')
+# How the ignition raster is serialized: nested JSON lists, or base64 of the raw int16 array
+RASTER_ENCODINGS = ('json', 'base64')
+
+# Ignition frame stored for cells that never burned
+NOT_IGNITED = -1
+# Version of the animation_data layout. Results without a version field are the
+# original layout: a "history" list of full frames and nothing else.
+ANIMATION_DATA_VERSION = 2
+DEFAULT_KEYFRAME_INTERVAL = 50
+# Frames a spooling recorder still keeps in memory (for commander_actions)
+SPOOL_HEAD_FRAMES = 100
+
+
+class FrameRecorder:
+    """
+    Collects the animation history of a run.
+
+    In 'frames' format every frame carries the [row, col] list of all burning cells,
+    as the frontend has always received it. Fire only ever grows, so that payload grows
+    quadratically with the run length. In 'ignition_raster' format frames only carry
+    agent data, and the fire is returned once as a (rows, cols) int16 raster holding
+    the index of the first frame each cell burns in (NOT_IGNITED if it never does):
+    frame i shows the cells with 0 <= ignition_step <= i.
+
+    In 'delta' format every keyframe_interval-th frame (starting with the first) is a
+    keyframe with the full fire list and all agents. The frames in between carry the
+    [row, col] cells ignited since the previous frame and only the agents whose entry
+    changed, each tagged with its "id" (index in the keyframe agent list). A player can
+    seek to any frame by starting from the keyframe before it.
+
+    An optional sink receives every frame as it is recorded, for live streaming. Frames
+    of the 'ignition_raster' format are handed to it with the "ignited" cells of that
+    frame added, since the raster itself is only complete at the end of the run.
+
+    With a spool_path the frames are written to that file as NDJSON (one JSON frame per
+    line) as they are recorded, and only the first SPOOL_HEAD_FRAMES stay in history.
+    animation_data() then reports "spooled_frames" in place of the "history" list; the
+    frames are read back with read_spool().
+    """
+
+    def __init__(self, fire_sim, history_format='frames', raster_encoding='json',
+                 keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, sink=None, spool_path=None):
+        """
+        Args:
+            fire_sim: FireSimulator of the run, already reset
+            history_format: One of HISTORY_FORMATS
+            raster_encoding: One of RASTER_ENCODINGS, used by the 'ignition_raster' format
+            keyframe_interval: Frames from one keyframe to the next in 'delta' format
+            sink: Optional callable taking each frame as it is recorded
+            spool_path: Optional NDJSON file the frames are written to instead of memory
+        """
+        if history_format not in HISTORY_FORMATS:
+            raise ValueError(f"Unknown history format '{history_format}'. Options: {HISTORY_FORMATS}")
+        if raster_encoding not in RASTER_ENCODINGS:
+            raise ValueError(f"Unknown raster encoding '{raster_encoding}'. Options: {RASTER_ENCODINGS}")
+        if keyframe_interval < 1:
+            raise ValueError(f"keyframe_interval must be at least 1, got {keyframe_interval}")
+        self.fire_sim = fire_sim
+        self.history_format = history_format
+        self.raster_encoding = raster_encoding
+        self.keyframe_interval = keyframe_interval
+        self.sink = sink
+        self.history = []
+        self.frame_count = 0
+        self.spool_path = spool_path
+        self._spool = open(spool_path, "w", encoding="utf-8") if spool_path else None
+        self._previous_agents = None
+        self.ignition_step = None
+        if history_format == 'ignition_raster':
+            # Cells already burning show up from the first frame on
+            self.ignition_step = np.full(fire_sim.fire_map.shape, NOT_IGNITED, dtype=np.int16)
+            self.ignition_step[fire_sim.fire_map == 1] = 0
+
+    def record(self, agents_data):
+        """
+        Add a frame after a fire step.
+
+        Args:
+            agents_data: Per-agent frame entries ({"pos", "status", "state", "tripped"})
+        """
+        index = self.frame_count
+        if self.history_format == 'ignition_raster':
+            frame = min(index, np.iinfo(np.int16).max)
+            self.ignition_step.ravel()[self.fire_sim.last_ignited] = frame
+            self._append({"agents": agents_data})
+            if self.sink is not None:
+                # The first frame also shows the cells that were burning before the first step
+                ignited = np.argwhere(self.ignition_step == 0).tolist() if frame == 0 else self._ignited_coords()
+                self.sink({"ignited": ignited, "agents": agents_data})
+            return
+        elif self.history_format == 'delta' and index % self.keyframe_interval:
+            frame = {
+                "keyframe": False,
+                "ignited": self._ignited_coords(),
+                "agents": [dict(entry, id=i) for i, (entry, previous)
+                           in enumerate(zip(agents_data, self._previous_agents)) if entry != previous]
+            }
+            self._previous_agents = agents_data
+        else:
+            fire_coords = np.argwhere(self.fire_sim.fire_map == 1).tolist()  # [y, x] = [row, col]
+            frame = {"fire_map": fire_coords, "agents": agents_data}
+            if self.history_format == 'delta':
+                frame["keyframe"] = True
+                self._previous_agents = agents_data
+        self._append(frame)
+        if self.sink is not None:
+            self.sink(frame)
+
+    def _append(self, frame):
+        self.frame_count += 1
+        if self._spool is None:
+            self.history.append(frame)
+            return
+        self._spool.write(json.dumps(frame))
+        self._spool.write("\n")
+        if len(self.history) < SPOOL_HEAD_FRAMES:
+            self.history.append(frame)
+
+    def close(self):
+        """Flush and close the spool file, if any."""
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+    def _ignited_coords(self):
+        """[row, col] of the cells ignited by the last fire step, in row-major order."""
+        rows, cols = np.divmod(np.sort(self.fire_sim.last_ignited), self.fire_sim.fire_map.shape[1])
+        return np.stack((rows, cols), axis=1).tolist()
+
+    def animation_data(self):
+        """The "animation_data" entry of a simulation result."""
+        data = {"version": ANIMATION_DATA_VERSION, "format": self.history_format}
+        if self.spool_path:
+            self.close()
+            data["spooled_frames"] = self.frame_count
+        else:
+            data["history"] = self.history
+        if self.history_format == 'delta':
+            data["keyframe_interval"] = self.keyframe_interval
+        if self.ignition_step is not None:
+            data["grid_shape"] = list(self.ignition_step.shape)
+            if self.raster_encoding == 'json':
+                data["ignition_step"] = self.ignition_step.tolist()
+            else:
+                data["ignition_step"] = {
+                    "encoding": "base64",
+                    "dtype": "int16",  # little-endian, row-major
+                    "data": base64.b64encode(self.ignition_step.astype('<i2').tobytes()).decode('ascii'),
+                }
+        return data
+
+
+def read_spool(path):
+    """Frames of an NDJSON spool file, parsed one line at a time."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
@@ -0,0 +1,108 @@
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+from grid_store import grid_id
+
+DEFAULT_MAX_GRIDS = int(os.environ.get("GRID_CACHE_GRIDS", 8))
+
+
+def _freeze(value):
+    """Make a derived structure immutable: arrays read-only, lists tuples."""
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, tuple):
+        for item in value:
+            _freeze(item)
+    elif isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class GridCache:
+    """
+    LRU cache of structures that depend only on a grid (spread rasters, free-cell
+    masks, auto-detected exits, ...), so jobs replaying one building pay for them once.
+
+    Entries are keyed by the grid's content hash and a name, and the max_grids most
+    recently used grids keep all their entries. Cached arrays are read-only and lists
+    are stored as tuples, so callers must copy before changing them. Like
+    simulation.get_pathfinder, the hash of the last grid object is reused, so a grid
+    must not be edited in place once it is used here.
+    """
+
+    def __init__(self, max_grids=DEFAULT_MAX_GRIDS):
+        self.max_grids = max_grids
+        self._grids = OrderedDict()  # grid hash -> {name: structure}
+        self._last = (None, None)  # (weakref to the last grid array, its hash)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, grid):
+        ref, key = self._last
+        if ref is not None and ref() is grid:
+            return key
+        key = grid_id(grid)
+        try:
+            self._last = (weakref.ref(grid), key)
+        except TypeError:  # Not an ndarray (nested lists)
+            pass
+        return key
+
+    def get(self, grid, name, build):
+        """
+        The structure called name for grid, from build(grid) on a miss.
+
+        Args:
+            grid: 2D numpy array of cell types
+            name: Hashable name of the structure, including any parameters it depends on
+            build: callable(grid) computing it
+        """
+        key = self._key(grid)
+        with self._lock:
+            entries = self._grids.get(key)
+            if entries is not None:
+                self._grids.move_to_end(key)
+                if name in entries:
+                    self.hits += 1
+                    return entries[name]
+            self.misses += 1
+        value = _freeze(build(grid))
+        with self._lock:
+            entries = self._grids.setdefault(key, {})
+            self._grids.move_to_end(key)
+            value = entries.setdefault(name, value)
+            while len(self._grids) > self.max_grids:
+                self._grids.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._grids.clear()
+            self._last = (None, None)
+
+    def metrics(self):
+        lookups = self.hits + self.misses
+        return {
+            "grids": len(self._grids),
+            "max_grids": self.max_grids,
+            "entries": sum(len(entries) for entries in self._grids.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else None,
+        }
+
+
+# Shared by everything in this process, so consecutive jobs of a worker reuse entries
+grid_cache = GridCache()
+
+
+def grid_cache_metrics():
+    return grid_cache.metrics()
@@ -0,0 +1,80 @@
+import base64
+
+import numpy as np
+
+# Wire forms of a grid: 'json' nested lists of ints, or {"encoding", "dtype", "shape", "data"}
+# with data the base64 of the row-major uint8 cells ('base64') or of their runs ('rle')
+GRID_ENCODINGS = ("json", "base64", "rle")
+GRID_DTYPE = "uint8"
+# One run: the cell code, then how many cells in a row (row-major) have it
+RUN_DTYPE = np.dtype([("value", "u1"), ("length", "<u4")])
+
+
+def encode_runs(cells):
+    """Run-length encode cells (flattened row-major) as packed RUN_DTYPE records."""
+    flat = np.ascontiguousarray(cells, dtype=np.uint8).ravel()
+    if flat.size == 0:
+        return b""
+    starts = np.concatenate(([0], np.flatnonzero(flat[1:] != flat[:-1]) + 1))
+    runs = np.empty(starts.size, dtype=RUN_DTYPE)
+    runs["value"] = flat[starts]
+    runs["length"] = np.diff(np.append(starts, flat.size))
+    return runs.tobytes()
+
+
+def decode_runs(data, size):
+    """
+    Cells of encode_runs() output, flattened.
+
+    Raises:
+        ValueError: if data is not whole runs or the runs do not cover exactly size cells
+    """
+    if len(data) % RUN_DTYPE.itemsize:
+        raise ValueError(f"RLE data must be a whole number of {RUN_DTYPE.itemsize}-byte runs")
+    runs = np.frombuffer(data, dtype=RUN_DTYPE)
+    lengths = runs["length"].astype(np.int64)
+    if int(lengths.sum()) != size or (lengths == 0).any():
+        raise ValueError(f"RLE runs cover {int(lengths.sum())} cells, expected {size}")
+    return np.repeat(runs["value"], lengths)
+
+
+def encode_grid(grid, encoding="json"):
+    """A grid in one of GRID_ENCODINGS, for a JSON response."""
+    grid = np.asarray(grid)
+    if encoding == "json":
+        return grid.tolist()
+    if encoding == "base64":
+        data = np.ascontiguousarray(grid, dtype=np.uint8).tobytes()
+    elif encoding == "rle":
+        data = encode_runs(grid)
+    else:
+        raise ValueError(f"grid encoding must be one of {list(GRID_ENCODINGS)}, got {encoding!r}")
+    return {"encoding": encoding, "dtype": GRID_DTYPE, "shape": list(grid.shape),
+            "data": base64.b64encode(data).decode("ascii")}
+
+
+def decode_grid(encoding, shape, data, dtype=GRID_DTYPE):
+    """
+    The uint8 grid of an encoded grid's fields (see encode_grid).
+
+    Raises:
+        ValueError: for an unknown encoding or dtype, or data that does not match shape
+    """
+    if encoding not in ("base64", "rle"):
+        raise ValueError(f"packed grid encoding must be 'base64' or 'rle', got {encoding!r}")
+    if dtype != GRID_DTYPE:
+        raise ValueError(f"packed grid dtype must be {GRID_DTYPE!r}, got {dtype!r}")
+    rows, cols = shape
+    if rows < 1 or cols < 1:
+        raise ValueError(f"packed grid shape must be positive, got {list(shape)}")
+    try:
+        raw = base64.b64decode(data, validate=True)
+    except ValueError:
+        raise ValueError("packed grid data is not valid base64")
+    if encoding == "rle":
+        cells = decode_runs(raw, rows * cols)
+    else:
+        if len(raw) != rows * cols:
+            raise ValueError(f"Expected {rows * cols} bytes for a {rows}x{cols} grid, got {len(raw)}")
+        cells = np.frombuffer(raw, dtype=np.uint8)
+    return cells.reshape(rows, cols)
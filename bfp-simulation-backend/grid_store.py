@@ -0,0 +1,130 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+GRID_DTYPE = np.int8  # Cell codes (CELL_FREE..CELL_EXTERIOR) fit in a byte
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+OPEN_MAPS = 32  # Memory maps each process keeps open
+_GRID_ID = re.compile(r"[0-9a-f]{64}")
+
+
+def grid_id(grid):
+    """Content hash of a grid: grids with the same shape and cells have the same id."""
+    grid = np.ascontiguousarray(grid, dtype=GRID_DTYPE)
+    return hashlib.sha256(f"{grid.shape}".encode("ascii") + grid.tobytes()).hexdigest()
+
+
+class GridStore:
+    """
+    Grids by content hash, as .npy files in a directory shared by the server and the
+    job workers.
+
+    load() memory-maps a grid's file, so a worker reads only the pages it touches and
+    processes share them through the page cache; each process keeps the OPEN_MAPS most
+    recently used maps open. Every put() and load() marks the file as used (its mtime),
+    and put() deletes the least recently used files while the directory holds more
+    than max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._maps = OrderedDict()  # grid_id -> read-only memmap
+        self._lock = threading.Lock()
+
+    def path(self, grid_id):
+        if not _GRID_ID.fullmatch(grid_id):
+            raise KeyError(grid_id)
+        return os.path.join(self.directory, f"{grid_id}.npy")
+
+    def contains(self, grid_id):
+        try:
+            return os.path.exists(self.path(grid_id))
+        except KeyError:
+            return False
+
+    def put(self, grid):
+        """Store a 2-D grid of cell codes and return its grid_id. Storing a known grid only marks it as used."""
+        grid = np.ascontiguousarray(grid, dtype=GRID_DTYPE)
+        if grid.ndim != 2:
+            raise ValueError(f"grid must be 2-D, got shape {grid.shape}")
+        key = grid_id(grid)
+        path = self.path(key)
+        if os.path.exists(path):
+            self._touch(path)
+            return key
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, grid)
+        os.replace(tmp, path)
+        self._evict(keep=path)
+        return key
+
+    def load(self, grid_id):
+        """
+        Returns:
+            The grid as a read-only memory map
+        Raises:
+            KeyError: for an unknown (or evicted) grid_id
+        """
+        path = self.path(grid_id)
+        with self._lock:
+            grid = self._maps.get(grid_id)
+            if grid is not None:
+                self._maps.move_to_end(grid_id)
+        if grid is None:
+            try:
+                grid = np.load(path, mmap_mode="r")
+            except FileNotFoundError:
+                raise KeyError(grid_id) from None
+            with self._lock:
+                self._maps[grid_id] = grid
+                while len(self._maps) > OPEN_MAPS:
+                    self._maps.popitem(last=False)
+        self._touch(path)
+        return grid
+
+    def stats(self):
+        files = self._files()
+        return {"grids": len(files), "bytes": sum(size for _, size, _ in files), "max_bytes": self.max_bytes}
+
+    def _files(self):
+        """(path, size, mtime) of every stored grid."""
+        if not os.path.isdir(self.directory):
+            return []
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npy"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:  # Evicted by another process meanwhile
+                    continue
+                files.append((entry.path, stat.st_size, stat.st_mtime))
+        return files
+
+    def _evict(self, keep):
+        files = self._files()
+        total = sum(size for _, size, _ in files)
+        for path, size, _ in sorted(files, key=lambda f: f[2]):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            print(f"[GRIDS] Evicted {os.path.basename(path)[:8]} ({size} bytes)", flush=True)
+
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
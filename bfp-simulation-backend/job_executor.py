@@ -0,0 +1,268 @@
+import multiprocessing
+import threading
+import time
+import traceback
+from collections import deque
+
+POLL_SECONDS = 0.5  # How often a running job is checked for cancellation and its time limit
+
+
+class _Job:
+    __slots__ = ("job_id", "fn", "args", "on_frame", "frames_wanted", "on_finish", "cancelled")
+
+    def __init__(self, job_id, fn, args, on_frame, frames_wanted, on_finish):
+        self.job_id = job_id
+        self.fn = fn
+        self.args = args
+        self.on_frame = on_frame
+        self.frames_wanted = frames_wanted
+        self.on_finish = on_finish
+        self.cancelled = False
+
+
+def _worker_main(conn, send_frames, initializer, initargs, worker_stats=None):
+    """
+    Loop of a worker process: run the jobs sent over conn, one at a time. Frames are
+    numbered per job and only sent while the shared send_frames flag is set.
+    """
+    if initializer is not None:
+        initializer(*initargs)
+    frame_index = 0
+
+    def send_frame(frame):
+        nonlocal frame_index
+        if send_frames.value:
+            conn.send(("frame", (frame_index, frame)))
+        frame_index += 1
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        job_id, fn, args, stream_frames = task
+        frame_index = 0
+        try:
+            if stream_frames:
+                fn(job_id, *args, frame_sink=send_frame)
+            else:
+                fn(job_id, *args)
+            outcome = ("done", None)
+        except Exception as e:
+            traceback.print_exc()
+            outcome = ("error", str(e))
+        if worker_stats is not None:
+            conn.send(("stats", worker_stats()))
+        conn.send(outcome)
+
+
+class JobExecutor:
+    """
+    Runs jobs in a fixed number of worker processes, so simulations do not compete
+    with the API (or each other) for the GIL.
+
+    Every worker process runs the initializer once when it starts (e.g. to load the
+    PPO model) and then takes jobs one at a time. Each worker is driven by a thread in
+    the server process, which sends it a job, relays the frames it reports to the job's
+    on_frame callback and enforces the time limit. The worker only sends frames while
+    the job's frames_wanted() is true, and on_frame must not block, since the same
+    thread polls for cancellation and the time limit. A job that is cancelled while
+    running, exceeds job_timeout or crashes its worker has its process terminated and
+    replaced by a fresh one.
+
+    When a job ends, on_finish(job_id, outcome, error) is called in the server process,
+    with outcome one of 'done', 'error', 'cancelled', 'timeout' or 'crashed'.
+
+    With worker_stats, every worker reports worker_stats() after each job, and
+    stats() lists the latest report of each current worker process.
+    """
+
+    def __init__(self, max_workers, job_timeout=None, initializer=None, initargs=(), mp_context="spawn",
+                 worker_stats=None):
+        """
+        Args:
+            max_workers: Number of worker processes (jobs that run at the same time)
+            job_timeout: Seconds a job may run before it is stopped, or None for no limit
+            initializer: Optional picklable callable run once in every worker process
+            initargs: Arguments for initializer
+            mp_context: multiprocessing start method; 'spawn' keeps workers independent of
+                the server's threads and loaded libraries
+            worker_stats: Optional picklable callable returning a worker's statistics
+        """
+        if max_workers < 1:
+            raise ValueError(f"max_workers must be at least 1, got {max_workers}")
+        self.max_workers = max_workers
+        self.job_timeout = job_timeout
+        self.initializer = initializer
+        self.initargs = initargs
+        self.worker_stats = worker_stats
+        self._worker_reports = [None] * max_workers
+        self._context = multiprocessing.get_context(mp_context)
+        self._queue = deque()
+        self._running = {}  # job_id -> _Job
+        self._cond = threading.Condition()
+        self._shutdown = False
+        self._threads = [threading.Thread(target=self._run_worker, args=(i,), name=f"job-worker-{i}", daemon=True)
+                         for i in range(max_workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, job_id, fn, args=(), on_frame=None, on_finish=None, frames_wanted=None):
+        """
+        Queue a job. fn(job_id, *args) runs in a worker process, so fn and args must be
+        picklable; with on_frame, fn also gets a frame_sink keyword argument whose frames
+        are passed to on_frame(index, frame) in the server process. With frames_wanted,
+        frames are only sent while frames_wanted() returns True (checked at least every
+        POLL_SECONDS), so the indexes on_frame sees can skip.
+        """
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("Job executor is shut down")
+            self._queue.append(_Job(job_id, fn, args, on_frame, frames_wanted, on_finish))
+            self._cond.notify()
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued or running job.
+
+        Returns:
+            'queued' or 'running' for the state the job was cancelled in, None if the
+            executor does not know the job (finished or never submitted)
+        """
+        with self._cond:
+            job = self._running.get(job_id)
+            if job is not None:
+                job.cancelled = True  # Its worker thread stops it within POLL_SECONDS
+                return "running"
+            for job in self._queue:
+                if job.job_id == job_id:
+                    self._queue.remove(job)
+                    break
+            else:
+                return None
+        self._finish(job, "cancelled", "Job cancelled")
+        return "queued"
+
+    def has_job(self, job_id):
+        """Whether job_id is queued or running."""
+        with self._cond:
+            return job_id in self._running or any(job.job_id == job_id for job in self._queue)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.max_workers,
+                "job_timeout": self.job_timeout,
+                "running": list(self._running),
+                "queued": [job.job_id for job in self._queue],
+                "queue_depth": len(self._queue),
+                "worker_stats": list(self._worker_reports),
+            }
+
+    def shutdown(self, wait=True):
+        """Stop taking jobs; queued jobs are dropped and running ones finish first if wait."""
+        with self._cond:
+            self._shutdown = True
+            self._queue.clear()
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _spawn(self):
+        parent_conn, child_conn = self._context.Pipe()
+        send_frames = self._context.Value("b", 0, lock=False)
+        process = self._context.Process(target=_worker_main,
+                                        args=(child_conn, send_frames, self.initializer, self.initargs,
+                                              self.worker_stats),
+                                        daemon=True)
+        process.start()
+        child_conn.close()
+        return process, parent_conn, send_frames
+
+    def _run_worker(self, index):
+        process, conn, send_frames = None, None, None
+        while True:
+            with self._cond:
+                while not self._queue and not self._shutdown:
+                    self._cond.wait()
+                if self._shutdown:
+                    break
+                job = self._queue.popleft()
+                self._running[job.job_id] = job
+            if process is None:
+                process, conn, send_frames = self._spawn()
+            outcome, error = self._execute(job, process, conn, send_frames, index)
+            if outcome not in ("done", "error"):
+                # The worker is stuck in (or lost) the job, so it is replaced
+                process.terminate()
+                process.join()
+                conn.close()
+                process, conn, send_frames = None, None, None
+                with self._cond:
+                    self._worker_reports[index] = None
+            with self._cond:
+                self._running.pop(job.job_id, None)
+            self._finish(job, outcome, error)
+        if process is not None:
+            conn.send(None)
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+
+    def _execute(self, job, process, conn, send_frames, index):
+        """Run one job on a worker and wait for it to end. Returns (outcome, error message)."""
+        deadline = time.monotonic() + self.job_timeout if self.job_timeout else None
+        self._update_send_frames(job, send_frames)
+        try:
+            conn.send((job.job_id, job.fn, job.args, job.on_frame is not None))
+        except (OSError, ValueError) as e:
+            return "crashed", f"Could not send job to worker: {e}"
+        while True:
+            if job.cancelled:
+                return "cancelled", "Job cancelled"
+            self._update_send_frames(job, send_frames)
+            wait = POLL_SECONDS
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return "timeout", f"Job exceeded the time limit of {self.job_timeout:g} seconds"
+                wait = min(wait, remaining)
+            try:
+                if not conn.poll(wait):
+                    continue
+                kind, payload = conn.recv()
+            except (EOFError, OSError):
+                return "crashed", f"Worker process exited unexpectedly (exit code {process.exitcode})"
+            if kind == "frame":
+                job.on_frame(*payload)
+            elif kind == "stats":
+                with self._cond:
+                    self._worker_reports[index] = payload
+            else:
+                return kind, payload
+
+    @staticmethod
+    def _update_send_frames(job, send_frames):
+        if job.on_frame is None:
+            wanted = False
+        elif job.frames_wanted is None:
+            wanted = True
+        else:
+            try:
+                wanted = bool(job.frames_wanted())
+            except Exception:
+                traceback.print_exc()
+                wanted = False
+        send_frames.value = 1 if wanted else 0
+
+    def _finish(self, job, outcome, error):
+        if job.on_finish is None:
+            return
+        try:
+            job.on_finish(job.job_id, outcome, error)
+        except Exception:
+            traceback.print_exc()
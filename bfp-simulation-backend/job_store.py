@@ -0,0 +1,321 @@
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import datetime, timedelta
+
+COMPRESSION_LEVEL = 6
+RESULT_ENCODING = "json+zlib"
+BUSY_TIMEOUT_MS = 10000  # How long a writer waits for another writer's transaction
+BATCH_SIZE = 500  # Job ids per DELETE/UPDATE statement
+ACCESS_WRITE_INTERVAL_SECONDS = 300  # A read refreshes a result's last_accessed at most this often
+
+
+class JobStore:
+    """
+    Job status and results in SQLite.
+
+    Job metadata (status, error, timestamps) and results live in separate tables, so a
+    status poll reads one small row and only loads the result blob once a job is done.
+    Results are stored as zlib-compressed JSON. The database runs in WAL mode: readers
+    never wait for a writer, and job workers in other processes writing results only
+    wait for each other (up to BUSY_TIMEOUT_MS).
+
+    Connections are long-lived: one per thread, reopened after a fork.
+
+    Every stored result records its size (blob plus any result files kept next to it)
+    and when it was last read, for retention.Retention. The read time is only written
+    when the stored one is older than ACCESS_WRITE_INTERVAL_SECONDS, so clients polling
+    a finished job do not take the write lock on every poll. Expiring a result deletes it
+    but keeps the job row with status 'expired'.
+
+    The result cache maps a cache key (a hash of a job's inputs) to the job that
+    computed it, so a repeated request can be answered with the existing job.
+
+    A job can also carry a small JSON summary of its result (kept after the result
+    expires), and belong to a batch: an ordered list of jobs read back together.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints; enough for job results
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def init(self):
+        """Create the tables and indexes, migrating a database from the single-table layout."""
+        conn = self._connection()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # Lets compact() return the pages of deleted results to the file system
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if "result" in columns:
+                conn.execute("ALTER TABLE jobs RENAME TO jobs_legacy")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    summary TEXT
+                )
+            """)
+            if "summary" not in [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]:
+                conn.execute("ALTER TABLE jobs ADD COLUMN summary TEXT")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_results (
+                    job_id TEXT PRIMARY KEY REFERENCES jobs(job_id) ON DELETE CASCADE,
+                    encoding TEXT NOT NULL,
+                    data BLOB NOT NULL
+                )
+            """)
+            result_columns = [row[1] for row in conn.execute("PRAGMA table_info(job_results)")]
+            if "size" not in result_columns:
+                conn.execute("ALTER TABLE job_results ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+                conn.execute("ALTER TABLE job_results ADD COLUMN last_accessed TEXT")
+                conn.execute("""
+                    UPDATE job_results SET size = length(data),
+                        last_accessed = (SELECT updated_at FROM jobs WHERE jobs.job_id = job_results.job_id)
+                """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS result_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    job_id TEXT NOT NULL REFERENCES jobs(job_id) ON DELETE CASCADE
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS batch_jobs (
+                    batch_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    job_id TEXT NOT NULL REFERENCES jobs(job_id) ON DELETE CASCADE,
+                    name TEXT,
+                    PRIMARY KEY (batch_id, position)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs(created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_job_results_last_accessed ON job_results(last_accessed)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_result_cache_job_id ON result_cache(job_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_batch_jobs_job_id ON batch_jobs(job_id)")
+            if "result" in columns:
+                self._migrate_legacy(conn)
+
+    def _migrate_legacy(self, conn):
+        rows = conn.execute("SELECT job_id, status, result, error, created_at FROM jobs_legacy").fetchall()
+        for job_id, status, result, error, created_at in rows:
+            conn.execute("INSERT INTO jobs (job_id, status, error, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                         (job_id, status, error, created_at, created_at))
+            if result:
+                blob = zlib.compress(result.encode("utf-8"), COMPRESSION_LEVEL)
+                conn.execute("INSERT INTO job_results (job_id, encoding, data, size, last_accessed) VALUES (?, ?, ?, ?, ?)",
+                             (job_id, RESULT_ENCODING, blob, len(blob), created_at))
+        conn.execute("DROP TABLE jobs_legacy")
+        print(f"[JOBS] Migrated {len(rows)} jobs to the job/result tables", flush=True)
+
+    def set_status(self, job_id, status, result=None, error=None, files_size=0, summary=None):
+        """
+        Create or update a job. The result, if given, replaces any stored one; files_size
+        is the size of the result files kept outside the database, counted with it.
+        summary, if given, replaces the job's summary.
+        """
+        now = datetime.now().isoformat()
+        summary = json.dumps(summary) if summary is not None else None
+        # Compressed before the transaction, so the write lock is held only for the insert
+        blob = zlib.compress(json.dumps(result).encode("utf-8"), COMPRESSION_LEVEL) if result else None
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("""
+                INSERT INTO jobs (job_id, status, error, created_at, updated_at, summary) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(job_id) DO UPDATE SET status = excluded.status, error = excluded.error,
+                                                  updated_at = excluded.updated_at,
+                                                  summary = COALESCE(excluded.summary, jobs.summary)
+            """, (job_id, status, error, now, now, summary))
+            if blob is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO job_results (job_id, encoding, data, size, last_accessed) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, RESULT_ENCODING, blob, len(blob) + files_size, now))
+
+    def get(self, job_id, include_result=True):
+        """
+        Returns:
+            {"status", "result", "error", "created_at", "updated_at"}, or None for an unknown job.
+            "result" is only loaded with include_result.
+        """
+        conn = self._connection()
+        row = conn.execute("SELECT status, error, created_at, updated_at FROM jobs WHERE job_id = ?",
+                           (job_id,)).fetchone()
+        if row is None:
+            return None
+        status, error, created_at, updated_at = row
+        result = None
+        if include_result:
+            stored = conn.execute("SELECT encoding, data, last_accessed FROM job_results WHERE job_id = ?",
+                                  (job_id,)).fetchone()
+            if stored is not None:
+                result = json.loads(zlib.decompress(stored[1]))
+                now = datetime.now()
+                if stored[2] is None or stored[2] < (now - timedelta(seconds=ACCESS_WRITE_INTERVAL_SECONDS)).isoformat():
+                    with conn:
+                        conn.execute("UPDATE job_results SET last_accessed = ? WHERE job_id = ?",
+                                     (now.isoformat(), job_id))
+        return {"status": status, "result": result, "error": error,
+                "created_at": created_at, "updated_at": updated_at}
+
+    def add_batch(self, batch_id, jobs):
+        """Record a batch of existing jobs, given in order as (job_id, name) pairs."""
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT INTO batch_jobs (batch_id, position, job_id, name) VALUES (?, ?, ?, ?)",
+                             [(batch_id, position, job_id, name) for position, (job_id, name) in enumerate(jobs)])
+
+    def batch(self, batch_id):
+        """
+        Returns:
+            The jobs of a batch in order, as {"position", "name", "job_id", "status",
+            "error", "summary"}; empty for an unknown batch. Deleted jobs are left out.
+        """
+        rows = self._connection().execute("""
+            SELECT batch_jobs.position, batch_jobs.name, jobs.job_id, jobs.status, jobs.error, jobs.summary
+            FROM batch_jobs JOIN jobs ON jobs.job_id = batch_jobs.job_id
+            WHERE batch_jobs.batch_id = ? ORDER BY batch_jobs.position
+        """, (batch_id,))
+        return [{"position": position, "name": name, "job_id": job_id, "status": status, "error": error,
+                 "summary": json.loads(summary) if summary else None}
+                for position, name, job_id, status, error, summary in rows]
+
+    def touch(self, job_id):
+        """Mark a job and its result as just used, restarting its retention TTL."""
+        now = datetime.now().isoformat()
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (now, job_id))
+            conn.execute("UPDATE job_results SET last_accessed = ? WHERE job_id = ?", (now, job_id))
+
+    def cached_job(self, cache_key):
+        """
+        The (job_id, status) of the job cached under cache_key, if it is still running
+        or has its result ('processing' or 'complete'); None otherwise.
+        """
+        row = self._connection().execute("""
+            SELECT jobs.job_id, jobs.status FROM result_cache JOIN jobs ON jobs.job_id = result_cache.job_id
+            WHERE result_cache.cache_key = ? AND jobs.status IN ('processing', 'complete')
+        """, (cache_key,)).fetchone()
+        return tuple(row) if row else None
+
+    def end_processing_job(self, job_id, status, error):
+        """
+        Set a job's final status and error, but only while it is still 'processing', so
+        a result stored just before a cancel or timeout is kept.
+
+        Returns:
+            True if the job was still 'processing' and is now updated
+        """
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            return conn.execute("""
+                UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ? AND status = 'processing'
+            """, (status, error, datetime.now().isoformat(), job_id)).rowcount > 0
+
+    def fail_processing_jobs(self, error):
+        """
+        Mark every 'processing' job as 'failed' with error and drop its result cache
+        entries, for jobs a previous server process left unfinished.
+
+        Returns:
+            The number of jobs failed
+        """
+        now = datetime.now().isoformat()
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("""
+                DELETE FROM result_cache WHERE job_id IN (SELECT job_id FROM jobs WHERE status = 'processing')
+            """)
+            return conn.execute("UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE status = 'processing'",
+                                (error, now)).rowcount
+
+    def set_cached_job(self, cache_key, job_id):
+        """Cache job_id under cache_key, replacing the job cached before it."""
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT OR REPLACE INTO result_cache (cache_key, job_id) VALUES (?, ?)", (cache_key, job_id))
+
+    def cache_entries(self):
+        return self._connection().execute("SELECT COUNT(*) FROM result_cache").fetchone()[0]
+
+    def jobs_updated_before(self, status, cutoff):
+        """Ids of the jobs in status whose last update is older than cutoff (ISO timestamp)."""
+        rows = self._connection().execute("SELECT job_id FROM jobs WHERE status = ? AND updated_at < ?",
+                                          (status, cutoff))
+        return [row[0] for row in rows]
+
+    def results_by_last_access(self):
+        """(job_id, size) of every stored result, least recently read first."""
+        return self._connection().execute(
+            "SELECT job_id, size FROM job_results ORDER BY last_accessed").fetchall()
+
+    def result_bytes(self):
+        return self._connection().execute("SELECT COALESCE(SUM(size), 0) FROM job_results").fetchone()[0]
+
+    def expire_results(self, job_ids):
+        """Delete the results of these jobs, keeping their metadata with status 'expired'."""
+        now = datetime.now().isoformat()
+        for batch, marks in self._batches(job_ids):
+            with self._connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(f"DELETE FROM job_results WHERE job_id IN ({marks})", batch)
+                conn.execute(f"UPDATE jobs SET status = 'expired', error = 'Result expired', updated_at = ? "
+                             f"WHERE job_id IN ({marks})", [now] + batch)
+
+    def delete_jobs(self, job_ids):
+        """Delete these jobs and their results."""
+        for batch, marks in self._batches(job_ids):
+            with self._connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(f"DELETE FROM job_results WHERE job_id IN ({marks})", batch)
+                conn.execute(f"DELETE FROM result_cache WHERE job_id IN ({marks})", batch)
+                conn.execute(f"DELETE FROM batch_jobs WHERE job_id IN ({marks})", batch)
+                conn.execute(f"DELETE FROM jobs WHERE job_id IN ({marks})", batch)
+
+    @staticmethod
+    def _batches(job_ids):
+        job_ids = list(job_ids)
+        for start in range(0, len(job_ids), BATCH_SIZE):
+            batch = job_ids[start:start + BATCH_SIZE]
+            yield batch, ", ".join("?" * len(batch))
+
+    def compact(self):
+        """Return free pages to the file system and truncate the WAL."""
+        conn = self._connection()
+        conn.executescript("PRAGMA incremental_vacuum;")  # execute() would free only one page
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def stats(self):
+        conn = self._connection()
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        results, result_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM job_results").fetchone()
+        wal = self.path + "-wal"
+        return {
+            "db_bytes": page_size * page_count,
+            "free_bytes": page_size * free_pages,
+            "wal_bytes": os.path.getsize(wal) if os.path.exists(wal) else 0,
+            "jobs_by_status": dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()),
+            "results": results,
+            "result_bytes": result_bytes,
+        }
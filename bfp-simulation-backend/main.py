@@ -1,20 +1,23 @@
-﻿from fastapi import FastAPI, UploadFile, File, BackgroundTasks, HTTPException
+﻿from fastapi import FastAPI, UploadFile, File, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Tuple, Dict, Any, Optional
+from fastapi.responses import Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+from typing import List, Tuple, Dict, Any, Optional, Union
 from contextlib import asynccontextmanager
 import uuid
+import hashlib
 import torch
 import numpy as np
 import os
 import sys
 import tempfile
-import sqlite3
 import json
 import base64
 import random
-import gc
-from datetime import datetime
+import asyncio
+from collections import Counter
+from itertools import islice
 from PIL import Image
 from io import BytesIO
 import pickle
@@ -24,20 +27,40 @@ import tensorflow as tf
 from tensorflow.keras.models import load_model
 import google.generativeai as genai
 
-from stable_baselines3 import PPO
-from sb3_contrib import MaskablePPO
-
 from unet import UNet
 from inference import create_grid_from_image, analyze_floor_plan_brightness
-from simulation import EvacuationEnv, run_heuristic_simulation
+from simulation import NAVIGATION_MODES, REPLAN_POLICIES, AGENT_ENGINES, CELL_FREE, CELL_EXTERIOR
+from frames import HISTORY_FORMATS, RASTER_ENCODINGS, read_spool
+from binary_result import parse_byte_range
+from streaming import FrameStream, format_sse, replay_frames
+from job_executor import JobExecutor
+from retention import Retention, DEFAULT_TTL_SECONDS
+from grid_store import grid_id
+from grid_cache import grid_cache_metrics
+from grid_codec import GRID_ENCODINGS, encode_grid, decode_runs
+from simulation_jobs import (
+    PPO_MODEL_VERSION, USE_MASKABLE_PPO, PPO_MODEL_PATH, MAX_GRID_CELLS, RESULTS_DIR, MAX_ENSEMBLE_REALIZATIONS,
+    job_store, grid_store, init_simulation_worker,
+    PackedGrid, SimulationConfig, EnsembleConfig,
+    update_job_status, binary_result_path, history_spool_path, grid_array,
+    run_simulation_task, run_ensemble_task
+)
 
 # Configuration
-PPO_MODEL_VERSION = "500k_steps"  # Options: "v1.5", "v2.0_lite", "500k_steps", "v2.0"
-USE_MASKABLE_PPO = True  # Set to True for v2.0, False for v1.5
+# Simulation and ensemble jobs run in this many worker processes, and are stopped after JOB_TIMEOUT_SECONDS
+SIMULATION_WORKERS = int(os.environ.get("SIMULATION_WORKERS", 2))  # Each worker holds a PPO model and a job's state
+JOB_TIMEOUT_SECONDS = float(os.environ.get("JOB_TIMEOUT_SECONDS", 900))
+# Job retention: seconds a job stays in each status, cap on the stored result size
+# (least recently read results are evicted first) and how often retention runs
+RETENTION_TTL_SECONDS = DEFAULT_TTL_SECONDS
+MAX_RESULT_BYTES = int(os.environ.get("MAX_RESULT_BYTES", 2 * 1024 ** 3))
+RETENTION_INTERVAL_SECONDS = 600
+# Bump when a change to the simulation makes results cached for the same config stale
+RESULT_CACHE_VERSION = 1
 
 # Global variables for models
 unet_model = None
-ppo_model = None
+ppo_version = None  # PPO_MODEL_VERSION when its file is there for the job workers to load, else None
 device = None
 IMAGE_SIZE = 256
 
@@ -48,11 +71,14 @@ classes = None
 intents = None
 lemmatizer = None
 
+job_executor = None
+retention = None
+
 # Lifespan event handler (replaces deprecated on_event)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    global unet_model, ppo_model, device, chatbot_model, words, classes, intents, lemmatizer
+    global unet_model, ppo_version, device, chatbot_model, words, classes, intents, lemmatizer, job_executor, retention
     
     print("\n" + "=" * 60)
     print("FIRE EVACUATION SIMULATION BACKEND - STARTING UP")
@@ -105,34 +131,14 @@ async def lifespan(app: FastAPI):
         traceback.print_exc()
         unet_model = None
     
-    # Load PPO model with error handling
-    print(f"\n[2/3] Loading PPO Commander Model ({PPO_MODEL_VERSION})...")
-    try:
-        model_path = f"models/ppo_commander_{PPO_MODEL_VERSION}.zip"
-        abs_path = os.path.abspath(model_path)
-        print(f"  Model path: {abs_path}")
-        print(f"  Using {'MaskablePPO' if USE_MASKABLE_PPO else 'Standard PPO'}")
-        
-        if not os.path.exists(model_path):
-            print(f"  [FAIL] ERROR: Model file not found!")
-            print(f"  Expected location: {abs_path}")
-            ppo_model = None
-        else:
-            file_size = os.path.getsize(model_path) / (1024 * 1024)  # MB
-            print(f"  File size: {file_size:.2f} MB")
-            print(f"  Loading model...")
-            
-            if USE_MASKABLE_PPO:
-                ppo_model = MaskablePPO.load(model_path, device=device)
-            else:
-                ppo_model = PPO.load(model_path, device=device)
-            print(f"  [OK] PPO Commander {PPO_MODEL_VERSION} loaded successfully")
-    except Exception as e:
-        print(f"  [FAIL] ERROR loading PPO model:")
-        print(f"  {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        ppo_model = None
+    # The job workers load the PPO model (init_simulation_worker); the server only checks its file
+    print(f"\n[2/3] Checking PPO Commander Model ({PPO_MODEL_VERSION})...")
+    if os.path.exists(PPO_MODEL_PATH):
+        ppo_version = PPO_MODEL_VERSION
+        print(f"  [OK] Found {os.path.abspath(PPO_MODEL_PATH)}")
+    else:
+        ppo_version = None
+        print(f"  [FAIL] ERROR: Model file not found at {os.path.abspath(PPO_MODEL_PATH)}")
     
     # Load Chatbot model (optional)
     print("\n[3/3] Loading Fire Safety Chatbot Model...")
@@ -188,22 +194,35 @@ async def lifespan(app: FastAPI):
         print("  [INFO] GEMINI_API_KEY not configured, using TensorFlow model")
         use_gemini = False
     
+    # Jobs a previous server process left running will never finish
+    orphaned = job_store.fail_processing_jobs("Server restarted before the job finished")
+    if orphaned:
+        print(f"\n  [WARN] Marked {orphaned} unfinished jobs from a previous run as failed")
+    
+    # Simulations run in worker processes, each loading its own PPO model
+    job_executor = JobExecutor(SIMULATION_WORKERS, JOB_TIMEOUT_SECONDS, initializer=init_simulation_worker,
+                               worker_stats=grid_cache_metrics)
+    print(f"\n  [OK] Job executor started: {SIMULATION_WORKERS} worker processes, {JOB_TIMEOUT_SECONDS:g} s job timeout")
+    
+    retention = Retention(job_store, RETENTION_TTL_SECONDS, MAX_RESULT_BYTES, on_evict=remove_result_files)
+    retention_task = asyncio.create_task(run_retention_periodically())
+    
     # Print summary
     print("\n" + "=" * 60)
     print("STARTUP SUMMARY:")
     print("=" * 60)
     print(f"  U-Net Model:     {'[OK] Loaded' if unet_model else '[FAIL] FAILED'}")
-    print(f"  PPO Model:       {'[OK] Loaded' if ppo_model else '[FAIL] FAILED'}")
+    print(f"  PPO Model:       {'[OK] Found' if ppo_version else '[FAIL] FAILED'}")
     print(f"  Chatbot:         {'[OK] Gemini API' if use_gemini else ('[OK] TensorFlow' if chatbot_model else '[WARN] Not Available')}")
     print("=" * 60)
     
-    if not unet_model or not ppo_model:
+    if not unet_model or not ppo_version:
         print("\n[WARN] CRITICAL WARNING: Essential models failed to load!")
         print("The simulation WILL NOT WORK without U-Net and PPO models.")
         print("Please check the errors above and ensure model files exist.")
         print("\nExpected model locations:")
         print(f"  - {os.path.abspath('models/unet_floorplan_model.pth')}")
-        print(f"  - {os.path.abspath(f'models/ppo_commander_{PPO_MODEL_VERSION}.zip')}")
+        print(f"  - {os.path.abspath(PPO_MODEL_PATH)}")
     else:
         print("\n[OK] All critical models loaded successfully!")
         print("Backend is ready to process fire evacuation simulations.")
@@ -216,6 +235,8 @@ async def lifespan(app: FastAPI):
     
     # Shutdown (cleanup if needed)
     print("\nShutting down backend...")
+    retention_task.cancel()
+    job_executor.shutdown(wait=False)
 
 # Initialize FastAPI app with lifespan
 app = FastAPI(title="Fire Evacuation Simulation API", version="1.0.0", lifespan=lifespan)
@@ -234,7 +255,7 @@ app.add_middleware(
 
 # Global variables for models
 unet_model = None
-ppo_model = None
+ppo_version = None  # PPO_MODEL_VERSION when its file is there for the job workers to load, else None
 device = None
 IMAGE_SIZE = 256
 
@@ -331,182 +352,83 @@ def chatbot_response(msg):
     res = get_response(ints, intents)
     return res
 
+# Frame spools (NDJSON, one per simulation job) and binary results (result_format='binary') are written here
+RESULT_FORMATS = ("json", "binary")
+
+# Live frame streams of the simulation jobs that are still running, by job_id
+frame_streams: Dict[str, FrameStream] = {}
+STREAM_KEEPALIVE_SECONDS = 15.0  # Comment line sent when no frame arrives for this long
+MAX_STREAM_BATCH = 100
+
 # Database setup
 def init_db():
-    conn = sqlite3.connect("jobs.db")
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS jobs (
-            job_id TEXT PRIMARY KEY,
-            status TEXT NOT NULL,
-            result TEXT,
-            error TEXT,
-            created_at TEXT NOT NULL
-        )
-    """)
-    conn.commit()
-    conn.close()
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    job_store.init()
 
 init_db()
 
 # Pydantic Models
-class SimulationConfig(BaseModel):
-    grid: List[List[int]]
-    exits: Optional[List[Tuple[int, int]]] = None  # User-placed exits (row, col format from frontend)
+
+MAX_BATCH_VARIANTS = 200
+
+class ScenarioVariant(BaseModel):
+    name: Optional[str] = None  # Label for the summary table
     fire_position: Tuple[int, int]  # (row, col) format from frontend
     agent_positions: List[Tuple[int, int]]  # [(row, col), ...] format from frontend
-    # New configuration options
-    use_rl: bool = True  # If False, use heuristic mode (no 10-agent limit)
-    threshold: float = 0.5  # U-Net segmentation threshold
-    invert_mask: bool = True  # Whether to invert the mask
-    extended_fire_steps: int = 0  # Continue fire spread after all agents done
-    assembly_point: Optional[Tuple[int, int]] = None  # (row, col) for assembly area
-
-
-# Coordinate conversion utilities
-def frontend_to_backend(row: int, col: int) -> Tuple[int, int]:
-    """Convert frontend (row, col) to backend (x, y) coordinates.
-    Frontend uses row=y, col=x convention.
-    Backend A* and agent positions use (x, y).
-    """
-    return (col, row)  # x=col, y=row
+    exits: Optional[List[Tuple[int, int]]] = None  # Overrides the batch options' exits
+    assembly_point: Optional[Tuple[int, int]] = None
+    seed: Optional[int] = None
 
+class BatchConfig(BaseModel):
+    grid: Optional[Union[List[List[int]], PackedGrid]] = None  # Shared by every variant, parsed once
+    grid_id: Optional[str] = None  # Instead of grid
+    variants: List[ScenarioVariant]  # At most MAX_BATCH_VARIANTS
+    options: Dict[str, Any] = {}  # SimulationConfig fields shared by every variant (use_rl, navigation, exits, ...)
 
-def backend_to_frontend(x: int, y: int) -> Tuple[int, int]:
-    """Convert backend (x, y) to frontend (row, col) coordinates."""
-    return (y, x)  # row=y, col=x
 
 class JobResponse(BaseModel):
     job_id: str
 
+class BatchResponse(BaseModel):
+    batch_id: str
+    job_ids: List[str]  # One per variant, in order
+
 class StatusResponse(BaseModel):
     status: str
     result: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
 
-# Database helper functions
-def update_job_status(job_id: str, status: str, result: Dict = None, error: str = None):
-    conn = sqlite3.connect("jobs.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT OR REPLACE INTO jobs (job_id, status, result, error, created_at) VALUES (?, ?, ?, ?, ?)",
-        (job_id, status, json.dumps(result) if result else None, error, datetime.now().isoformat())
-    )
-    conn.commit()
-    conn.close()
-
-def get_job_status(job_id: str) -> Dict:
-    conn = sqlite3.connect("jobs.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT status, result, error FROM jobs WHERE job_id = ?", (job_id,))
-    row = cursor.fetchone()
-    conn.close()
+def remove_result_files(job_id: str):
+    for path in (history_spool_path(job_id), binary_result_path(job_id)):
+        if os.path.exists(path):
+            os.remove(path)
+
+async def run_retention_periodically():
+    """Background task: expire and evict job results every RETENTION_INTERVAL_SECONDS"""
+    while True:
+        try:
+            await run_in_threadpool(retention.run)
+        except Exception as e:
+            print(f"[RETENTION] FAILED with error: {str(e)}", flush=True)
+        await asyncio.sleep(RETENTION_INTERVAL_SECONDS)
+
+def get_job_status(job_id: str, include_result: bool = True) -> Dict:
+    """Status, result and error of a job. Without include_result only the job metadata is read."""
+    job = job_store.get(job_id, include_result=include_result)
     
-    if not row:
+    if not job:
         return {
             "status": "not_found",
             "result": None,
             "error": "Job not found"
         }
     
-    status, result, error = row
     return {
-        "status": status,
-        "result": json.loads(result) if result else None,
-        "error": error
+        "status": job["status"],
+        "result": job["result"],
+        "error": job["error"]
     }
 
-def distribute_exits_to_model(user_exits: List[Tuple[int, int]], grid: np.ndarray, total_model_exits: int = 248) -> List[Tuple[int, int]]:
-    """
-    Distribute 248 model exits across user-defined exit points.
-    
-    IMPORTANT: Input exits should be in (x, y) format (backend convention).
-    Frontend sends (row, col) which should be converted to (x, y) = (col, row) before calling.
-    
-    Example:
-    - 1 user exit -> all 248 model exits at that location (with small offsets)
-    - 2 user exits -> 124 exits each
-    - 3 user exits -> 83, 83, 82 exits
-    
-    Args:
-        user_exits: List of (x, y) tuples (backend format)
-        grid: The grid array (256x256) where 0=free, 1=wall
-        total_model_exits: Total exits needed for model (default 248)
-    
-    Returns:
-        List of 248 (x, y) exit coordinates distributed across user exits
-    """
-    if not user_exits:
-        # Fallback: auto-detect exits from grid edges
-        return auto_detect_exits(grid, total_model_exits)
-    
-    num_user_exits = len(user_exits)
-    exits_per_location = total_model_exits // num_user_exits
-    remainder = total_model_exits % num_user_exits
-    
-    distributed_exits = []
-    
-    for i, (exit_x, exit_y) in enumerate(user_exits):
-        # Calculate how many exits for this location
-        count = exits_per_location + (1 if i < remainder else 0)
-        
-        for j in range(count):
-            # Add small random offset to prevent stacking (±2 pixels in a circle pattern)
-            angle = (2 * np.pi * j) / count if count > 1 else 0
-            radius = min(2, j % 3)  # Vary radius 0, 1, 2
-            offset_x = int(radius * np.cos(angle))
-            offset_y = int(radius * np.sin(angle))
-            
-            new_x = exit_x + offset_x
-            new_y = exit_y + offset_y
-            
-            # Clamp to grid bounds
-            new_x = max(0, min(255, new_x))
-            new_y = max(0, min(255, new_y))
-            
-            # Validate it's on free space (grid uses [y][x] indexing!)
-            if 0 <= new_y < grid.shape[0] and 0 <= new_x < grid.shape[1]:
-                if grid[new_y][new_x] == 0:
-                    distributed_exits.append((new_x, new_y))
-                else:
-                    # Fallback to original user position
-                    distributed_exits.append((exit_x, exit_y))
-            else:
-                distributed_exits.append((exit_x, exit_y))
-    
-    # Ensure exactly total_model_exits
-    while len(distributed_exits) < total_model_exits:
-        distributed_exits.append(user_exits[0])  # Pad with first exit
-    
-    return distributed_exits[:total_model_exits]
-
-def auto_detect_exits(grid: np.ndarray, max_exits: int = 248) -> List[Tuple[int, int]]:
-    """Fallback: Auto-detect exits from grid boundaries"""
-    exits = []
-    height, width = grid.shape
-    
-    # Check edges for free spaces (potential exits)
-    for x in range(width):
-        if grid[0, x] == 0:  # Top edge
-            exits.append((x, 0))
-        if grid[height-1, x] == 0:  # Bottom edge
-            exits.append((x, height-1))
-    
-    for y in range(height):
-        if grid[y, 0] == 0:  # Left edge
-            exits.append((0, y))
-        if grid[y, width-1] == 0:  # Right edge
-            exits.append((width-1, y))
-    
-    # Remove duplicates and limit
-    exits = list(set(exits))[:max_exits]
-    
-    # If still not enough, pad with corner
-    while len(exits) < max_exits:
-        exits.append(exits[0] if exits else (0, 0))
-    
-    return exits[:max_exits]
-
 
 
 # API Endpoints
@@ -517,7 +439,7 @@ async def health_check():
     return {
         "status": "healthy",
         "unet_loaded": unet_model is not None,
-        "ppo_loaded": ppo_model is not None,
+        "ppo_loaded": ppo_version is not None,  # Model file present; each job worker loads it
         "ppo_version": PPO_MODEL_VERSION,
         "maskable_ppo": USE_MASKABLE_PPO
     }
@@ -542,7 +464,8 @@ async def get_chatbot_response(request: ChatbotRequest):
 async def process_image(
     file: UploadFile = File(...),
     threshold: float = 0.5,
-    invert_mask: Optional[bool] = None  # None = auto-detect
+    invert_mask: Optional[bool] = None,  # None = auto-detect
+    grid_encoding: str = "json"
 ):
     """Process uploaded floor plan image and return grid with original image.
     
@@ -550,7 +473,10 @@ async def process_image(
         file: Floor plan image file
         threshold: Segmentation threshold (0.0-1.0). Lower = more walls detected.
         invert_mask: True=rooms are bright/white, False=walls are bright/white, None=auto-detect
+        grid_encoding: 'json' (nested lists), 'base64' or 'rle' (packed, see grid_codec)
     """
+    if grid_encoding not in GRID_ENCODINGS:
+        raise HTTPException(status_code=400, detail=f"grid_encoding must be one of {list(GRID_ENCODINGS)}")
     # Check if U-Net model is loaded
     if unet_model is None:
         raise HTTPException(
@@ -597,11 +523,9 @@ async def process_image(
         if grid is None:
             raise HTTPException(status_code=400, detail="Failed to process image")
         
-        # Convert numpy array to list for JSON serialization
-        grid_list = grid.tolist()
-        
         return {
-            "grid": grid_list,
+            "grid": encode_grid(grid, grid_encoding),
+            "grid_id": grid_store.put(grid),  # Lets simulations reference the grid instead of sending it back
             "originalImage": f"data:image/png;base64,{img_base64}",
             "gridSize": {"width": IMAGE_SIZE, "height": IMAGE_SIZE},
             "threshold": float(threshold),
@@ -613,12 +537,15 @@ async def process_image(
 
 
 @app.post("/api/process-image-gemini")
-async def process_image_gemini(file: UploadFile = File(...)):
+async def process_image_gemini(file: UploadFile = File(...), grid_encoding: str = "json"):
     """Process floor plan using Gemini Vision API for semantic analysis.
     
     Returns enhanced grid with door/window detection and room labeling.
     Falls back to U-Net if Gemini is unavailable.
+    grid_encoding is as for /api/process-image.
     """
+    if grid_encoding not in GRID_ENCODINGS:
+        raise HTTPException(status_code=400, detail=f"grid_encoding must be one of {list(GRID_ENCODINGS)}")
     gemini_api_key = os.environ.get("GEMINI_API_KEY")
     if not gemini_api_key or gemini_api_key == "your-gemini-api-key":
         raise HTTPException(
@@ -749,7 +676,8 @@ Windows are semi-permeable - fire spreads faster through them.
         os.unlink(temp_path)
         
         return {
-            "grid": enhanced_grid.tolist(),
+            "grid": encode_grid(enhanced_grid, grid_encoding),
+            "grid_id": grid_store.put(enhanced_grid),
             "originalImage": f"data:image/png;base64,{img_base64}",
             "gridSize": {"width": IMAGE_SIZE, "height": IMAGE_SIZE},
             "analysis": gemini_analysis,
@@ -776,320 +704,323 @@ Windows are semi-permeable - fire spreads faster through them.
         raise HTTPException(status_code=500, detail=f"Gemini processing error: {str(e)}")
 
 
-# Background simulation runner
-def run_simulation_task(job_id: str, config: SimulationConfig):
-    """Run simulation in background"""
+def finish_job(job_id: str, outcome: str, error: Optional[str]):
+    """Called by the job executor when a job ends, after the worker stored its status (if it got that far)"""
+    if outcome != "done":
+        print(f"[JOB {job_id[:8]}] {outcome.upper()}: {error}", flush=True)
+        # A job that stored its result just before being stopped keeps it, spool included
+        status = "cancelled" if outcome == "cancelled" else "failed"
+        if job_store.end_processing_job(job_id, status, error) and os.path.exists(history_spool_path(job_id)):
+            os.remove(history_spool_path(job_id))
+    # Closed after the final status is stored, so subscribers see it when the stream ends
+    stream = frame_streams.pop(job_id, None)
+    if stream is not None:
+        stream.close()
+
+# Result cache hits and misses of seeded requests since the server started
+result_cache_counters = {"hits": 0, "misses": 0}
+
+def result_cache_key(kind: str, config: BaseModel, grid: Optional[np.ndarray] = None) -> str:
+    """Hash of a request's canonical JSON; equal configs (with a seed) give equal results.
+    The grid counts by its content hash, so inline grids (passed validated, see
+    check_grid_reference) and grid_ids share entries."""
+    canonical = json.dumps({
+        "version": RESULT_CACHE_VERSION,
+        "kind": kind,
+        "ppo": ppo_version,
+        "grid": config.grid_id or grid_id(grid),
+        "config": config.model_dump(exclude={"grid", "grid_id"}),
+    }, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def cached_job_id(cache_key: Optional[str], executor: JobExecutor) -> Optional[str]:
+    """The job already holding (or computing) the result for cache_key, counting the hit or miss.
+    A 'processing' job only counts while executor still has it queued or running."""
+    if cache_key is None:
+        return None
+    cached = job_store.cached_job(cache_key)
+    if cached is None or (cached[1] == "processing" and not executor.has_job(cached[0])):
+        result_cache_counters["misses"] += 1
+        return None
+    job_id = cached[0]
+    result_cache_counters["hits"] += 1
+    job_store.touch(job_id)  # Keeps a popular result from aging out
+    print(f"[JOB {job_id[:8]}] Result cache hit", flush=True)
+    return job_id
+
+def require_job_executor() -> JobExecutor:
+    if job_executor is None:
+        raise HTTPException(status_code=503, detail="Job executor is not running")
+    return job_executor
+
+def check_simulation_config(config: SimulationConfig):
+    """Reject unknown option values with a 400"""
+    if config.navigation not in NAVIGATION_MODES:
+        raise HTTPException(status_code=400, detail=f"navigation must be one of {list(NAVIGATION_MODES)}")
+    if config.replan_policy not in REPLAN_POLICIES:
+        raise HTTPException(status_code=400, detail=f"replan_policy must be one of {list(REPLAN_POLICIES)}")
+    if config.agent_engine not in AGENT_ENGINES:
+        raise HTTPException(status_code=400, detail=f"agent_engine must be one of {list(AGENT_ENGINES)}")
+    if config.agent_engine == "population" and config.navigation == "astar":
+        raise HTTPException(status_code=400, detail="agent_engine 'population' needs navigation 'field' or 'incremental'")
+    if config.history_format not in HISTORY_FORMATS:
+        raise HTTPException(status_code=400, detail=f"history_format must be one of {list(HISTORY_FORMATS)}")
+    if config.raster_encoding not in RASTER_ENCODINGS:
+        raise HTTPException(status_code=400, detail=f"raster_encoding must be one of {list(RASTER_ENCODINGS)}")
+    if config.keyframe_interval < 1:
+        raise HTTPException(status_code=400, detail="keyframe_interval must be at least 1")
+    if config.result_format not in RESULT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"result_format must be one of {list(RESULT_FORMATS)}")
+
+def check_grid_reference(config: BaseModel) -> Optional[np.ndarray]:
+    """A request gives either an inline grid or the grid_id of a stored grid.
+    Returns the validated inline grid (None for a grid_id); an invalid one is a 400."""
+    if (config.grid is None) == (config.grid_id is None):
+        raise HTTPException(status_code=400, detail="Give either grid or grid_id")
+    if config.grid_id is not None:
+        if not grid_store.contains(config.grid_id):
+            raise HTTPException(status_code=404, detail=f"Unknown grid_id {config.grid_id}")
+        return None
     try:
-        # Convert grid to numpy array
-        grid = np.array(config.grid)
-        
-        # Convert frontend (row, col) coordinates to backend (x, y) format
-        # Frontend sends: (row, col) where row=y, col=x
-        # Backend expects: (x, y)
-        agent_positions_xy = [frontend_to_backend(row, col) for row, col in config.agent_positions]
-        fire_position_xy = frontend_to_backend(config.fire_position[0], config.fire_position[1])
-        
-        # Convert exit positions to (x, y) format if provided
-        if config.exits and len(config.exits) > 0:
-            exits_xy = [frontend_to_backend(row, col) for row, col in config.exits]
-            print(f"[JOB {job_id[:8]}] Converted {len(config.exits)} exits from (row,col) to (x,y) format", flush=True)
-            
-            # Validate exits - ensure they're on free cells, not walls, and not near agents
-            MIN_EXIT_AGENT_DISTANCE = 20  # Exits must be at least 20 cells from any agent
-            validated_exits = []
-            for ex in exits_xy:
-                ex_x, ex_y = int(ex[0]), int(ex[1])
-                if 0 <= ex_y < grid.shape[0] and 0 <= ex_x < grid.shape[1]:
-                    if grid[ex_y][ex_x] == 1:  # CELL_WALL
-                        print(f"[JOB {job_id[:8]}] WARNING: Exit ({ex_x}, {ex_y}) is on WALL, finding nearest free cell...", flush=True)
-                        # Search for nearest free cell that's not near agents
-                        found = False
-                        for radius in range(1, 50):
-                            for dy in range(-radius, radius + 1):
-                                for dx in range(-radius, radius + 1):
-                                    if abs(dx) == radius or abs(dy) == radius:
-                                        new_x, new_y = ex_x + dx, ex_y + dy
-                                        if 0 <= new_y < grid.shape[0] and 0 <= new_x < grid.shape[1]:
-                                            if grid[new_y][new_x] == 0:  # CELL_FREE
-                                                # Check distance to all agents
-                                                too_close = False
-                                                for agent_pos in agent_positions_xy:
-                                                    dist = np.sqrt((new_x - agent_pos[0])**2 + (new_y - agent_pos[1])**2)
-                                                    if dist < MIN_EXIT_AGENT_DISTANCE:
-                                                        too_close = True
-                                                        break
-                                                if not too_close:
-                                                    print(f"[JOB {job_id[:8]}] Fixed exit: ({ex_x}, {ex_y}) -> ({new_x}, {new_y})", flush=True)
-                                                    validated_exits.append((new_x, new_y))
-                                                    found = True
-                                                    break
-                                    if found:
-                                        break
-                                if found:
-                                    break
-                            if found:
-                                break
-                    else:
-                        validated_exits.append((ex_x, ex_y))
-            
-            if len(validated_exits) > 0:
-                exits_xy = validated_exits
-                print(f"[JOB {job_id[:8]}] Using {len(exits_xy)} validated exits", flush=True)
-            else:
-                exits_xy = None
-                print(f"[JOB {job_id[:8]}] No valid exits found, will auto-detect", flush=True)
-        else:
-            exits_xy = None
-        
-        print(f"[JOB {job_id[:8]}] Fire position: frontend={config.fire_position} -> backend={fire_position_xy}", flush=True)
-        print(f"[JOB {job_id[:8]}] Agent positions converted: {len(agent_positions_xy)} agents", flush=True)
-        
-        # Choose simulation mode based on config
-        num_agents = len(agent_positions_xy)
-        use_heuristic = not config.use_rl or num_agents > 10 or ppo_model is None
-        
-        if use_heuristic:
-            print(f"[JOB {job_id[:8]}] Using HEURISTIC mode (agents={num_agents}, use_rl={config.use_rl})", flush=True)
-            result = run_heuristic_simulation(
-                grid=grid,
-                agent_positions=agent_positions_xy,
-                fire_position=fire_position_xy,
-                exits=exits_xy,
-                max_steps=500,
-                extended_fire_steps=config.extended_fire_steps,
-                assembly_point=frontend_to_backend(config.assembly_point[0], config.assembly_point[1]) if config.assembly_point else None
-            )
-            update_job_status(job_id, "complete", result=result)
-            gc.collect()
-            return
-        
-        # RL Mode: Distribute user exits to 248 model exits
-        if exits_xy and len(exits_xy) > 0:
-            distributed_exits = distribute_exits_to_model(exits_xy, grid, total_model_exits=248)
-            print(f"[JOB {job_id[:8]}] Distributed {len(exits_xy)} user exits -> 248 model exits", flush=True)
-        else:
-            distributed_exits = auto_detect_exits(grid, max_exits=248)
-            print(f"[JOB {job_id[:8]}] Auto-detected {len(distributed_exits)} exits from grid boundaries", flush=True)
-        
-        # Create environment
-        env = EvacuationEnv(
-            grid=grid,
-            num_agents=len(agent_positions_xy),
-            max_steps=500,
-            agent_start_positions=agent_positions_xy,
-            fire_start_position=fire_position_xy,
-            exits=distributed_exits,  # Use distributed exits
-            max_agents=10  # Zero-padding for 500k_steps model compatibility
-        )
-        
-        # Run simulation
-        obs, _ = env.reset()
-        terminated, truncated = False, False
-        history = []
-        step_count = 0
-        max_steps = 500
-        
-        print(f"[JOB {job_id[:8]}] Starting RL simulation: {len(agent_positions_xy)} agents, {len(env.exits)} exits", flush=True)
-        
-        while not terminated and not truncated and step_count < max_steps:
-            if USE_MASKABLE_PPO:
-                # For MaskablePPO, action_mask must match training dimensions (248)
-                num_exits = len(env.exits) if env.exits else 248
-                action_mask = np.zeros((1, 248), dtype=np.int8)  # Shape: [1, 248] for batch size 1
-                action_mask[0, :num_exits] = 1  # Only enable actual exits
-                action, _ = ppo_model.predict(obs, action_masks=action_mask, deterministic=True)
-            else:
-                # For standard PPO v1.5
-                action, _ = ppo_model.predict(obs, deterministic=True)
-                # Apply modulo guard for v1.5 fixed action space
-                action = int(action) % len(env.exits)
-            
-            obs, _, terminated, truncated, _ = env.step(int(action))
-            step_count += 1
-            
-            # Log progress every 50 steps
-            if step_count % 50 == 0:
-                active = sum(1 for a in env.agents if a.status == 'evacuating')
-                escaped = sum(1 for a in env.agents if a.status == 'escaped')
-                burned = sum(1 for a in env.agents if a.status == 'burned')
-                print(f"[JOB {job_id[:8]}] Step {step_count}/{max_steps}: {active} active, {escaped} escaped, {burned} burned", flush=True)
-            
-            # Store frame data (convert fire coords from [y,x] to [row,col] for frontend)
-            fire_coords = np.argwhere(env.fire_sim.fire_map == 1).tolist()  # Already [y,x] = [row,col]
-            
-            agents_data = []
-            for agent in env.agents:
-                # Convert agent position from (x,y) to [row,col] for frontend
-                agent_pos_frontend = [agent.pos[1], agent.pos[0]]  # [y, x] = [row, col]
-                agents_data.append({
-                    "pos": agent_pos_frontend,
-                    "status": agent.status,
-                    "state": agent.state,
-                    "tripped": agent.tripped_timer > 0
-                })
-            
-            history.append({
-                "fire_map": fire_coords,
-                "agents": agents_data
-            })
-        
-        # Extended fire steps: continue fire spread after all agents are done
-        # Also move escaped agents to assembly point if provided
-        assembly_point_xy = frontend_to_backend(config.assembly_point[0], config.assembly_point[1]) if config.assembly_point else None
-        
-        if config.extended_fire_steps != 0:
-            if config.extended_fire_steps == -1:
-                # Burn until complete - continue fire until no more cells can burn
-                print(f"[JOB {job_id[:8]}] Burn until complete mode - spreading fire until fully consumed", flush=True)
-                if assembly_point_xy:
-                    print(f"[JOB {job_id[:8]}] Assembly point: {assembly_point_xy} - agents will move there after escaping", flush=True)
-                
-                max_burn_steps = 2000  # Safety limit
-                burn_step = 0
-                while burn_step < max_burn_steps:
-                    prev_fire_count = np.sum(env.fire_sim.fire_map)
-                    env.fire_sim.step()
-                    new_fire_count = np.sum(env.fire_sim.fire_map)
-                    
-                    # Move escaped agents toward assembly point
-                    if assembly_point_xy:
-                        for agent in env.agents:
-                            if agent.status == 'escaped':
-                                agent.move_to_assembly(grid, assembly_point_xy, env.fire_sim.fire_map)
-                                agent.check_status(env.fire_sim.fire_map, env.exits, assembly_point=assembly_point_xy)
-                    
-                    fire_coords = np.argwhere(env.fire_sim.fire_map == 1).tolist()
-                    agents_data = []
-                    for agent in env.agents:
-                        agent_pos_frontend = [agent.pos[1], agent.pos[0]]
-                        agents_data.append({
-                            "pos": agent_pos_frontend,
-                            "status": agent.status,
-                            "state": agent.state,
-                            "tripped": False
-                        })
-                    history.append({
-                        "fire_map": fire_coords,
-                        "agents": agents_data
-                    })
-                    
-                    burn_step += 1
-                    
-                    # Check if done: fire stopped AND all agents at assembly (or no assembly)
-                    fire_stopped = (new_fire_count == prev_fire_count)
-                    if assembly_point_xy:
-                        all_at_assembly = all(a.status in ['at_assembly', 'burned'] for a in env.agents)
-                        if fire_stopped and all_at_assembly:
-                            print(f"[JOB {job_id[:8]}] Fire fully spread and all agents at assembly after {burn_step} extra steps", flush=True)
-                            break
-                        elif fire_stopped:
-                            # Fire stopped but agents still moving to assembly - continue
-                            pass
-                    elif fire_stopped:
-                        print(f"[JOB {job_id[:8]}] Fire fully spread after {burn_step} extra steps", flush=True)
-                        break
-            else:
-                # Fixed number of extended steps
-                print(f"[JOB {job_id[:8]}] Running {config.extended_fire_steps} extended fire steps...", flush=True)
-                for extra_step in range(config.extended_fire_steps):
-                    env.fire_sim.step()
-                    fire_coords = np.argwhere(env.fire_sim.fire_map == 1).tolist()
-                    # Keep last agent positions frozen
-                    agents_data = []
-                    for agent in env.agents:
-                        agent_pos_frontend = [agent.pos[1], agent.pos[0]]
-                        agents_data.append({
-                            "pos": agent_pos_frontend,
-                            "status": agent.status,
-                            "state": agent.state,
-                            "tripped": False
-                        })
-                    history.append({
-                        "fire_map": fire_coords,
-                        "agents": agents_data
-                    })
-        
-        # Calculate final statistics
-        # Count both 'escaped' and 'at_assembly' as successfully evacuated
-        escaped = sum(1 for agent in env.agents if agent.status in ["escaped", "at_assembly"])
-        burned = sum(1 for agent in env.agents if agent.status == "burned")
-        total_agents = len(env.agents)
-        
-        print(f"[JOB {job_id[:8]}] Simulation complete at step {step_count}: {escaped}/{total_agents} escaped, {burned} burned", flush=True)
-        
-        # Prepare agent results with detailed information
-        agent_results = []
-        for i, agent in enumerate(env.agents):
-            # Normalize status for frontend (at_assembly counts as escaped)
-            final_status = "escaped" if agent.status in ["escaped", "at_assembly"] else agent.status
-            agent_results.append({
-                "agent_id": i,
-                "status": final_status,
-                "exit_time": agent.escape_time if hasattr(agent, 'escape_time') and agent.status in ["escaped", "at_assembly"] else None,
-                "path_length": agent.steps_taken if hasattr(agent, 'steps_taken') else step_count
-            })
-        
-        # Convert exits to frontend format [row, col] for visualization
-        exits_frontend = [[y, x] for x, y in (exits_xy if exits_xy else [])]
-        
-        # Convert assembly point to frontend format if provided
-        assembly_point_frontend = None
-        if config.assembly_point:
-            assembly_point_frontend = [config.assembly_point[0], config.assembly_point[1]]  # Already in (row, col)
-        
-        # Prepare result with correct structure for frontend
-        result = {
-            "total_agents": total_agents,
-            "escaped_count": escaped,
-            "burned_count": burned,
-            "time_steps": step_count,
-            "agent_results": agent_results,
-            "exits": exits_frontend,  # Include exits for visualization
-            "assembly_point": assembly_point_frontend,  # Include assembly point
-            "commander_actions": history[:100] if history else [],  # Limit to first 100 actions
-            "animation_data": {
-                "history": history
-            },
-            "mode": "rl"
-        }
-        
-        # Update job status to complete
-        update_job_status(job_id, "complete", result=result)
-        
-        # Clean up memory after simulation
-        del env
-        del history
-        del grid
-        gc.collect()
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-        
-    except Exception as e:
-        # Update job status to failed
-        print(f"[JOB {job_id[:8]}] FAILED with error: {str(e)}", flush=True)
-        import traceback
-        traceback.print_exc()
-        update_job_status(job_id, "failed", error=str(e))
-        # Clean up on error too
-        gc.collect()
+        return prepare_grid(config.grid)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def validate_grid(grid: np.ndarray) -> np.ndarray:
+    """Raises ValueError unless grid is a non-empty 2-D array of cell codes"""
+    if grid.ndim != 2 or grid.size == 0:
+        raise ValueError("grid must be a non-empty list of rows")
+    if grid.size > MAX_GRID_CELLS:
+        raise ValueError(f"grid must have at most {MAX_GRID_CELLS} cells")
+    if grid.min() < CELL_FREE or grid.max() > CELL_EXTERIOR:
+        raise ValueError(f"grid cells must be between {CELL_FREE} and {CELL_EXTERIOR}")
+    return grid
+
+def prepare_grid(grid: Union[List[List[int]], PackedGrid]) -> np.ndarray:
+    """Parse a request grid; raises ValueError unless it is a non-empty rectangle of cell codes"""
+    try:
+        array = grid_array(grid)
+    except ValueError as e:
+        raise ValueError(str(e) if isinstance(grid, PackedGrid) else "grid rows must all have the same length")
+    return validate_grid(array)
+
+def submit_simulation(executor: JobExecutor, config: SimulationConfig, grid: Optional[np.ndarray] = None) -> str:
+    """Queue a simulation job, or find a seeded config's job in the result cache. Returns the job_id.
+    grid is the config's validated inline grid, if it has one."""
+    # A seeded config fully determines the result, so a stored (or running) job can answer it
+    cache_key = result_cache_key("simulation", config, grid) if config.seed is not None else None
+    cached = cached_job_id(cache_key, executor)
+    if cached is not None:
+        return cached
+    
+    # Generate unique job ID
+    job_id = str(uuid.uuid4())
+    
+    # Initialize job status
+    update_job_status(job_id, "processing")
+    if cache_key is not None:
+        job_store.set_cached_job(cache_key, job_id)
+    stream = frame_streams[job_id] = FrameStream()
+    
+    # Queue the job for a worker process
+    executor.submit(job_id, run_simulation_task, (config,), on_frame=stream.publish,
+                    frames_wanted=stream.has_subscribers, on_finish=finish_job)
+    return job_id
 
 @app.post("/api/run-simulation", response_model=JobResponse)
-async def run_simulation(config: SimulationConfig, background_tasks: BackgroundTasks):
+async def run_simulation(config: SimulationConfig):
     """Start simulation in background"""
+    grid = check_grid_reference(config)
+    check_simulation_config(config)
+    executor = require_job_executor()
+    
     try:
-        # Generate unique job ID
+        return {"job_id": submit_simulation(executor, config, grid)}
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error starting simulation: {str(e)}")
+
+@app.post("/api/run-batch", response_model=BatchResponse)
+async def run_batch(config: BatchConfig):
+    """Start one simulation job per scenario variant of a shared grid"""
+    if not 1 <= len(config.variants) <= MAX_BATCH_VARIANTS:
+        raise HTTPException(status_code=400, detail=f"variants must have between 1 and {MAX_BATCH_VARIANTS} entries")
+    if "grid" in config.options or "grid_id" in config.options:
+        raise HTTPException(status_code=400, detail="options must not contain grid or grid_id")
+    grid = await run_in_threadpool(check_grid_reference, config)
+    if grid is not None:
+        # Parsed once and stored, so every variant's worker loads it by grid_id
+        batch_grid_id = await run_in_threadpool(grid_store.put, grid)
+    else:
+        batch_grid_id = config.grid_id
+    variants = []
+    for index, variant in enumerate(config.variants):
+        fields = {**config.options, **variant.model_dump(exclude_unset=True, exclude={"name"}),
+                  "grid": None, "grid_id": batch_grid_id}
+        try:
+            variant_config = SimulationConfig(**fields)
+        except ValidationError as e:
+            raise HTTPException(status_code=400, detail=f"variants[{index}]: {e}")
+        check_simulation_config(variant_config)
+        variants.append((variant_config, variant.name))
+    executor = require_job_executor()
+    
+    try:
+        batch_id = str(uuid.uuid4())
+        jobs = [(submit_simulation(executor, variant_config), name) for variant_config, name in variants]
+        job_store.add_batch(batch_id, jobs)
+        print(f"[BATCH {batch_id[:8]}] Queued {len(jobs)} variants on grid {batch_grid_id[:8]}", flush=True)
+        return {"batch_id": batch_id, "job_ids": [job_id for job_id, _ in jobs]}
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error starting batch: {str(e)}")
+
+@app.get("/api/batch/{batch_id}")
+async def get_batch(batch_id: str):
+    """Status of every variant of a batch and a summary table of the finished ones"""
+    jobs = await run_in_threadpool(job_store.batch, batch_id)
+    if not jobs:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    counts = Counter(job["status"] for job in jobs)
+    summary = []
+    for job in jobs:
+        if job["summary"] is None:
+            continue
+        summary.append({
+            "index": job["position"],
+            "name": job["name"],
+            "job_id": job["job_id"],
+            "total_agents": job["summary"].get("total_agents"),
+            "escaped": job["summary"].get("escaped_count"),
+            "burned": job["summary"].get("burned_count"),
+            "time_steps": job["summary"].get("time_steps"),
+        })
+    return {
+        "batch_id": batch_id,
+        "status": "processing" if counts["processing"] else "done",
+        "counts": dict(counts),
+        "variants": [{"index": job["position"], "name": job["name"], "job_id": job["job_id"],
+                      "status": job["status"], "error": job["error"]} for job in jobs],
+        "summary": summary,
+    }
+
+@app.post("/api/run-ensemble", response_model=JobResponse)
+async def run_ensemble(config: EnsembleConfig):
+    """Start Monte Carlo fire ensemble in background"""
+    if not 1 <= config.num_realizations <= MAX_ENSEMBLE_REALIZATIONS:
+        raise HTTPException(status_code=400, detail=f"num_realizations must be between 1 and {MAX_ENSEMBLE_REALIZATIONS}")
+    if config.max_steps < 1:
+        raise HTTPException(status_code=400, detail="max_steps must be at least 1")
+    if any(not 0 <= q <= 100 for q in config.percentiles):
+        raise HTTPException(status_code=400, detail="percentiles must be between 0 and 100")
+    grid = check_grid_reference(config)
+    executor = require_job_executor()
+    
+    try:
+        cache_key = result_cache_key("ensemble", config, grid) if config.seed is not None else None
+        cached = cached_job_id(cache_key, executor)
+        if cached is not None:
+            return {"job_id": cached}
         job_id = str(uuid.uuid4())
-        
-        # Initialize job status
         update_job_status(job_id, "processing")
-        
-        # Add background task
-        background_tasks.add_task(run_simulation_task, job_id, config)
-        
+        if cache_key is not None:
+            job_store.set_cached_job(cache_key, job_id)
+        executor.submit(job_id, run_ensemble_task, (config,), on_finish=finish_job)
         return {"job_id": job_id}
     
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error starting simulation: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error starting ensemble: {str(e)}")
+
+SPOOL_PLACEHOLDER = "\u0000history\u0000"
+SPOOL_LINES_PER_CHUNK = 64
+
+def spooled_status_chunks(job: Dict, spool: str):
+    """JSON body of a status response, with the animation history copied from its spool file line by line."""
+    result = dict(job["result"])
+    animation = {k: v for k, v in result["animation_data"].items() if k != "spooled_frames"}
+    animation["history"] = SPOOL_PLACEHOLDER
+    result["animation_data"] = animation
+    body = json.dumps({"status": job["status"], "result": result, "error": job["error"]})
+    prefix, suffix = body.split(json.dumps(SPOOL_PLACEHOLDER))
+    yield prefix + "["
+    with open(spool, encoding="utf-8") as f:
+        separator = ""
+        for lines in iter(lambda: list(islice(f, SPOOL_LINES_PER_CHUNK)), []):
+            yield separator + ",".join(line.rstrip("\n") for line in lines)
+            separator = ","
+    yield "]" + suffix
+
+def spooled_history(job_id: str, animation: Dict):
+    """Frames of a stored result, inline or read back from the job's spool file."""
+    if "spooled_frames" in animation:
+        return read_spool(history_spool_path(job_id))
+    return animation["history"]
+
+@app.get("/api/jobs")
+async def get_jobs():
+    """Worker count, time limit, and the running and queued jobs of the job executor"""
+    return require_job_executor().stats()
+
+@app.get("/api/store")
+async def get_store_metrics():
+    """Job store size, result totals, retention eviction counts and result cache hits"""
+    if retention is None:
+        raise HTTPException(status_code=503, detail="Retention is not running")
+    metrics = await run_in_threadpool(retention.metrics)
+    entries = await run_in_threadpool(job_store.cache_entries)
+    metrics["result_cache"] = {**result_cache_counters, "entries": entries}
+    metrics["grids"] = await run_in_threadpool(grid_store.stats)
+    metrics["grid_cache"] = worker_grid_cache_metrics()
+    return metrics
+
+def worker_grid_cache_metrics() -> Dict:
+    """Derived-structure cache counts summed over the current job worker processes"""
+    reports = [report for report in require_job_executor().stats()["worker_stats"] if report]
+    totals = {name: sum(report[name] for report in reports) for name in ("grids", "entries", "hits", "misses", "evictions")}
+    lookups = totals["hits"] + totals["misses"]
+    return {"workers_reporting": len(reports), **totals, "hit_rate": totals["hits"] / lookups if lookups else None}
+
+@app.post("/api/grids")
+async def upload_grid(request: Request, rows: int, cols: int, encoding: str = "raw"):
+    """Store a grid sent as packed bytes and return its grid_id.
+    encoding 'raw' is one uint8 cell code per cell (row-major), 'rle' their runs (see grid_codec)."""
+    if encoding not in ("raw", "rle"):
+        raise HTTPException(status_code=400, detail="encoding must be 'raw' or 'rle'")
+    if rows < 1 or cols < 1 or rows * cols > MAX_GRID_CELLS:
+        raise HTTPException(status_code=400, detail=f"rows and cols must be positive with at most {MAX_GRID_CELLS} cells")
+    data = await request.body()
+    try:
+        if encoding == "rle":
+            cells = decode_runs(data, rows * cols)
+        elif len(data) != rows * cols:
+            raise ValueError(f"Expected {rows * cols} bytes for a {rows}x{cols} grid, got {len(data)}")
+        else:
+            cells = np.frombuffer(data, dtype=np.uint8)
+        grid = validate_grid(cells.reshape(rows, cols))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"grid_id": await run_in_threadpool(grid_store.put, grid), "shape": [rows, cols]}
+
+@app.get("/api/grids/{grid_id}")
+async def get_grid(grid_id: str):
+    """Shape of a stored grid, to check whether it still has to be uploaded"""
+    try:
+        grid = grid_store.load(grid_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Grid not found")
+    return {"grid_id": grid_id, "shape": list(grid.shape)}
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running simulation or ensemble job"""
+    state = require_job_executor().cancel(job_id)
+    if state is None:
+        job = get_job_status(job_id, include_result=False)
+        if job["status"] == "not_found":
+            raise HTTPException(status_code=404, detail="Job not found")
+        raise HTTPException(status_code=409, detail=f"Job is not queued or running (status '{job['status']}')")
+    # A running job is stopped by its worker thread shortly after this returns
+    return {"job_id": job_id, "status": "cancelled" if state == "queued" else "cancelling"}
 
 @app.get("/api/status/{job_id}", response_model=StatusResponse)
 async def get_status(job_id: str):
@@ -1099,8 +1030,104 @@ async def get_status(job_id: str):
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     
+    # Spooled frames are streamed from disk rather than loaded into one response
+    animation = (job["result"] or {}).get("animation_data") or {}
+    spool = history_spool_path(job_id)
+    if "spooled_frames" in animation and os.path.isfile(spool):
+        return StreamingResponse(spooled_status_chunks(job, spool), media_type="application/json")
+    
     return job
 
+@app.get("/api/result/{job_id}.bin")
+async def get_binary_result(job_id: str, range_header: Optional[str] = Header(None, alias="Range")):
+    """Serve a binary result (result_format='binary'), honouring single-range Range requests"""
+    path = binary_result_path(job_id)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Binary result not found")
+    
+    size = os.path.getsize(path)
+    try:
+        byte_range = parse_byte_range(range_header, size)
+    except ValueError as e:
+        raise HTTPException(status_code=416, detail=str(e), headers={"Content-Range": f"bytes */{size}"})
+    
+    start, end = byte_range if byte_range else (0, size - 1)
+    with open(path, "rb") as f:
+        f.seek(start)
+        body = f.read(end - start + 1)
+    headers = {"Accept-Ranges": "bytes"}
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return Response(content=body, status_code=206 if byte_range else 200,
+                    media_type="application/octet-stream", headers=headers)
+
+def stream_end_event(job_id: str) -> str:
+    job = get_job_status(job_id, include_result=False)
+    return format_sse("end", {"status": job["status"], "error": job["error"]})
+
+async def live_frame_events(job_id: str, stream: FrameStream, from_frame: int, batch: int):
+    """SSE messages of a running job. A client that falls behind the stream's window is sent a
+    gap for the frames it missed; it never holds back the simulation."""
+    subscriber = stream.subscribe(from_frame)
+    try:
+        while True:
+            start, frames, skipped, finished = await run_in_threadpool(
+                stream.read, subscriber, batch, STREAM_KEEPALIVE_SECONDS)
+            if skipped:
+                # Frames that left the window are only available from the final result
+                yield format_sse("gap", {"from": start - skipped, "to": start})
+            if frames:
+                yield format_sse("frames", {"start": start, "frames": frames}, event_id=start + len(frames) - 1)
+            elif not finished:
+                yield ": keep-alive\n\n"
+            if finished:
+                break
+    finally:
+        stream.unsubscribe(subscriber)
+    yield stream_end_event(job_id)
+
+def stored_frame_events(job_id: str, result: Optional[Dict], from_frame: int, batch: int):
+    """SSE messages of a finished job, replayed from its stored result."""
+    animation = (result or {}).get("animation_data")
+    if animation:
+        frames = replay_frames(animation, spooled_history(job_id, animation), from_frame)
+        start = from_frame
+        while True:
+            chunk = list(islice(frames, batch))
+            if not chunk:
+                break
+            yield format_sse("frames", {"start": start, "frames": chunk}, event_id=start + len(chunk) - 1)
+            start += len(chunk)
+    yield stream_end_event(job_id)
+
+@app.get("/api/stream/{job_id}")
+async def stream_simulation(job_id: str, from_frame: int = 0, batch: int = 1,
+                            last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")):
+    """Stream simulation frames as Server-Sent Events while the job runs, resuming after Last-Event-ID or at from_frame"""
+    if not 1 <= batch <= MAX_STREAM_BATCH:
+        raise HTTPException(status_code=400, detail=f"batch must be between 1 and {MAX_STREAM_BATCH}")
+    if last_event_id:
+        try:
+            from_frame = int(last_event_id) + 1
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Last-Event-ID must be a frame index")
+    if from_frame < 0:
+        raise HTTPException(status_code=400, detail="from_frame must not be negative")
+    
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    stream = frame_streams.get(job_id)
+    if stream is not None:
+        return StreamingResponse(live_frame_events(job_id, stream, from_frame, batch),
+                                 media_type="text/event-stream", headers=headers)
+    
+    job = get_job_status(job_id)
+    if job["status"] == "not_found":
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == "processing":
+        raise HTTPException(status_code=409, detail="Job has no live frame stream")
+    return StreamingResponse(stored_frame_events(job_id, job["result"], from_frame, batch),
+                             media_type="text/event-stream", headers=headers)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
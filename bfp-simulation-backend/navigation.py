@@ -0,0 +1,432 @@
+import numpy as np
+
+from simulation import walkable_mask, exterior_mask, exterior_cells
+
+# Distance stored for cells that cannot reach any exit
+UNREACHABLE = -1
+# Next-hop direction codes, in the neighbour order used by a_star_search:
+# 0 = (x, y + 1), 1 = (x, y - 1), 2 = (x + 1, y), 3 = (x - 1, y)
+NO_HOP = -1
+
+
+class ExitNavigationField:
+    """
+    Walking distance to the nearest exit for every cell, plus the next cell to step to.
+
+    One multi-source BFS from all exits over non-wall, non-burning cells replaces a
+    separate A* per agent: an agent moves by looking up the next hop of the cell it is
+    standing on. Cells are kept as flat indices into a grid with a one-cell border (so
+    the neighbours of padded cell i are i +/- 1 and i +/- stride) and the BFS expands a
+    whole distance level per NumPy pass.
+
+    The field is built once and then repaired from the fire's ignition delta (see
+    FireSimulator.last_ignited), in the spirit of LPA*: only cells whose distance can
+    grow because their route ran through a newly burning cell are re-routed, by a
+    bucketed BFS seeded from the still-valid cells around them. Cells with an intact
+    route keep their distance and next hop, so the repaired field is identical to a
+    fresh build and its cost follows how much of the routing the fire actually cut.
+    """
+
+    def __init__(self, grid, exits, fire_map=None, passable=None):
+        """
+        Args:
+            grid: 2D numpy array of cell types
+            exits: (x, y) exit positions (list or (n, 2) array); exits on blocked cells
+                or outside the grid are ignored
+            fire_map: Optional 2D array where 1=fire, cells treated as blocked
+            passable: Optional boolean raster of walkable cells (default: non-wall cells)
+        """
+        self.rows, self.cols = grid.shape
+        self._stride = self.cols + 2
+        self._offsets = np.array([self._stride, -self._stride, 1, -1], dtype=np.int64)
+
+        padded = np.zeros((self.rows + 2, self.cols + 2), dtype=np.uint8)
+        padded[1:-1, 1:-1] = walkable_mask(grid) if passable is None else passable
+        self._open = padded.ravel()
+        if fire_map is not None:
+            self._open[self._to_padded(np.flatnonzero(fire_map == 1))] = 0
+
+        exits = np.asarray(exits, dtype=np.int64).reshape(-1, 2)
+        exit_xs, exit_ys = exits[:, 0], exits[:, 1]
+        inside = (exit_xs >= 0) & (exit_xs < self.cols) & (exit_ys >= 0) & (exit_ys < self.rows)
+        self._exits = np.unique(self._to_padded(exit_ys[inside] * self.cols + exit_xs[inside]))
+        self._mark = np.zeros_like(self._open)  # scratch mask used while repairing
+        self.repaired_cells = 0
+        self._rebuild()
+
+    def _to_padded(self, cells):
+        rows, cols = np.divmod(cells, self.cols)
+        return (rows + 1) * self._stride + cols + 1
+
+    def _rebuild(self):
+        """Run the multi-source BFS and derive the next-hop table from the distances."""
+        unvisited = self._open.copy()
+        dist = np.full(unvisited.size, UNREACHABLE, dtype=np.int32)
+        level = np.compress(unvisited.take(self._exits).view(bool), self._exits)
+        unvisited[level] = 0
+        dist[level] = 0
+        d = 0
+        while level.size:
+            d += 1
+            candidates = (self._offsets[:, None] + level).ravel()
+            candidates = np.compress(unvisited.take(candidates).view(bool), candidates)
+            if candidates.size == 0:
+                break
+            candidates.sort()
+            level = np.compress(np.concatenate(([True], candidates[1:] != candidates[:-1])), candidates)
+            unvisited[level] = 0
+            dist[level] = d
+        self._dist = dist
+
+        # Border cells are never reachable, so the interior slice covers every routed cell
+        stride = self._stride
+        self._hop = np.full(dist.size, NO_HOP, dtype=np.int32)
+        routed = stride + np.flatnonzero(dist[stride:dist.size - stride] > 0)
+        self._hop[routed] = self._next_hops(routed)
+
+    def _next_hops(self, cells):
+        """Pick, for each routed cell, the first neighbour in a_star_search order that is one step closer."""
+        hops = np.full(cells.size, NO_HOP, dtype=np.int32)
+        closer_dist = self._dist.take(cells) - 1
+        for offset in self._offsets[::-1].tolist():
+            neighbours = cells + offset
+            closer = self._dist.take(neighbours) == closer_dist
+            hops[closer] = neighbours[closer]
+        return hops
+
+    def _invalidate(self, roots):
+        """
+        Find the cells whose distance may grow now that roots are blocked.
+
+        A cell keeps its distance while some neighbour one step closer to an exit keeps
+        its own, so invalidation spreads outward from the roots in waves: each wave
+        checks the cells one step farther out than the cells invalidated by the previous
+        one, and invalidates those left without a valid closer neighbour. A cell that
+        survives a check is checked again if a later wave invalidates another of its
+        closer neighbours.
+
+        Returns:
+            (invalid cells including roots, checked cells that stay valid)
+        """
+        dist, invalid = self._dist, self._mark
+        offsets = self._offsets[:, None]
+        invalid[roots] = 1
+        found, checked = [roots], []
+        level = roots
+        while level.size:
+            farther = offsets + level
+            farther = np.compress(((dist.take(farther) == dist.take(level) + 1)
+                                   & (invalid.take(farther) == 0)).ravel(), farther.ravel())
+            if farther.size == 0:
+                break
+            farther.sort()
+            farther = np.compress(np.concatenate(([True], farther[1:] != farther[:-1])), farther)
+            closer = offsets + farther
+            supported = ((dist.take(closer) == dist.take(farther) - 1) & (invalid.take(closer) == 0)).any(axis=0)
+            checked.append(farther[supported])
+            level = farther[~supported]
+            invalid[level] = 1
+            found.append(level)
+
+        invalid_cells = np.concatenate(found)
+        kept = np.concatenate(checked) if checked else roots[:0]
+        kept = np.unique(np.compress(invalid.take(kept) == 0, kept))
+        invalid[invalid_cells] = 0
+        return invalid_cells, kept
+
+    def update(self, ignited_cells):
+        """
+        Block newly burning cells and re-route the cells whose route ran through them.
+
+        Args:
+            ignited_cells: Flat fire_map indices (y * cols + x), e.g. FireSimulator.last_ignited
+
+        Returns:
+            Number of cells that had to be re-routed
+        """
+        if len(ignited_cells) == 0:
+            return 0
+        padded = self._to_padded(np.asarray(ignited_cells, dtype=np.int64))
+        self._open[padded] = 0
+        roots = np.compress(self._dist.take(padded) != UNREACHABLE, padded)
+        if roots.size == 0:
+            return 0
+
+        dist, hop, region = self._dist, self._hop, self._mark
+        affected, kept = self._invalidate(roots)
+        dist[affected] = UNREACHABLE
+        hop[affected] = NO_HOP
+        region[affected] = self._open.take(affected)
+
+        # Seeds: routed cells bordering the affected region keep their exact distances
+        seeds = (self._offsets[:, None] + affected).ravel()
+        seeds = np.compress(dist.take(seeds) != UNREACHABLE, seeds)
+        seeds = np.unique(seeds)
+        seed_dist = dist.take(seeds)
+        order = np.argsort(seed_dist, kind='stable')
+        seeds, seed_dist = seeds.take(order), seed_dist.take(order)
+
+        # Bucketed BFS: level d holds the cells re-reached at d plus the seeds at d
+        next_seed = 0
+        level = seeds[:0]
+        d = int(seed_dist[0]) if seeds.size else 0
+        while True:
+            if next_seed < seeds.size and seed_dist[next_seed] == d:
+                end = int(np.searchsorted(seed_dist, d, side='right'))
+                level = np.concatenate((level, seeds[next_seed:end]))
+                next_seed = end
+            if level.size == 0:
+                if next_seed >= seeds.size:
+                    break
+                d = int(seed_dist[next_seed])
+                continue
+            d += 1
+            candidates = (self._offsets[:, None] + level).ravel()
+            candidates = np.compress(region.take(candidates).view(bool), candidates)
+            if candidates.size:
+                candidates.sort()
+                candidates = np.compress(np.concatenate(([True], candidates[1:] != candidates[:-1])), candidates)
+                region[candidates] = 0
+                dist[candidates] = d
+            level = candidates
+        region[affected] = 0
+
+        # Kept cells may have lost the neighbour they used to step to
+        rerouted = np.concatenate((np.compress(dist.take(affected) > 0, affected), kept))
+        hop[rerouted] = self._next_hops(rerouted)
+        self.repaired_cells += rerouted.size
+        return rerouted.size
+
+    @property
+    def distance(self):
+        """(rows, cols) steps to the nearest exit, UNREACHABLE where no exit can be reached."""
+        return self._dist.reshape(self.rows + 2, self._stride)[1:-1, 1:-1]
+
+    @property
+    def next_hop_direction(self):
+        """(rows, cols) int8 direction codes (see NO_HOP) of the next step toward an exit."""
+        hop = self._hop.reshape(self.rows + 2, self._stride)[1:-1, 1:-1]
+        cells = np.arange(self._dist.size).reshape(hop.shape[0] + 2, self._stride)[1:-1, 1:-1]
+        directions = np.full(hop.shape, NO_HOP, dtype=np.int8)
+        for code, offset in enumerate(self._offsets.tolist()):
+            directions[(hop != NO_HOP) & (hop - cells == offset)] = code
+        return directions
+
+    def distance_at(self, pos):
+        """Steps from (x, y) to the nearest exit, or UNREACHABLE."""
+        x, y = int(pos[0]), int(pos[1])
+        if not (0 <= x < self.cols and 0 <= y < self.rows):
+            return UNREACHABLE
+        return int(self._dist[(y + 1) * self._stride + x + 1])
+
+    def next_cells(self, xs, ys):
+        """
+        Vectorized next-hop lookup for many in-bounds positions at once.
+
+        Args:
+            xs, ys: Integer arrays of x and y coordinates
+
+        Returns:
+            (next_xs, next_ys, has_hop); entries without a next hop are meaningless
+        """
+        stride = self._stride
+        hop = self._hop[(np.asarray(ys) + 1) * stride + np.asarray(xs) + 1]
+        next_ys, next_xs = np.divmod(hop, stride)
+        return next_xs - 1, next_ys - 1, hop != NO_HOP
+
+    def path_from(self, pos, max_length):
+        """
+        Follow next hops from (x, y).
+
+        Args:
+            pos: (x, y) starting position
+            max_length: Maximum number of cells to return
+
+        Returns:
+            List of up to max_length (x, y) positions (excluding pos); empty at an
+            exit or where no exit can be reached
+        """
+        x, y = int(pos[0]), int(pos[1])
+        if not (0 <= x < self.cols and 0 <= y < self.rows):
+            return []
+        stride = self._stride
+        cell = (y + 1) * stride + x + 1
+        path = []
+        for _ in range(max_length):
+            cell = int(self._hop[cell])
+            if cell == NO_HOP:
+                break
+            row, col = divmod(cell, stride)
+            path.append((col - 1, row - 1))
+        return path
+
+
+class ExitFieldRouter:
+    """
+    One ExitNavigationField per exit, built the first time an agent is sent to that
+    exit and repaired from the same ignition deltas afterwards.
+
+    This keeps the per-agent exit assignment of A* routing while planning state
+    survives between steps instead of being thrown away on every replan.
+    """
+
+    def __init__(self, grid, fire_map=None):
+        """
+        Args:
+            grid: 2D numpy array of cell types
+            fire_map: Optional 2D array where 1=fire at the time the router is created
+        """
+        self.grid = grid
+        self._burning = np.zeros(grid.shape, dtype=bool)
+        if fire_map is not None:
+            self._burning |= fire_map == 1
+        self.fields = {}
+
+    def field_for(self, exit_pos):
+        """Return the field routing to exit_pos, an (x, y) tuple."""
+        key = (int(exit_pos[0]), int(exit_pos[1]))
+        field = self.fields.get(key)
+        if field is None:
+            field = ExitNavigationField(self.grid, [key], self._burning)
+            self.fields[key] = field
+        return field
+
+    def update(self, ignited_cells):
+        """Block newly burning cells in every field; returns the total number of re-routed cells."""
+        if len(ignited_cells) == 0:
+            return 0
+        self._burning.ravel()[ignited_cells] = True
+        return sum(field.update(ignited_cells) for field in self.fields.values())
+
+    @property
+    def repaired_cells(self):
+        return sum(field.repaired_cells for field in self.fields.values())
+
+
+class PathOccupancyIndex:
+    """
+    Map grid cells to the agents whose planned path crosses them.
+
+    Used with per-agent A* routing: after a fire step only the agents whose remaining
+    path runs through a newly burning cell need a new path. Paths are referenced, not
+    copied, so cells an agent has already walked (popped from its path) stop counting.
+    """
+
+    def __init__(self, cols):
+        """
+        Args:
+            cols: Grid width, used to turn (x, y) into flat y * cols + x indices
+        """
+        self.cols = cols
+        self._agents_by_cell = {}
+        self._cells_by_agent = {}
+        self._paths = {}
+
+    def set_path(self, agent, path):
+        """Index the path (list of (x, y)) an agent is about to follow."""
+        self.remove(agent)
+        cols = self.cols
+        cells = {y * cols + x for x, y in path}
+        self._cells_by_agent[agent] = cells
+        self._paths[agent] = path
+        for cell in cells:
+            self._agents_by_cell.setdefault(cell, set()).add(agent)
+
+    def remove(self, agent):
+        """Forget an agent, e.g. once it has escaped or burned."""
+        self._paths.pop(agent, None)
+        for cell in self._cells_by_agent.pop(agent, ()):
+            agents = self._agents_by_cell[cell]
+            agents.discard(agent)
+            if not agents:
+                del self._agents_by_cell[cell]
+
+    def agents_crossing(self, cells):
+        """
+        Find agents whose remaining path crosses any of the given cells.
+
+        Args:
+            cells: Flat indices (y * cols + x), e.g. FireSimulator.last_ignited
+
+        Returns:
+            Set of agents
+        """
+        candidates = set()
+        lookup = self._agents_by_cell.get
+        for cell in np.asarray(cells).tolist():
+            agents = lookup(cell)
+            if agents:
+                candidates |= agents
+        if not candidates:
+            return candidates
+
+        cols = self.cols
+        hit_cells = {(cell % cols, cell // cols) for cell in np.asarray(cells).tolist()
+                     if cell in self._agents_by_cell}
+        return {agent for agent in candidates
+                if any(tuple(pos) in hit_cells for pos in self._paths[agent])}
+
+
+class AssemblyRouter:
+    """
+    Routes for escaped agents walking to the assembly point.
+
+    Mirrors the two phases of plan_assembly_path with tables built once per run
+    instead of a BFS and an A* search per agent: inside the building agents follow
+    a field to the nearest exterior cell, and on the exterior band, which never
+    changes during a run, they follow an exterior-only field to the assembly point.
+    The inside field is repaired from the ignitions recorded since it was last used,
+    so it costs nothing while every escaped agent is already outside.
+    """
+
+    def __init__(self, grid, assembly_point, fire_map=None):
+        """
+        Args:
+            grid: 2D numpy array of cell types
+            assembly_point: (x, y) assembly point, expected on an exterior cell
+            fire_map: Optional 2D array where 1=fire at the time the router is created
+        """
+        self.assembly_point = (int(assembly_point[0]), int(assembly_point[1]))
+        self._on_exterior = exterior_mask(grid)
+        self._to_exterior = ExitNavigationField(grid, exterior_cells(grid), fire_map)
+        self._to_assembly = ExitNavigationField(grid, [self.assembly_point], passable=self._on_exterior)
+        self._pending = []
+
+    @property
+    def reachable(self):
+        """False when the assembly point is not an exterior cell, so no route leads to it."""
+        return self._to_assembly.distance_at(self.assembly_point) == 0
+
+    def update(self, ignited_cells):
+        """Record newly burning cells (flat fire_map indices) for the inside field."""
+        if len(ignited_cells):
+            self._pending.append(np.asarray(ignited_cells, dtype=np.int64))
+
+    def _inside_field(self):
+        if self._pending:
+            self._to_exterior.update(np.concatenate(self._pending))
+            self._pending = []
+        return self._to_exterior
+
+    def next_cells(self, xs, ys):
+        """Vectorized next step for many positions (see ExitNavigationField.next_cells)."""
+        xs, ys = np.asarray(xs), np.asarray(ys)
+        next_xs, next_ys, has_hop = self._to_assembly.next_cells(xs, ys)
+        inside = ~self._on_exterior[ys, xs]
+        if inside.any():
+            inside_xs, inside_ys, inside_hop = self._inside_field().next_cells(xs[inside], ys[inside])
+            next_xs[inside], next_ys[inside], has_hop[inside] = inside_xs, inside_ys, inside_hop
+        return next_xs, next_ys, has_hop
+
+    def path_from(self, pos, max_length):
+        """
+        Next cells toward the assembly point from (x, y).
+
+        Returns:
+            Up to max_length (x, y) positions; a path from inside the building stops
+            at the exterior
+        """
+        x, y = int(pos[0]), int(pos[1])
+        if 0 <= y < self._on_exterior.shape[0] and 0 <= x < self._on_exterior.shape[1] and self._on_exterior[y, x]:
+            return self._to_assembly.path_from(pos, max_length)
+        return self._inside_field().path_from(pos, max_length)
@@ -0,0 +1,409 @@
+from itertools import islice
+
+import numpy as np
+
+from simulation import CELL_WALL, PANIC_DISTANCE, ALERT_DISTANCE, a_star_search, plan_assembly_path
+
+# Agent status codes; names are only used when results are serialized
+EVACUATING, ESCAPED, BURNED, AT_ASSEMBLY = range(4)
+STATUS_NAMES = ('evacuating', 'escaped', 'burned', 'at_assembly')
+
+# Panic state codes with the speed and trip probability each state sets
+CALM, ALERT, PANICKED = range(3)
+STATE_NAMES = ('CALM', 'ALERT', 'PANICKED')
+STATE_SPEEDS = np.array([1.0, 1.2, 1.5])
+STATE_TRIP_PROBABILITIES = np.array([0.0, 0.0, 0.1])
+
+TRIP_DURATION = 5  # Steps an agent stays down after tripping
+EXIT_RADIUS = 5  # Distance to an exit that counts as escaped
+ASSEMBLY_RADIUS = 10  # Distance to the assembly point that counts as arrived
+_STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+_STATE_CODES = {name: code for code, name in enumerate(STATE_NAMES)}
+
+
+class PathCursor:
+    """
+    Remaining part of a planned path: a cursor into the list returned by the planner.
+
+    Taking a step advances the cursor instead of shifting the list (list.pop(0)), and
+    iteration, len() and truthiness only see the cells not walked yet, so the object
+    can be handed to PathOccupancyIndex like a Person path.
+    """
+
+    __slots__ = ('cells', 'index')
+
+    def __init__(self, cells):
+        self.cells = cells
+        self.index = 0
+
+    def __len__(self):
+        return len(self.cells) - self.index
+
+    def __iter__(self):
+        return islice(self.cells, self.index, None)
+
+    def __getitem__(self, i):
+        return self.cells[self.index + i]
+
+    def popleft(self):
+        cell = self.cells[self.index]
+        self.index += 1
+        return cell
+
+
+NO_PATH = ()  # Shared empty path, so agents without a plan hold no path object
+
+
+def _cursor(cells):
+    return PathCursor(cells) if cells else NO_PATH
+
+
+class CompactPerson:
+    """
+    Slotted drop-in replacement for simulation.Person.
+
+    Status and panic state are stored as small integer codes and only turned into
+    strings when read through the status / state properties, the path is a
+    PathCursor so each step is O(1), and the distance thresholds are class constants
+    instead of per-instance attributes. Movement rules, random draws and debug output
+    match Person, so runs give the same results.
+    """
+
+    __slots__ = ('initial_pos', 'pos', 'path', '_status', '_state', 'speed', 'trip_probability',
+                 'tripped_timer', 'escape_time', 'steps_taken', 'assigned_exit')
+
+    PANIC_DISTANCE = PANIC_DISTANCE
+    ALERT_DISTANCE = ALERT_DISTANCE
+
+    def __init__(self, position):
+        """Initialize agent. Position is (x, y) format."""
+        self.initial_pos = tuple(position)
+        self.reset()
+
+    @property
+    def status(self):
+        return STATUS_NAMES[self._status]
+
+    @status.setter
+    def status(self, name):
+        self._status = _STATUS_CODES[name]
+
+    @property
+    def state(self):
+        return STATE_NAMES[self._state]
+
+    @state.setter
+    def state(self, name):
+        self._state = _STATE_CODES[name]
+
+    def update_state(self, fire_map, fire_distance=None):
+        """Update panic state based on fire proximity (see Person.update_state)."""
+        if self.tripped_timer > 0:
+            return
+        if fire_distance is not None:
+            min_dist = float(fire_distance[int(self.pos[1]), int(self.pos[0])])
+        else:
+            fire_locations = np.argwhere(fire_map == 1)
+            if len(fire_locations) == 0:
+                min_dist = float('inf')
+            else:
+                agent_pos_yx = np.array([self.pos[1], self.pos[0]])
+                min_dist = np.min(np.linalg.norm(fire_locations - agent_pos_yx, axis=1))
+
+        if min_dist < self.PANIC_DISTANCE:
+            self._state, self.speed, self.trip_probability = PANICKED, 1.5, 0.1
+        elif min_dist < self.ALERT_DISTANCE:
+            self._state, self.speed, self.trip_probability = ALERT, 1.2, 0.0
+        else:
+            self._state, self.speed, self.trip_probability = CALM, 1.0, 0.0
+
+    def move(self, grid, fire_map=None, rng=None):
+        """Move agent along path with per-cell wall and fire validation (see Person.move)."""
+        if self.tripped_timer > 0:
+            self.tripped_timer -= 1
+            return
+        if self._state == PANICKED and (np.random if rng is None else rng).random() < self.trip_probability:
+            self.tripped_timer = TRIP_DURATION
+            return
+
+        path = self.path
+        rows, cols = grid.shape
+        steps = int(round(self.speed))
+        while steps and path:
+            next_pos = path.cells[path.index]
+            if not (0 <= next_pos[0] < cols and 0 <= next_pos[1] < rows):
+                print(f"[DEBUG] Agent path goes out of bounds: {next_pos}", flush=True)
+                self.path = NO_PATH
+                break
+            if grid[next_pos[1], next_pos[0]] == CELL_WALL:
+                print(f"[DEBUG] Agent blocked by wall at {next_pos}", flush=True)
+                self.path = NO_PATH
+                break
+            if fire_map is not None and fire_map[next_pos[1], next_pos[0]] >= 1:
+                print(f"[DEBUG] Agent avoiding fire at {next_pos}, recalculating path", flush=True)
+                self.path = NO_PATH
+                break
+            path.index += 1
+            self.pos = list(next_pos)
+            self.steps_taken += 1
+            steps -= 1
+
+    def check_status(self, fire_map, exits, exit_radius=EXIT_RADIUS, assembly_point=None):
+        """Check if agent escaped, burned, or still evacuating (see Person.check_status)."""
+        if self._status == AT_ASSEMBLY or self._status == BURNED:
+            return
+
+        pos_x, pos_y = int(self.pos[0]), int(self.pos[1])
+        if 0 <= pos_y < fire_map.shape[0] and 0 <= pos_x < fire_map.shape[1]:
+            if fire_map[pos_y, pos_x] == 1:
+                self._status = BURNED
+                return
+
+        # Squared distances: same comparisons as Person's sqrt on integer positions
+        x, y = self.pos
+        if self._status == ESCAPED and assembly_point is not None:
+            if (x - assembly_point[0])**2 + (y - assembly_point[1])**2 < ASSEMBLY_RADIUS**2:
+                self._status = AT_ASSEMBLY
+            return
+
+        radius_sq = exit_radius**2
+        for ex in exits:
+            if (x - ex[0])**2 + (y - ex[1])**2 < radius_sq:
+                self._status = ESCAPED
+                self.escape_time = self.steps_taken
+                return
+
+    def move_to_assembly(self, grid, assembly_point, fire_map, router=None, rng=None):
+        """Move agent toward the assembly point after escape (see Person.move_to_assembly)."""
+        if self._status != ESCAPED:
+            return
+        if router is not None:
+            self.path = _cursor(router.path_from(self.pos, 1))
+        elif not self.path:
+            current_pos = (int(self.pos[0]), int(self.pos[1]))
+            self.path = _cursor(plan_assembly_path(grid, current_pos, assembly_point, fire_map))
+        if self.path:
+            self.speed = 1.0  # Normal speed when moving to assembly
+            self.move(grid, rng=rng)
+
+    def compute_path(self, grid, goal, fire_map):
+        """Compute path to goal using A*."""
+        start_pos = (int(self.pos[0]), int(self.pos[1]))
+        goal_pos = (int(goal[0]), int(goal[1]))
+        self.path = _cursor(a_star_search(grid, start_pos, goal_pos, fire_map))
+
+    def follow_field(self, field):
+        """Take the next steps toward the exit of an ExitNavigationField."""
+        self.path = _cursor(field.path_from(self.pos, max(1, int(round(self.speed)))))
+
+    def reset(self):
+        self.pos = list(self.initial_pos)
+        self.path = NO_PATH
+        self._status = EVACUATING
+        self._state = CALM
+        self.speed = 1.0
+        self.trip_probability = 0.0
+        self.tripped_timer = 0
+        self.escape_time = None
+        self.steps_taken = 0
+        self.assigned_exit = None
+
+
+class AgentPopulation:
+    """
+    Structure-of-arrays agent engine for large heuristic runs.
+
+    Positions, status and panic codes, speeds, trip timers, step counters and assigned
+    exits live in NumPy arrays, and update_state / move / check_status run for every
+    agent at once. Agents follow an ExitNavigationField or ExitFieldRouter by next-hop
+    lookup. The rules are those of Person, and random trip draws are taken in agent
+    order, so a run gives the same per-agent results and frames as the same run with
+    Person objects.
+    """
+
+    def __init__(self, positions, rng=None):
+        """
+        Args:
+            positions: List of (x, y) start positions
+            rng: np.random.Generator for trip rolls; the global np.random state if None
+        """
+        self.rng = np.random if rng is None else rng
+        self.pos = np.array(positions, dtype=np.int64).reshape(-1, 2)  # [x, y] per agent
+        n = len(self.pos)
+        self.status = np.full(n, EVACUATING, dtype=np.int8)
+        self.state = np.full(n, CALM, dtype=np.int8)
+        self.speed = np.ones(n)
+        self.trip_probability = np.zeros(n)
+        self.tripped_timer = np.zeros(n, dtype=np.int32)
+        self.steps_taken = np.zeros(n, dtype=np.int32)
+        self.escape_time = np.full(n, -1, dtype=np.int32)
+        self.assigned_exit = np.full(n, -1, dtype=np.int32)  # index into self.exits
+        self.exits = []
+        self._exit_zone = None
+
+    def __len__(self):
+        return len(self.pos)
+
+    def assign_nearest_exits(self, exits):
+        """Assign every agent to its nearest exit in straight-line distance (first exit on ties)."""
+        self.exits = [(int(x), int(y)) for x, y in exits]
+        if not self.exits or len(self) == 0:
+            return
+        exit_xy = np.array(self.exits, dtype=np.int64)
+        d2 = ((self.pos[:, None, :] - exit_xy[None, :, :]) ** 2).sum(axis=2)
+        self.assigned_exit[:] = np.argmin(d2, axis=1)
+
+    def indices(self, status):
+        """Indices of agents with the given status code, in agent order."""
+        return np.flatnonzero(self.status == status)
+
+    def step(self, grid, fire_map, fire_distance, navigator, assembly_router=None):
+        """
+        Advance all agents by one time step, after the fire has stepped.
+
+        Args:
+            grid: 2D numpy array of cell types
+            fire_map: 2D array where 1=fire
+            fire_distance: Raster from FireSimulator.fire_distance(ALERT_DISTANCE)
+            navigator: ExitNavigationField (nearest exit) or ExitFieldRouter (assigned exit)
+            assembly_router: Optional AssemblyRouter for post-escape gathering
+        """
+        active = self.indices(EVACUATING)
+        escaped = self.indices(ESCAPED)
+
+        self.update_state(fire_distance, active)
+        self.move(navigator, fire_map, active)
+        self.check_status(fire_map, active, grid.shape)
+
+        if assembly_router is not None and escaped.size:
+            self.move_to_assembly(assembly_router, fire_map, escaped)
+
+    def update_state(self, fire_distance, agents):
+        """Set panic state, speed and trip probability from fire proximity."""
+        agents = agents[self.tripped_timer[agents] == 0]
+        min_dist = fire_distance[self.pos[agents, 1], self.pos[agents, 0]]
+        state = np.where(min_dist < PANIC_DISTANCE, PANICKED, np.where(min_dist < ALERT_DISTANCE, ALERT, CALM))
+        self.state[agents] = state
+        self.speed[agents] = STATE_SPEEDS[state]
+        self.trip_probability[agents] = STATE_TRIP_PROBABILITIES[state]
+
+    def move(self, navigator, fire_map, agents):
+        """Step agents along next hops, with trip checks and per-cell fire validation."""
+        agents = self._trip(agents)
+        steps = np.rint(self.speed[agents]).astype(np.int64)
+        for k in range(int(steps.max()) if steps.size else 0):
+            agents = agents[steps > k] if k else agents
+            steps = steps[steps > k] if k else steps
+            if agents.size == 0:
+                break
+            next_xs, next_ys, has_hop = self._next_cells(navigator, agents)
+            has_hop &= fire_map[np.where(has_hop, next_ys, 0), np.where(has_hop, next_xs, 0)] < 1
+            agents, steps = agents[has_hop], steps[has_hop]
+            self.pos[agents, 0] = next_xs[has_hop]
+            self.pos[agents, 1] = next_ys[has_hop]
+            self.steps_taken[agents] += 1
+
+    def check_status(self, fire_map, agents, shape):
+        """Mark evacuating agents as burned or escaped."""
+        xs, ys = self.pos[agents, 0], self.pos[agents, 1]
+        burned = fire_map[ys, xs] == 1
+        self.status[agents[burned]] = BURNED
+
+        in_zone = self._exit_zone_for(shape)[ys, xs] & ~burned
+        escaped = agents[in_zone]
+        self.status[escaped] = ESCAPED
+        self.escape_time[escaped] = self.steps_taken[escaped]
+
+    def move_to_assembly(self, router, fire_map, agents):
+        """Step escaped agents along an AssemblyRouter, then check for arrival or fire."""
+        next_xs, next_ys, has_hop = router.next_cells(self.pos[agents, 0], self.pos[agents, 1])
+        movers = agents[has_hop]
+        self.speed[movers] = 1.0  # Normal speed when moving to assembly
+        walking = np.isin(agents, self._trip(movers))
+        self.pos[agents[walking], 0] = next_xs[walking]
+        self.pos[agents[walking], 1] = next_ys[walking]
+        self.steps_taken[agents[walking]] += 1
+
+        xs, ys = self.pos[agents, 0], self.pos[agents, 1]
+        burned = fire_map[ys, xs] == 1
+        self.status[agents[burned]] = BURNED
+        ax, ay = router.assembly_point
+        d2 = (xs - ax) ** 2 + (ys - ay) ** 2
+        self.status[agents[~burned & (d2 < ASSEMBLY_RADIUS ** 2)]] = AT_ASSEMBLY
+
+    def all_done(self, with_assembly):
+        """True once no agent is still evacuating (or still heading to the assembly point)."""
+        if with_assembly:
+            return bool(np.all((self.status == AT_ASSEMBLY) | (self.status == BURNED)))
+        return bool(np.all(self.status != EVACUATING))
+
+    def count(self, *statuses):
+        return int(np.isin(self.status, statuses).sum())
+
+    def frame_agents(self, tripped=True):
+        """Per-agent frame entries in the history format ([row, col] positions)."""
+        statuses = [STATUS_NAMES[code] for code in self.status.tolist()]
+        states = [STATE_NAMES[code] for code in self.state.tolist()]
+        trips = (self.tripped_timer > 0).tolist() if tripped else [False] * len(self)
+        return [
+            {"pos": [y, x], "status": status, "state": state, "tripped": trip}
+            for (x, y), status, state, trip in zip(self.pos.tolist(), statuses, states, trips)
+        ]
+
+    def agent_results(self):
+        """Per-agent result entries in the heuristic result format."""
+        return [
+            {
+                "agent_id": i,
+                "status": STATUS_NAMES[status],
+                "exit_time": escape_time if escape_time >= 0 else None,
+                "path_length": steps_taken,
+            }
+            for i, (status, escape_time, steps_taken) in enumerate(
+                zip(self.status.tolist(), self.escape_time.tolist(), self.steps_taken.tolist()))
+        ]
+
+    def _trip(self, agents):
+        """Count down trip timers and roll new trips; returns the agents free to walk."""
+        tripped = self.tripped_timer[agents] > 0
+        self.tripped_timer[agents[tripped]] -= 1
+        agents = agents[~tripped]
+
+        panicked = self.state[agents] == PANICKED
+        if panicked.any():
+            # One draw per panicked agent, in agent order as in Person.move
+            trips = self.rng.random(int(panicked.sum())) < self.trip_probability[agents[panicked]]
+            self.tripped_timer[agents[panicked][trips]] = TRIP_DURATION
+            keep = np.ones(agents.size, dtype=bool)
+            keep[np.flatnonzero(panicked)[trips]] = False
+            agents = agents[keep]
+        return agents
+
+    def _next_cells(self, navigator, agents):
+        xs, ys = self.pos[agents, 0], self.pos[agents, 1]
+        if not hasattr(navigator, 'field_for'):
+            return navigator.next_cells(xs, ys)
+        # Per-exit fields: look up each group of agents sharing an exit in its own field
+        next_xs, next_ys = np.empty_like(xs), np.empty_like(ys)
+        has_hop = np.zeros(agents.size, dtype=bool)
+        exit_ids = self.assigned_exit[agents]
+        for exit_id in np.unique(exit_ids).tolist():
+            group = exit_ids == exit_id
+            field = navigator.field_for(self.exits[exit_id])
+            next_xs[group], next_ys[group], has_hop[group] = field.next_cells(xs[group], ys[group])
+        return next_xs, next_ys, has_hop
+
+    def _exit_zone_for(self, shape):
+        """Boolean raster of cells within EXIT_RADIUS of any exit, built once."""
+        if self._exit_zone is None or self._exit_zone.shape != shape:
+            zone = np.zeros(shape, dtype=bool)
+            reach = EXIT_RADIUS
+            dy, dx = np.mgrid[-reach:reach + 1, -reach:reach + 1]
+            disk = np.sqrt(dx ** 2 + dy ** 2) < EXIT_RADIUS
+            for x, y in self.exits:
+                for oy, ox in zip(*np.nonzero(disk)):
+                    cy, cx = y + oy - reach, x + ox - reach
+                    if 0 <= cy < shape[0] and 0 <= cx < shape[1]:
+                        zone[cy, cx] = True
+            self._exit_zone = zone
+        return self._exit_zone
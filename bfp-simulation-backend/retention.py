@@ -0,0 +1,106 @@
+import time
+from datetime import datetime, timedelta
+
+# Seconds a job may stay in each status. A completed job then has its result evicted
+# and becomes 'expired'; jobs in the other statuses are deleted. None keeps jobs in
+# that status forever ('processing' jobs are never touched).
+DEFAULT_TTL_SECONDS = {
+    "complete": 24 * 3600,
+    "failed": 7 * 24 * 3600,
+    "cancelled": 24 * 3600,
+    "expired": 30 * 24 * 3600,
+}
+
+
+class Retention:
+    """
+    Ages out jobs and caps the space their results take.
+
+    Each run() first applies the per-status TTLs, then evicts the least recently read
+    results until the total result size is within max_result_bytes, and finally
+    compacts the database. Evicting a result keeps the job's metadata, so its status
+    reads 'expired' rather than 'not_found' until the 'expired' TTL deletes it.
+    """
+
+    def __init__(self, store, ttl_seconds=None, max_result_bytes=None, on_evict=None):
+        """
+        Args:
+            store: job_store.JobStore
+            ttl_seconds: {status: seconds or None}, defaults to DEFAULT_TTL_SECONDS
+            max_result_bytes: Cap on the total stored result size, or None for no cap
+            on_evict: Optional callable(job_id) run for every job whose result is evicted
+                or that is deleted, e.g. to remove its result files
+        """
+        self.store = store
+        self.ttl_seconds = DEFAULT_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_result_bytes = max_result_bytes
+        self.on_evict = on_evict
+        self.counters = {
+            "runs": 0,
+            "results_expired": 0,  # By the 'complete' TTL
+            "results_evicted": 0,  # By the size cap
+            "jobs_deleted": 0,
+        }
+        self.last_run = None
+        self.last_run_seconds = None
+
+    def run(self):
+        """One retention pass. Returns the counts of this pass."""
+        start = time.perf_counter()
+        now = datetime.now()
+        counts = {"results_expired": 0, "results_evicted": 0, "jobs_deleted": 0}
+        for status, ttl in self.ttl_seconds.items():
+            if ttl is None or status == "processing":
+                continue
+            job_ids = self.store.jobs_updated_before(status, (now - timedelta(seconds=ttl)).isoformat())
+            if not job_ids:
+                continue
+            if status == "complete":
+                self.store.expire_results(job_ids)
+                counts["results_expired"] += len(job_ids)
+            else:
+                self.store.delete_jobs(job_ids)
+                counts["jobs_deleted"] += len(job_ids)
+            self._evicted(job_ids)
+
+        if self.max_result_bytes is not None:
+            total = self.store.result_bytes()
+            victims = []
+            if total > self.max_result_bytes:
+                for job_id, size in self.store.results_by_last_access():
+                    if total <= self.max_result_bytes:
+                        break
+                    victims.append(job_id)
+                    total -= size
+            if victims:
+                self.store.expire_results(victims)
+                counts["results_evicted"] = len(victims)
+                self._evicted(victims)
+
+        self.store.compact()
+        self.counters["runs"] += 1
+        for name, count in counts.items():
+            self.counters[name] += count
+        self.last_run = now.isoformat()
+        self.last_run_seconds = time.perf_counter() - start
+        if any(counts.values()):
+            print(f"[RETENTION] Expired {counts['results_expired']} results (TTL), evicted "
+                  f"{counts['results_evicted']} (size cap), deleted {counts['jobs_deleted']} jobs", flush=True)
+        return counts
+
+    def _evicted(self, job_ids):
+        if self.on_evict is None:
+            return
+        for job_id in job_ids:
+            self.on_evict(job_id)
+
+    def metrics(self):
+        """Store size and eviction counts since the server started."""
+        return {
+            **self.store.stats(),
+            **self.counters,
+            "max_result_bytes": self.max_result_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "last_run": self.last_run,
+            "last_run_seconds": self.last_run_seconds,
+        }
@@ -1,9 +1,13 @@
 import heapq
+import threading
 import numpy as np
 import gymnasium as gym
 from gymnasium import spaces
 import cv2
 
+from frames import FrameRecorder, HISTORY_FORMATS, RASTER_ENCODINGS, DEFAULT_KEYFRAME_INTERVAL
+from grid_cache import grid_cache
+
 # Grid cell types
 CELL_FREE = 0
 CELL_WALL = 1
@@ -20,8 +24,140 @@ FIRE_SPREAD_PROBS = {
     CELL_EXTERIOR: 0.0,   # Fire cannot spread to exterior zone
 }
 
+# Fire proximity thresholds for agent panic states (Euclidean cells)
+PANIC_DISTANCE = 25
+ALERT_DISTANCE = 50
+
 
 # A* Pathfinding Algorithm
+class GridPathfinder:
+    """
+    A* search over flat cell indices for one grid.
+
+    Cell state lives in preallocated lists indexed by y * cols + x that are reused
+    across searches: every search gets a new stamp, and a g-score, parent or closed
+    mark only counts when it carries the current stamp, so nothing is cleared between
+    calls. Open-set membership is a per-cell count of heap entries instead of a scan
+    of the heap. Heap keys are plain ints ordered by (f, x, y) like the (f, (x, y))
+    tuples of the original search, and the expansion rules are unchanged, so the
+    returned paths are identical to it.
+    """
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.rows, self.cols = grid.shape
+        size = self.rows * self.cols
+        self._walkable = walkable_mask(grid).tobytes()
+        self._exterior = exterior_mask(grid).tobytes()
+        self._g = [0] * size
+        self._parent = [0] * size
+        self._g_stamp = [0] * size
+        self._parent_stamp = [0] * size
+        self._closed_stamp = [0] * size
+        self._open_count = [0] * size
+        self._stamp = 0
+
+    def search(self, start, goal, passable, blocked=None):
+        """
+        Find a path between two in-bounds cells.
+
+        Args:
+            start: (x, y) tuple - starting position
+            goal: (x, y) tuple - target position
+            passable: Bytes with a non-zero entry for every enterable cell
+            blocked: Optional bytes with a non-zero entry for cells to avoid (fire)
+
+        Returns:
+            List of (x, y) positions from start to goal (excluding start),
+            or None if the goal cannot be reached
+        """
+        rows, cols = self.rows, self.cols
+        size = rows * cols
+        g, parent = self._g, self._parent
+        g_stamp, parent_stamp = self._g_stamp, self._parent_stamp
+        closed_stamp, open_count = self._closed_stamp, self._open_count
+        self._stamp += 1
+        stamp = self._stamp
+
+        goal_x, goal_y = int(goal[0]), int(goal[1])
+        start_x, start_y = int(start[0]), int(start[1])
+        goal_cell = goal_y * cols + goal_x
+        start_cell = start_y * cols + start_x
+        g[start_cell] = 0
+        g_stamp[start_cell] = stamp
+        # Key = f * size + x * rows + y, so ties on f break on x then y
+        oheap = [(abs(start_x - goal_x) + abs(start_y - goal_y)) * size + start_x * rows + start_y]
+        open_count[start_cell] += 1
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        try:
+            while oheap:
+                key = heappop(oheap)
+                x, y = divmod(key % size, rows)
+                current = y * cols + x
+                open_count[current] -= 1
+                if current == goal_cell:
+                    data = []
+                    while parent_stamp[current] == stamp:
+                        data.append((current % cols, current // cols))
+                        current = parent[current]
+                    data.reverse()
+                    return data
+                closed_stamp[current] = stamp
+                tentative_g_score = g[current] + 1
+                for nx, ny, neighbor in ((x, y + 1, current + cols), (x, y - 1, current - cols),
+                                         (x + 1, y, current + 1), (x - 1, y, current - 1)):
+                    if not (0 <= nx < cols and 0 <= ny < rows):
+                        continue
+                    if not passable[neighbor]:
+                        continue
+                    if blocked is not None and blocked[neighbor]:
+                        continue
+                    seen = g_stamp[neighbor] == stamp
+                    if closed_stamp[neighbor] == stamp and tentative_g_score >= g[neighbor]:
+                        continue
+                    if (seen and tentative_g_score < g[neighbor]) or not open_count[neighbor]:
+                        parent[neighbor] = current
+                        parent_stamp[neighbor] = stamp
+                        g[neighbor] = tentative_g_score
+                        g_stamp[neighbor] = stamp
+                        h = abs(nx - goal_x) + abs(ny - goal_y)
+                        heappush(oheap, (tentative_g_score + h) * size + nx * rows + ny)
+                        open_count[neighbor] += 1
+            return None
+        finally:
+            # Entries left on the heap must not count as open in the next search
+            for key in oheap:
+                x, y = divmod(key % size, rows)
+                open_count[y * cols + x] = 0
+
+    def find_path(self, start, goal, fire_map=None):
+        """Search through every non-wall cell, avoiding burning cells if fire_map is given."""
+        blocked = (fire_map == 1).tobytes() if fire_map is not None else None
+        return self.search(start, goal, self._walkable, blocked)
+
+    def find_exterior_path(self, start, goal):
+        """Search through exterior cells only."""
+        return self.search(start, goal, self._exterior)
+
+
+_pathfinders = threading.local()
+
+
+def get_pathfinder(grid):
+    """
+    Return this thread's GridPathfinder for grid, building a new one for a new grid.
+
+    Grids are matched by identity, so a grid must not be edited in place once
+    pathfinding on it has started.
+    """
+    pathfinder = getattr(_pathfinders, 'current', None)
+    if pathfinder is None or pathfinder.grid is not grid:
+        pathfinder = GridPathfinder(grid)
+        _pathfinders.current = pathfinder
+    return pathfinder
+
+
 def a_star_search(grid, start, goal, fire_map=None):
     """
     A* pathfinding from start to goal.
@@ -51,51 +187,11 @@ def a_star_search(grid, start, goal, fire_map=None):
         print(f"[DEBUG] A* Failed: Goal {goal} is in WALL", flush=True)
         return []
         
-    def heuristic(a, b):
-        return abs(a[0] - b[0]) + abs(a[1] - b[1])
-    
-    neighbors = [(0, 1), (0, -1), (1, 0), (-1, 0)]
-    close_set = set()
-    came_from = {}
-    gscore = {start: 0}
-    fscore = {start: heuristic(start, goal)}
-    oheap = []
-    heapq.heappush(oheap, (fscore[start], start))
-    
-    while oheap:
-        current = heapq.heappop(oheap)[1]
-        if current == goal:
-            data = []
-            while current in came_from:
-                data.append(current)
-                current = came_from[current]
-            data.reverse()
-            return data
-        close_set.add(current)
-        for i, j in neighbors:
-            neighbor = current[0] + i, current[1] + j
-            tentative_g_score = gscore[current] + 1
-            if 0 <= neighbor[0] < grid.shape[1] and 0 <= neighbor[1] < grid.shape[0]:
-                cell_type = grid[neighbor[1]][neighbor[0]]
-                # Walls block movement completely
-                if cell_type == CELL_WALL:
-                    continue
-                # Fire blocks movement
-                if fire_map is not None and fire_map[neighbor[1]][neighbor[0]] == 1:
-                    continue
-                # Doors and windows are passable (agents can go through)
-            else:
-                continue
-            if neighbor in close_set and tentative_g_score >= gscore.get(neighbor, 0):
-                continue
-            if tentative_g_score < gscore.get(neighbor, 0) or neighbor not in [i[1] for i in oheap]:
-                came_from[neighbor] = current
-                gscore[neighbor] = tentative_g_score
-                fscore[neighbor] = tentative_g_score + heuristic(neighbor, goal)
-                heapq.heappush(oheap, (fscore[neighbor], neighbor))
-    
-    print(f"[DEBUG] A* Failed: No path found from {start} to {goal}", flush=True)
-    return []
+    path = get_pathfinder(grid).find_path(start, goal, fire_map)
+    if path is None:
+        print(f"[DEBUG] A* Failed: No path found from {start} to {goal}", flush=True)
+        return []
+    return path
 
 
 def find_nearest_exterior(grid, start):
@@ -173,69 +269,350 @@ def a_star_exterior_only(grid, start, goal):
         print(f"[DEBUG] Exterior A* Failed: Goal {goal} not on exterior (value={grid[goal[1]][goal[0]]})", flush=True)
         return []
     
-    def heuristic(a, b):
-        return abs(a[0] - b[0]) + abs(a[1] - b[1])
-    
-    neighbors = [(0, 1), (0, -1), (1, 0), (-1, 0)]
-    close_set = set()
-    came_from = {}
-    gscore = {start: 0}
-    fscore = {start: heuristic(start, goal)}
-    oheap = []
-    heapq.heappush(oheap, (fscore[start], start))
-    
-    while oheap:
-        current = heapq.heappop(oheap)[1]
-        if current == goal:
-            data = []
-            while current in came_from:
-                data.append(current)
-                current = came_from[current]
-            data.reverse()
-            return data
-        close_set.add(current)
-        
-        for i, j in neighbors:
-            neighbor = current[0] + i, current[1] + j
-            tentative_g_score = gscore[current] + 1
-            
-            if 0 <= neighbor[0] < grid.shape[1] and 0 <= neighbor[1] < grid.shape[0]:
-                cell_type = grid[neighbor[1]][neighbor[0]]
-                
-                # ONLY allow exterior cells - this is the key difference!
-                if cell_type != CELL_EXTERIOR:
-                    continue
-            else:
-                continue
-                
-            if neighbor in close_set and tentative_g_score >= gscore.get(neighbor, 0):
-                continue
-            if tentative_g_score < gscore.get(neighbor, 0) or neighbor not in [i[1] for i in oheap]:
-                came_from[neighbor] = current
-                gscore[neighbor] = tentative_g_score
-                fscore[neighbor] = tentative_g_score + heuristic(neighbor, goal)
-                heapq.heappush(oheap, (fscore[neighbor], neighbor))
+    path = get_pathfinder(grid).find_exterior_path(start, goal)
+    if path is None:
+        print(f"[DEBUG] Exterior A* Failed: No path found from {start} to {goal}", flush=True)
+        return []
+    return path
+
+
+def plan_assembly_path(grid, current_pos, assembly_point, fire_map):
+    """Plan the next leg from an escaped agent's position toward the assembly point.
+    
+    Phase 1: From inside the building, path to the nearest exterior cell
+    Phase 2: From the exterior, exterior-only path to the assembly point
     
-    print(f"[DEBUG] Exterior A* Failed: No path found from {start} to {goal}", flush=True)
-    return []
+    Args:
+        grid: 2D numpy array of cell types
+        current_pos: (x, y) tuple - agent position
+        assembly_point: (x, y) assembly point
+        fire_map: 2D array where 1=fire, avoided in phase 1
+    
+    Returns:
+        List of (x, y) positions (excluding current_pos), empty if no path was found
+    """
+    # Check if agent is on exterior zone
+    is_on_exterior = False
+    if 0 <= current_pos[1] < grid.shape[0] and 0 <= current_pos[0] < grid.shape[1]:
+        is_on_exterior = grid[current_pos[1]][current_pos[0]] == CELL_EXTERIOR
+    
+    path = []
+    if not is_on_exterior:
+        # PHASE 1: Find nearest exterior cell and path to it
+        nearest_ext = find_nearest_exterior(grid, current_pos)
+        if nearest_ext:
+            print(f"[ASSEMBLY DEBUG] Phase 1: Agent at {current_pos} finding path to exterior at {nearest_ext}", flush=True)
+            path = a_star_search(grid, current_pos, nearest_ext, fire_map)
+            if path:
+                print(f"[ASSEMBLY DEBUG] Phase 1 path found: {len(path)} steps to exterior", flush=True)
+            else:
+                print(f"[ASSEMBLY DEBUG] WARNING: No path to exterior found!", flush=True)
+        else:
+            print(f"[ASSEMBLY DEBUG] WARNING: No exterior cell found near {current_pos}!", flush=True)
+    else:
+        # PHASE 2: Already on exterior, use exterior-only path to assembly
+        assembly_pos = (int(assembly_point[0]), int(assembly_point[1]))
+        print(f"[ASSEMBLY DEBUG] Phase 2: Agent on exterior at {current_pos}, pathfinding to assembly {assembly_pos}", flush=True)
+        path = a_star_exterior_only(grid, current_pos, assembly_pos)
+        if path:
+            print(f"[ASSEMBLY DEBUG] Phase 2 exterior-only path found: {len(path)} steps to assembly", flush=True)
+        else:
+            print(f"[ASSEMBLY DEBUG] WARNING: No exterior path to assembly found!", flush=True)
+    return path
+
+
+def build_spread_probability_raster(grid, default_probability=0.25):
+    """Build a per-cell fire spread probability raster from cell materials.
+
+    Args:
+        grid: 2D numpy array of cell types
+        default_probability: Probability used for cell types missing from FIRE_SPREAD_PROBS
+
+    Returns:
+        float64 array with the same shape as grid
+    """
+    cells = np.asarray(grid)
+    probs = np.full(cells.shape, default_probability, dtype=np.float64)
+    for cell_type, prob in FIRE_SPREAD_PROBS.items():
+        probs[cells == cell_type] = prob
+    return probs
+
+
+# Structures that depend only on the grid, shared through grid_cache by every
+# simulation on the same building (all read-only)
+
+def spread_tables(grid, default_probability=0.25):
+    """
+    Returns:
+        (spread probability raster, then FireSimulator's padded flat tables: flammable
+        mask, spread probabilities, and ignition probabilities by burning-neighbour count)
+    """
+    def build(grid):
+        probs = build_spread_probability_raster(grid, default_probability)
+        # The vectorized kernel works on flat arrays with a one-cell border, so the four
+        # neighbours of padded cell i are i - 1, i + 1, i - stride, i + stride and a
+        # band of rows is a contiguous slice.
+        rows, cols = probs.shape
+        padded_probs = np.zeros((rows + 2, cols + 2), dtype=np.float64)
+        padded_probs[1:-1, 1:-1] = probs
+        flammable = (padded_probs > 0).astype(np.uint8).ravel()
+        # Row k: ignition probability of a cell with k burning neighbours, 1 - (1 - p)^k
+        ignite_probs = 1.0 - (1.0 - padded_probs.ravel())[None, :] ** np.arange(5)[:, None]
+        return probs, flammable, padded_probs.ravel(), ignite_probs
+    return grid_cache.get(grid, ("spread_tables", default_probability), build)
+
+
+def walkable_mask(grid):
+    return grid_cache.get(grid, "walkable", lambda g: np.asarray(g) != CELL_WALL)
+
+
+def exterior_mask(grid):
+    """The exterior band around the building, where escaped agents walk to the assembly point."""
+    return grid_cache.get(grid, "exterior", lambda g: np.asarray(g) == CELL_EXTERIOR)
+
+
+def exterior_cells(grid):
+    """(x, y) of every exterior cell, as an (n, 2) array."""
+    return grid_cache.get(grid, "exterior_cells", lambda g: np.argwhere(exterior_mask(g))[:, ::-1].copy())
+
+
+def grid_composition(grid):
+    """(cell type, count) pairs of the grid."""
+    def build(grid):
+        unique, counts = np.unique(grid, return_counts=True)
+        return tuple(zip(unique.tolist(), counts.tolist()))
+    return grid_cache.get(grid, "composition", build)
+
+
+def nearest_free_cell(grid, pos, max_radius=49, avoid=None, min_distance=0):
+    """
+    Find the free cell nearest to pos, for moving a fire or exit placed on a wall.
+
+    Rings of Chebyshev radius 1..max_radius around pos are searched outwards, each
+    row by row (then by x), like a scan of the ring perimeters; candidates come from
+    the grid's cached free-cell mask.
+
+    Args:
+        grid: 2D numpy array of cell types
+        pos: (x, y) position
+        avoid: Optional (x, y) positions the cell must keep min_distance (Euclidean) from
+
+    Returns:
+        (x, y) of the first matching cell, or None
+    """
+    x, y = int(pos[0]), int(pos[1])
+    free = grid_cache.get(grid, "free", lambda g: np.asarray(g) == CELL_FREE)
+    rows, cols = free.shape
+    y0, x0 = max(0, y - max_radius), max(0, x - max_radius)
+    ys, xs = np.nonzero(free[y0:y + max_radius + 1, x0:x + max_radius + 1])
+    dys, dxs = ys + (y0 - y), xs + (x0 - x)
+    rings = np.maximum(np.abs(dxs), np.abs(dys))
+    order = np.lexsort((dxs, dys, rings))
+    order = order[rings[order] >= 1]
+    if avoid is None or len(avoid) == 0:
+        return (x + int(dxs[order[0]]), y + int(dys[order[0]])) if order.size else None
+    avoid = np.asarray(avoid, dtype=np.float64).reshape(-1, 2)
+    min_distance_sq = min_distance * min_distance
+    for i in order:
+        cx, cy = x + int(dxs[i]), y + int(dys[i])
+        if ((avoid[:, 0] - cx) ** 2 + (avoid[:, 1] - cy) ** 2).min() >= min_distance_sq:
+            return (cx, cy)
+    return None
+
 
 # Fire Simulator Class with Material-Aware Spread
+FIRE_ENGINES = ('frontier', 'vectorized', 'legacy')
+
+# Agent routing: one A* per agent, lookups in a shared ExitNavigationField, or
+# incrementally repaired fields per assigned exit (see navigation.py)
+NAVIGATION_MODES = ('astar', 'field', 'incremental')
+# When A* agents replan: only when new fire crosses their remaining path, or every 10 steps
+REPLAN_POLICIES = ('fire_intersection', 'interval')
+# Agent engines: Person objects, slotted CompactPerson objects, or the AgentPopulation
+# arrays (heuristic runs only; see population.py)
+AGENT_ENGINES = ('person', 'compact', 'population')
+
+
 class FireSimulator:
-    def __init__(self, grid, spread_probability=0.25, firewall_spread_factor=0.1):
+    def __init__(self, grid, spread_probability=0.25, firewall_spread_factor=0.1, engine='frontier', rng=None):
+        """Material-aware stochastic fire spread.
+
+        Args:
+            grid: 2D numpy array of cell types
+            spread_probability: Fallback probability for unknown cell types
+            firewall_spread_factor: Unused, kept for API compatibility
+            engine: 'frontier' (sparse, only burning cells that can still spread),
+                'vectorized' (whole-grid NumPy kernel) or 'legacy' (per-cell Python loop).
+                All give every burning neighbour an independent ignition trial per step.
+            rng: np.random.Generator for the ignition trials; the global np.random state if None
+        """
+        if engine not in FIRE_ENGINES:
+            raise ValueError(f"Unknown fire engine '{engine}'. Options: {FIRE_ENGINES}")
         self.base_grid = grid
         self.spread_probability = spread_probability
         self.firewall_spread_factor = firewall_spread_factor
+        self.engine = engine
+        self.rng = np.random if rng is None else rng
         self.fire_map = np.zeros_like(self.base_grid, dtype=float)
         self.directions = [(0, 1), (0, -1), (1, 0), (-1, 0)]
 
+        # Static per-cell spread probabilities from the materials, built once per grid
+        # (see spread_tables)
+        (self.spread_probs, self._flammable_padded, self._spread_padded,
+         self._ignite_probs) = spread_tables(self.base_grid, spread_probability)
+        self._spread_flat = self.spread_probs.ravel()
+        self._stride = self.fire_map.shape[1] + 2
+        self._no_cells = np.zeros(0, dtype=np.int64)
+        self._reset_state()
+
+    def _to_padded(self, cells):
+        rows, cols = np.divmod(cells, self.fire_map.shape[1])
+        return (rows + 1) * self._stride + cols + 1
+
+    def _from_padded(self, padded_cells):
+        rows, cols = np.divmod(padded_cells, self._stride)
+        return (rows - 1) * self.fire_map.shape[1] + cols - 1
+
     def start_fire(self, ignition_points):
         """Start fire at given points. Points are (y, x) format."""
         for y, x in ignition_points:
             if 0 <= y < self.fire_map.shape[0] and 0 <= x < self.fire_map.shape[1]:
-                self.fire_map[y, x] = 1
+                self._ignite(self._to_padded(np.array([y * self.fire_map.shape[1] + x])))
 
     def step(self):
         """Advance fire spread by one step with material-aware probabilities."""
+        self.last_ignited = self._no_cells
+        if self.engine == 'frontier':
+            self._step_frontier()
+        elif self.engine == 'legacy':
+            self._step_legacy()
+        else:
+            self._step_vectorized()
+
+    def fire_distance(self, max_distance=None):
+        """
+        Euclidean distance from every cell to the nearest burning cell.
+
+        Computed with one OpenCV distance transform and cached until the next ignition,
+        so all agents share a single pass per fire step.
+
+        Args:
+            max_distance: If given, only the fire's bounding box grown by this margin is
+                transformed; cells outside it are farther than max_distance from any
+                fire and are reported as inf
+
+        Returns:
+            float32 array shaped like fire_map (inf everywhere while nothing burns)
+        """
+        if self._fire_distance is not None and self._fire_distance[0] == max_distance:
+            return self._fire_distance[1]
+        burning = self.fire_map == 1
+        distance = np.full(burning.shape, np.inf, dtype=np.float32)
+        rows = np.flatnonzero(burning.any(axis=1))
+        if rows.size:
+            cols = np.flatnonzero(burning.any(axis=0))
+            r0, r1, c0, c1 = 0, burning.shape[0], 0, burning.shape[1]
+            if max_distance is not None:
+                margin = int(np.ceil(max_distance))
+                r0, r1 = max(rows[0] - margin, 0), min(rows[-1] + margin + 1, r1)
+                c0, c1 = max(cols[0] - margin, 0), min(cols[-1] + margin + 1, c1)
+            unburned = (~burning[r0:r1, c0:c1]).astype(np.uint8)
+            distance[r0:r1, c0:c1] = cv2.distanceTransform(unburned, cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+        self._fire_distance = (max_distance, distance)
+        return distance
+
+    @property
+    def frontier(self):
+        """Padded indices of burning cells that still have an unburned, flammable neighbour."""
+        if self._frontier is None:
+            self._frontier = self._active(np.flatnonzero(self._burning_padded))
+        return self._frontier
+
+    @property
+    def frontier_empty(self):
+        """True once no burning cell can spread fire any further."""
+        return self.frontier.size == 0
+
+    def _active(self, padded_cells):
+        """Filter padded cells down to those with an unburned, flammable neighbour."""
+        stride = self._stride
+        unburned = self._unburned_flammable
+        spreading = unburned[padded_cells - 1] | unburned[padded_cells + 1]
+        spreading |= unburned[padded_cells - stride]
+        spreading |= unburned[padded_cells + stride]
+        return padded_cells[spreading.view(bool)]
+
+    def _step_frontier(self):
+        """Sparse spread: one trial per (frontier cell, unburned flammable neighbour) pair.
+
+        Cells never stop burning, so only the frontier can ignite anything. The cost
+        of a step scales with the frontier length rather than the building area.
+        """
+        frontier = self.frontier
+        if frontier.size == 0:
+            return
+        stride = self._stride
+        targets = np.concatenate((frontier - stride, frontier + stride, frontier - 1, frontier + 1))
+        targets = targets[self._unburned_flammable[targets].view(bool)]
+        hits = targets[self.rng.random(targets.size) < self._spread_padded[targets]]
+        if hits.size == 0:
+            return
+
+        # A cell can be hit from several burning neighbours in the same step
+        hits.sort()
+        ignited = hits[np.concatenate(([True], hits[1:] != hits[:-1]))]
+        self._ignite(ignited)
+        self._frontier = self._active(np.concatenate((frontier, ignited)))
+
+    def _step_vectorized(self):
+        """Whole-grid spread: count burning neighbours with shifted masks, one random draw per candidate.
+
+        Work is limited to the band of rows holding burning cells plus a one-row margin.
+        A cell with k burning neighbours gets k independent trials in the legacy loop,
+        so it ignites with probability 1 - (1 - p)^k.
+        """
+        if self._row_span is None:
+            return
+        stride = self._stride
+        # Scan one padded row above and below the burning rows, never the border rows
+        lo = max(self._row_span[0] - 1, 1) * stride
+        hi = min(self._row_span[1] + 2, self.fire_map.shape[0] + 1) * stride
+
+        burning = self._burning_padded
+        counts = burning[lo - 1:hi - 1] + burning[lo + 1:hi + 1]
+        counts += burning[lo - stride:hi - stride]
+        counts += burning[lo + stride:hi + stride]
+        counts *= self._unburned_flammable[lo:hi]
+
+        local = np.flatnonzero(counts.view(bool))
+        if local.size == 0:
+            return
+
+        candidates = local + lo
+        ignite_probs = self._ignite_probs[counts[local], candidates]
+        self._ignite(candidates[self.rng.random(candidates.size) < ignite_probs])
+
+    def _ignite(self, padded_cells):
+        """Mark sorted padded cell indices as burning."""
+        if padded_cells.size == 0:
+            return
+        self._frontier = None
+        self._fire_distance = None
+        self._burning_padded[padded_cells] = 1
+        self._unburned_flammable[padded_cells] = 0
+        cells = self._from_padded(padded_cells)
+        self.fire_map.ravel()[cells] = 1
+        self.last_ignited = np.concatenate((self.last_ignited, cells))
+
+        first_row = int(padded_cells[0]) // self._stride
+        last_row = int(padded_cells[-1]) // self._stride
+        if self._row_span is not None:
+            first_row = min(first_row, self._row_span[0])
+            last_row = max(last_row, self._row_span[1])
+        self._row_span = (first_row, last_row)
+
+    def _step_legacy(self):
+        """Reference per-cell implementation (slow, kept for comparison)."""
         new_fire_map = self.fire_map.copy()
         rows, cols = self.fire_map.shape
         burning_cells = np.argwhere(self.fire_map == 1)
@@ -252,13 +629,28 @@ class FireSimulator:
                         # Use material-specific spread probability
                         current_spread_prob = FIRE_SPREAD_PROBS.get(cell_type, self.spread_probability)
                         
-                        if np.random.rand() < current_spread_prob:
+                        if self.rng.random() < current_spread_prob:
                             new_fire_map[nr, nc] = 1
 
+        newly_burning = np.flatnonzero((new_fire_map == 1) & (self.fire_map != 1))
         self.fire_map = new_fire_map
+        self._ignite(self._to_padded(newly_burning))
 
-    def reset(self, ignition_points=None):
+    def _reset_state(self):
         self.fire_map = np.zeros_like(self.base_grid, dtype=float)
+        self._burning_padded = np.zeros_like(self._flammable_padded)
+        self._unburned_flammable = self._flammable_padded.copy()
+        self._row_span = None  # (first, last) padded rows holding burning cells
+        self._frontier = None  # computed lazily, then maintained by the frontier engine
+        self._fire_distance = None  # (max_distance, raster) cached by fire_distance()
+        # Flat fire_map indices (y * cols + x) ignited by the last step() or reset()
+        self.last_ignited = self._no_cells
+
+    def reset(self, ignition_points=None, rng=None):
+        """Clear the fire and start it at ignition_points; rng, if given, replaces the generator."""
+        if rng is not None:
+            self.rng = rng
+        self._reset_state()
         if ignition_points:
             self.start_fire(ignition_points)
 
@@ -275,23 +667,32 @@ class Person:
         self.speed = 1.0
         self.trip_probability = 0.0
         self.tripped_timer = 0
-        self.PANIC_DISTANCE = 25
-        self.ALERT_DISTANCE = 50
+        self.PANIC_DISTANCE = PANIC_DISTANCE
+        self.ALERT_DISTANCE = ALERT_DISTANCE
         self.escape_time = None
         self.steps_taken = 0
         self.assigned_exit = None
 
-    def update_state(self, fire_map):
-        """Update panic state based on fire proximity."""
+    def update_state(self, fire_map, fire_distance=None):
+        """Update panic state based on fire proximity.
+
+        Args:
+            fire_map: 2D array where 1=fire
+            fire_distance: Optional distance raster from FireSimulator.fire_distance();
+                when given, the distance is looked up instead of scanning every fire cell
+        """
         if self.tripped_timer > 0:
             return
-        fire_locations = np.argwhere(fire_map == 1)
-        if len(fire_locations) == 0:
-            min_dist = float('inf')
+        if fire_distance is not None:
+            min_dist = float(fire_distance[int(self.pos[1]), int(self.pos[0])])
         else:
-            # Fire locations are [y, x], agent pos is [x, y]
-            agent_pos_yx = np.array([self.pos[1], self.pos[0]])
-            min_dist = np.min(np.linalg.norm(fire_locations - agent_pos_yx, axis=1))
+            fire_locations = np.argwhere(fire_map == 1)
+            if len(fire_locations) == 0:
+                min_dist = float('inf')
+            else:
+                # Fire locations are [y, x], agent pos is [x, y]
+                agent_pos_yx = np.array([self.pos[1], self.pos[0]])
+                min_dist = np.min(np.linalg.norm(fire_locations - agent_pos_yx, axis=1))
 
         if min_dist < self.PANIC_DISTANCE:
             self.state = 'PANICKED'
@@ -306,14 +707,17 @@ class Person:
             self.speed = 1.0
             self.trip_probability = 0.0
 
-    def move(self, grid, fire_map=None):
-        """Move agent along path with per-cell wall and fire validation."""
+    def move(self, grid, fire_map=None, rng=None):
+        """Move agent along path with per-cell wall and fire validation.
+
+        rng (np.random.Generator) rolls for trips; the global np.random state if None.
+        """
         if self.tripped_timer > 0:
             self.tripped_timer -= 1
             return
             
         if self.state == 'PANICKED':
-            if np.random.rand() < self.trip_probability:
+            if (np.random if rng is None else rng).random() < self.trip_probability:
                 self.tripped_timer = 5
                 return
                 
@@ -381,52 +785,29 @@ class Person:
                 self.escape_time = self.steps_taken
                 return
 
-    def move_to_assembly(self, grid, assembly_point, fire_map):
+    def move_to_assembly(self, grid, assembly_point, fire_map, router=None, rng=None):
         """Move agent toward assembly point after escape using TWO-PHASE approach.
         
         Phase 1: Move from current position to nearest exterior cell
         Phase 2: Move along exterior-only path to assembly point
         
-        This prevents agents from re-entering the building.
+        This prevents agents from re-entering the building. With a precomputed
+        AssemblyRouter (navigation.py) the next step is looked up instead of planned.
         """
         if self.status != 'escaped':
             return
         
-        current_pos = (int(self.pos[0]), int(self.pos[1]))
-        
-        # Check if agent is on exterior zone
-        is_on_exterior = False
-        if 0 <= current_pos[1] < grid.shape[0] and 0 <= current_pos[0] < grid.shape[1]:
-            is_on_exterior = grid[current_pos[1]][current_pos[0]] == CELL_EXTERIOR
-        
         # Recompute path if needed
-        if not self.path:
-            if not is_on_exterior:
-                # PHASE 1: Find nearest exterior cell and path to it
-                nearest_ext = find_nearest_exterior(grid, current_pos)
-                if nearest_ext:
-                    print(f"[ASSEMBLY DEBUG] Phase 1: Agent at {current_pos} finding path to exterior at {nearest_ext}", flush=True)
-                    self.path = a_star_search(grid, current_pos, nearest_ext, fire_map)
-                    if self.path:
-                        print(f"[ASSEMBLY DEBUG] Phase 1 path found: {len(self.path)} steps to exterior", flush=True)
-                    else:
-                        print(f"[ASSEMBLY DEBUG] WARNING: No path to exterior found!", flush=True)
-                else:
-                    print(f"[ASSEMBLY DEBUG] WARNING: No exterior cell found near {current_pos}!", flush=True)
-            else:
-                # PHASE 2: Already on exterior, use exterior-only path to assembly
-                assembly_pos = (int(assembly_point[0]), int(assembly_point[1]))
-                print(f"[ASSEMBLY DEBUG] Phase 2: Agent on exterior at {current_pos}, pathfinding to assembly {assembly_pos}", flush=True)
-                self.path = a_star_exterior_only(grid, current_pos, assembly_pos)
-                if self.path:
-                    print(f"[ASSEMBLY DEBUG] Phase 2 exterior-only path found: {len(self.path)} steps to assembly", flush=True)
-                else:
-                    print(f"[ASSEMBLY DEBUG] WARNING: No exterior path to assembly found!", flush=True)
+        if router is not None:
+            self.path = router.path_from(self.pos, 1)
+        elif not self.path:
+            current_pos = (int(self.pos[0]), int(self.pos[1]))
+            self.path = plan_assembly_path(grid, current_pos, assembly_point, fire_map)
         
         # Move along path
         if self.path:
             self.speed = 1.0  # Normal speed when moving to assembly
-            self.move(grid)  # No fire avoidance needed for assembly movement
+            self.move(grid, rng=rng)  # No fire avoidance needed for assembly movement
 
     def compute_path(self, grid, goal, fire_map):
         """Compute path to goal using A*."""
@@ -434,6 +815,10 @@ class Person:
         goal_pos = (int(goal[0]), int(goal[1]))
         self.path = a_star_search(grid, start_pos, goal_pos, fire_map)
 
+    def follow_field(self, field):
+        """Take the next steps toward the nearest exit from a shared ExitNavigationField."""
+        self.path = field.path_from(self.pos, max(1, int(round(self.speed))))
+
     def reset(self):
         self.pos = list(self.initial_pos)
         self.path = []
@@ -447,12 +832,34 @@ class Person:
         self.assigned_exit = None
 
 
+def _agent_class(agent_engine):
+    """Agent type used for the per-object engines ('person' or 'compact')."""
+    if agent_engine == 'compact':
+        from population import CompactPerson
+        return CompactPerson
+    return Person
+
+
 # Gymnasium Environment for RL
 class EvacuationEnv(gym.Env):
     def __init__(self, grid, num_agents=5, max_steps=500, agent_start_positions=None, 
-                 fire_start_position=None, exits=None, max_agents=10):
+                 fire_start_position=None, exits=None, max_agents=10, navigation='astar',
+                 replan_policy='fire_intersection', agent_engine='person'):
         super(EvacuationEnv, self).__init__()
 
+        if navigation not in NAVIGATION_MODES:
+            raise ValueError(f"Unknown navigation mode '{navigation}'. Options: {NAVIGATION_MODES}")
+        if replan_policy not in REPLAN_POLICIES:
+            raise ValueError(f"Unknown replan policy '{replan_policy}'. Options: {REPLAN_POLICIES}")
+        if agent_engine not in ('person', 'compact'):
+            raise ValueError(f"Unknown agent engine '{agent_engine}'. Options: ('person', 'compact')")
+        self.navigation = navigation
+        self.agent_class = _agent_class(agent_engine)
+        self.replan_policy = replan_policy
+        self.nav_field = None
+        self.exit_router = None
+        self.occupancy = None
+
         self.base_grid = grid
         self.num_agents = num_agents
         self.max_agents = max_agents  # For zero-padding observations
@@ -466,11 +873,11 @@ class EvacuationEnv(gym.Env):
             raise ValueError("No exits were found or provided. Cannot create environment.")
 
         # Debug: Check grid composition
-        unique, counts = np.unique(self.base_grid, return_counts=True)
-        print(f"[DEBUG] Grid composition: {dict(zip(unique, counts))}", flush=True)
+        print(f"[DEBUG] Grid composition: {dict(grid_composition(self.base_grid))}", flush=True)
 
         self.fire_sim = FireSimulator(self.base_grid)
         self.agents = []
+        self.rng = None  # Seeded generator once reset() gets a seed; None uses the global np.random state
 
         self.action_space = spaces.Discrete(len(self.exits))
 
@@ -482,27 +889,21 @@ class EvacuationEnv(gym.Env):
         self.observation_space = spaces.Box(low=0, high=1, shape=(obs_shape,), dtype=np.float32)
 
     def _find_exits(self):
-        """Auto-detect exits from grid edges."""
-        rows, cols = self.base_grid.shape
-        exits = []
-        for x in range(cols):
-            if self.base_grid[1, x] == 0:
-                exits.append((x, 1))
-            if self.base_grid[rows-2, x] == 0:
-                exits.append((x, rows-2))
-        for y in range(rows):
-            if self.base_grid[y, 1] == 0:
-                exits.append((1, y))
-            if self.base_grid[y, cols-2] == 0:
-                exits.append((cols-2, y))
-        if not exits:
-            return []
-        # Filter to keep exits at least 20 pixels apart
-        filtered_exits = [exits[0]]
-        for ex in exits:
-            if all(np.linalg.norm(np.array(ex) - np.array(f_ex)) > 20 for f_ex in filtered_exits):
-                filtered_exits.append(ex)
-        return filtered_exits
+        """Auto-detect exits one cell in from the grid edges, more than 20 cells apart (cached per grid)."""
+        from exit_detection import detect_exits, spaced_exits
+        return list(grid_cache.get(self.base_grid, "env_exits",
+                                   lambda g: spaced_exits(detect_exits(g, inset=1, spacing=20), 20)))
+
+    def _nearest_exit(self, pos):
+        """Find the exit closest to (x, y) in straight-line distance."""
+        min_dist = float('inf')
+        nearest_exit = self.exits[0] if self.exits else (0, 0)
+        for ex in self.exits:
+            dist = np.sqrt((pos[0] - ex[0])**2 + (pos[1] - ex[1])**2)
+            if dist < min_dist:
+                min_dist = dist
+                nearest_exit = ex
+        return nearest_exit
 
     def _get_observation(self):
         fire_map_resized = cv2.resize(self.fire_sim.fire_map.astype(np.float32), (64, 64), interpolation=cv2.INTER_AREA)
@@ -526,6 +927,9 @@ class EvacuationEnv(gym.Env):
 
     def reset(self, seed=None):
         super().reset(seed=seed)
+        if seed is not None:
+            # Fire spread, agent trips and random start positions all draw from the seeded generator
+            self.rng = self.np_random
         self.current_step = 0
 
         # Fire position: input is (x, y) but fire_sim expects (y, x) format
@@ -536,17 +940,31 @@ class EvacuationEnv(gym.Env):
         else:
             fire_start = (self.base_grid.shape[0] // 2, self.base_grid.shape[1] // 2)
             print(f"[RL ENV] Using default fire position (center): {fire_start}", flush=True)
-        self.fire_sim.reset(ignition_points=[fire_start])
+        self.fire_sim.reset(ignition_points=[fire_start], rng=self.rng)
+        if self.navigation == 'field':
+            from navigation import ExitNavigationField
+            self.nav_field = ExitNavigationField(self.base_grid, self.exits, self.fire_sim.fire_map)
+        elif self.navigation == 'incremental':
+            from navigation import ExitFieldRouter
+            self.exit_router = ExitFieldRouter(self.base_grid, self.fire_sim.fire_map)
+        elif self.replan_policy == 'fire_intersection':
+            from navigation import PathOccupancyIndex
+            self.occupancy = PathOccupancyIndex(self.base_grid.shape[1])
+        self._stranded_at = {}
 
         self.agents = []
         if self.initial_agent_positions:
             for pos in self.initial_agent_positions:
-                self.agents.append(Person(position=pos))
+                self.agents.append(self.agent_class(position=pos))
         else:
+            rows, cols = self.base_grid.shape
             while len(self.agents) < self.num_agents:
-                y, x = np.random.randint(0, self.base_grid.shape[0]), np.random.randint(0, self.base_grid.shape[1])
+                if self.rng is not None:
+                    y, x = int(self.rng.integers(rows)), int(self.rng.integers(cols))
+                else:
+                    y, x = np.random.randint(0, rows), np.random.randint(0, cols)
                 if self.base_grid[y, x] == 0 and self.fire_sim.fire_map[y, x] == 0:
-                    self.agents.append(Person(position=(x, y)))
+                    self.agents.append(self.agent_class(position=(x, y)))
 
         for agent in self.agents:
             agent.reset()
@@ -556,27 +974,38 @@ class EvacuationEnv(gym.Env):
     def step(self, action):
         self.current_step += 1
         self.fire_sim.step()
+        if self.nav_field is not None:
+            self.nav_field.update(self.fire_sim.last_ignited)
+        if self.exit_router is not None:
+            self.exit_router.update(self.fire_sim.last_ignited)
+        crossing = self.occupancy.agents_crossing(self.fire_sim.last_ignited) if self.occupancy is not None else ()
 
         # PPO action is ignored - each agent goes to their nearest exit instead
         reward = -0.01
 
         for agent in self.agents:
             if agent.status == 'evacuating':
-                agent.update_state(self.fire_sim.fire_map)
-
-                is_stuck_or_needs_path = not agent.path or (self.current_step % 10 == 0)
-                if agent.state != 'PANICKED' and is_stuck_or_needs_path:
-                    # Find nearest exit for this agent
-                    min_dist = float('inf')
-                    nearest_exit = self.exits[0] if self.exits else (0, 0)
-                    for ex in self.exits:
-                        dist = np.sqrt((agent.pos[0] - ex[0])**2 + (agent.pos[1] - ex[1])**2)
-                        if dist < min_dist:
-                            min_dist = dist
-                            nearest_exit = ex
-                    agent.compute_path(self.base_grid, nearest_exit, self.fire_sim.fire_map)
-
-                agent.move(self.base_grid, self.fire_sim.fire_map)
+                agent.update_state(self.fire_sim.fire_map, self.fire_sim.fire_distance(ALERT_DISTANCE))
+
+                if self.occupancy is not None:
+                    # A failed search is only retried once the agent has moved
+                    is_stuck = not agent.path and self._stranded_at.get(agent) != agent.pos
+                    is_stuck_or_needs_path = is_stuck or agent in crossing
+                else:
+                    is_stuck_or_needs_path = not agent.path or (self.current_step % 10 == 0)
+                if self.nav_field is not None:
+                    agent.follow_field(self.nav_field)
+                elif self.exit_router is not None:
+                    if agent.assigned_exit is None:
+                        agent.assigned_exit = self._nearest_exit(agent.pos)
+                    agent.follow_field(self.exit_router.field_for(agent.assigned_exit))
+                elif agent.state != 'PANICKED' and is_stuck_or_needs_path:
+                    agent.compute_path(self.base_grid, self._nearest_exit(agent.pos), self.fire_sim.fire_map)
+                    if self.occupancy is not None:
+                        self.occupancy.set_path(agent, agent.path)
+                        self._stranded_at[agent] = None if agent.path else list(agent.pos)
+
+                agent.move(self.base_grid, self.fire_sim.fire_map, rng=self.rng)
                 
                 # Debug: Check for wall collision after move
                 pos_y, pos_x = int(agent.pos[1]), int(agent.pos[0])
@@ -585,6 +1014,8 @@ class EvacuationEnv(gym.Env):
                         print(f"[CRITICAL] Agent moved into WALL at {agent.pos}!", flush=True)
 
                 agent.check_status(self.fire_sim.fire_map, self.exits)
+                if self.occupancy is not None and agent.status != 'evacuating':
+                    self.occupancy.remove(agent)
                 
                 if agent.status == 'escaped':
                     print(f"[DEBUG] Agent ESCAPED at step {self.current_step}, took {agent.steps_taken} steps", flush=True)
@@ -602,7 +1033,11 @@ class EvacuationEnv(gym.Env):
 
 # Heuristic (Non-RL) Simulation Function
 def run_heuristic_simulation(grid, agent_positions, fire_position, exits=None, 
-                              max_steps=500, extended_fire_steps=0, assembly_point=None):
+                              max_steps=500, extended_fire_steps=0, assembly_point=None,
+                              navigation='astar', replan_policy='fire_intersection',
+                              agent_engine='person', history_format='frames', raster_encoding='json',
+                              keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, frame_sink=None, spool_path=None,
+                              seed=None):
     """
     Run a heuristic-based simulation without PPO model.
     Supports unlimited agents and provides the same output format as RL simulation.
@@ -615,10 +1050,45 @@ def run_heuristic_simulation(grid, agent_positions, fire_position, exits=None,
         max_steps: Maximum simulation steps
         extended_fire_steps: Continue fire spread after agents done
         assembly_point: (x, y) for post-escape gathering (optional)
+        navigation: 'astar' (each agent re-runs A* to its assigned exit every 10 steps),
+            'field' (agents follow a shared distance field to the nearest reachable exit)
+            or 'incremental' (agents follow a per-exit field to their assigned exit that
+            is repaired only where the fire cuts a route)
+        replan_policy: For 'astar' navigation, 'fire_intersection' (replan when newly
+            burning cells cross an agent's remaining path) or 'interval' (every 10 steps)
+        agent_engine: 'person' (one Person object per agent), 'compact' (slotted
+            CompactPerson objects) or 'population' (vectorized AgentPopulation for
+            thousands of agents; needs 'field' or 'incremental' navigation). All three
+            give the same results.
+        history_format: 'frames' (burning cells listed in every frame),
+            'ignition_raster' (one ignition-step raster plus per-frame agents) or
+            'delta' (newly ignited cells and changed agents, with periodic keyframes);
+            see frames.FrameRecorder
+        raster_encoding: 'json' or 'base64' for the 'ignition_raster' format
+        keyframe_interval: Frames between full keyframes in the 'delta' format
+        frame_sink: Optional callable receiving each frame as it is recorded (live streaming)
+        spool_path: Optional NDJSON file for the frames, keeping the history out of memory
+            (see frames.FrameRecorder)
+        seed: Seed for fire spread and agent trips. The same inputs and seed always give
+            the same result; None draws from the global np.random state.
     
     Returns:
         Result dict compatible with frontend
     """
+    if navigation not in NAVIGATION_MODES:
+        raise ValueError(f"Unknown navigation mode '{navigation}'. Options: {NAVIGATION_MODES}")
+    if replan_policy not in REPLAN_POLICIES:
+        raise ValueError(f"Unknown replan policy '{replan_policy}'. Options: {REPLAN_POLICIES}")
+    if agent_engine not in AGENT_ENGINES:
+        raise ValueError(f"Unknown agent engine '{agent_engine}'. Options: {AGENT_ENGINES}")
+    if agent_engine == 'population' and navigation == 'astar':
+        raise ValueError("The population agent engine needs 'field' or 'incremental' navigation")
+    if history_format not in HISTORY_FORMATS:
+        raise ValueError(f"Unknown history format '{history_format}'. Options: {HISTORY_FORMATS}")
+    if raster_encoding not in RASTER_ENCODINGS:
+        raise ValueError(f"Unknown raster encoding '{raster_encoding}'. Options: {RASTER_ENCODINGS}")
+    if keyframe_interval < 1:
+        raise ValueError(f"keyframe_interval must be at least 1, got {keyframe_interval}")
     print(f"[HEURISTIC] Starting simulation: {len(agent_positions)} agents", flush=True)
     
     # Validate fire position - ensure it's on a free cell
@@ -627,27 +1097,16 @@ def run_heuristic_simulation(grid, agent_positions, fire_position, exits=None,
         if grid[fire_y][fire_x] == CELL_WALL:
             print(f"[HEURISTIC] WARNING: Fire position ({fire_x}, {fire_y}) is on WALL, finding nearest free cell...", flush=True)
             # Search for nearest free cell
-            found = False
-            for radius in range(1, 50):
-                for dy in range(-radius, radius + 1):
-                    for dx in range(-radius, radius + 1):
-                        if abs(dx) == radius or abs(dy) == radius:
-                            new_x, new_y = fire_x + dx, fire_y + dy
-                            if 0 <= new_y < grid.shape[0] and 0 <= new_x < grid.shape[1]:
-                                if grid[new_y][new_x] == CELL_FREE:
-                                    print(f"[HEURISTIC] Fixed fire position: ({fire_x}, {fire_y}) -> ({new_x}, {new_y})", flush=True)
-                                    fire_position = (new_x, new_y)
-                                    found = True
-                                    break
-                    if found:
-                        break
-                if found:
-                    break
-            if not found:
+            new_pos = nearest_free_cell(grid, (fire_x, fire_y))
+            if new_pos is not None:
+                print(f"[HEURISTIC] Fixed fire position: ({fire_x}, {fire_y}) -> {new_pos}", flush=True)
+                fire_position = new_pos
+            else:
                 print(f"[HEURISTIC] ERROR: Could not find free cell near fire position", flush=True)
     
     # Initialize fire simulator
-    fire_sim = FireSimulator(grid)
+    rng = np.random.default_rng(seed) if seed is not None else None
+    fire_sim = FireSimulator(grid, rng=rng)
     # Fire position needs to be (y, x) for fire_sim - input is (x, y)
     fire_start_yx = (fire_position[1], fire_position[0])
     
@@ -675,31 +1134,12 @@ def run_heuristic_simulation(grid, agent_positions, fire_position, exits=None,
             if grid[ex_y][ex_x] == CELL_WALL:
                 print(f"[HEURISTIC] WARNING: Exit ({ex_x}, {ex_y}) is on WALL, searching for nearest free cell...", flush=True)
                 # Search for nearest free cell that's not too close to agents
-                found = False
-                for radius in range(1, 50):  # Search up to 50 cells away
-                    for dy in range(-radius, radius + 1):
-                        for dx in range(-radius, radius + 1):
-                            if abs(dx) == radius or abs(dy) == radius:  # Only check perimeter
-                                new_x, new_y = ex_x + dx, ex_y + dy
-                                if 0 <= new_y < grid.shape[0] and 0 <= new_x < grid.shape[1]:
-                                    if grid[new_y][new_x] == CELL_FREE:
-                                        # Check distance to all agents
-                                        too_close_to_agent = False
-                                        for agent_pos in agent_positions:
-                                            agent_dist = np.sqrt((new_x - agent_pos[0])**2 + (new_y - agent_pos[1])**2)
-                                            if agent_dist < MIN_EXIT_AGENT_DISTANCE:
-                                                too_close_to_agent = True
-                                                break
-                                        if not too_close_to_agent:
-                                            print(f"[HEURISTIC] Fixed exit: ({ex_x}, {ex_y}) -> ({new_x}, {new_y})", flush=True)
-                                            validated_exits.append((new_x, new_y))
-                                            found = True
-                                            break
-                        if found:
-                            break
-                    if found:
-                        break
-                if not found:
+                new_pos = nearest_free_cell(grid, (ex_x, ex_y), avoid=agent_positions,
+                                            min_distance=MIN_EXIT_AGENT_DISTANCE)
+                if new_pos is not None:
+                    print(f"[HEURISTIC] Fixed exit: ({ex_x}, {ex_y}) -> {new_pos}", flush=True)
+                    validated_exits.append(new_pos)
+                else:
                     print(f"[HEURISTIC] ERROR: Could not find free cell near exit ({ex_x}, {ex_y})", flush=True)
             else:
                 validated_exits.append((ex_x, ex_y))
@@ -715,12 +1155,22 @@ def run_heuristic_simulation(grid, agent_positions, fire_position, exits=None,
     print(f"[HEURISTIC] Using {len(exits)} validated exits", flush=True)
     
     # Initialize agents
-    agents = [Person(position=pos) for pos in agent_positions]
+    population = None
+    agents = []
+    if agent_engine == 'population':
+        from population import AgentPopulation
+        population = AgentPopulation(agent_positions, rng=rng)
+    else:
+        agent_class = _agent_class(agent_engine)
+        agents = [agent_class(position=pos) for pos in agent_positions]
     
     # Log all exits
     print(f"[HEURISTIC] Available exits: {exits}", flush=True)
     
     # Assign each agent to nearest exit (heuristic strategy)
+    if population is not None:
+        population.assign_nearest_exits(exits)
+        print(f"[HEURISTIC] Assigned {len(population)} agents to their nearest exits", flush=True)
     for i, agent in enumerate(agents):
         min_dist = float('inf')
         best_exit = exits[0] if exits else (0, 0)
@@ -732,36 +1182,86 @@ def run_heuristic_simulation(grid, agent_positions, fire_position, exits=None,
         agent.assigned_exit = best_exit
         print(f"[HEURISTIC] Agent {i} at ({agent.pos[0]}, {agent.pos[1]}) -> Exit ({best_exit[0]}, {best_exit[1]}) [dist={min_dist:.1f}]", flush=True)
     
+    nav_field = None
+    exit_router = None
+    if navigation == 'field':
+        from navigation import ExitNavigationField
+        nav_field = ExitNavigationField(grid, exits, fire_sim.fire_map)
+        print(f"[HEURISTIC] Using navigation field over {len(exits)} exits", flush=True)
+    elif navigation == 'incremental':
+        from navigation import ExitFieldRouter
+        exit_router = ExitFieldRouter(grid, fire_sim.fire_map)
+        print("[HEURISTIC] Using incremental per-exit navigation fields", flush=True)
+    
+    occupancy = None
+    if navigation == 'astar' and replan_policy == 'fire_intersection':
+        from navigation import PathOccupancyIndex
+        occupancy = PathOccupancyIndex(grid.shape[1])
+    assembly_router = None
+    if assembly_point is not None:
+        from navigation import AssemblyRouter
+        assembly_router = AssemblyRouter(grid, assembly_point, fire_sim.fire_map)
+        if not assembly_router.reachable:
+            print(f"[HEURISTIC] WARNING: Assembly point {assembly_router.assembly_point} is not on the exterior, agents cannot reach it", flush=True)
+    
+    # Fire only ever blocks more cells, so a failed search is not retried until the agent moves
+    stranded_at = {}
+    replans = 0
+    
     # Run simulation
-    history = []
+    recorder = FrameRecorder(fire_sim, history_format, raster_encoding, keyframe_interval, frame_sink, spool_path)
     step_count = 0
     
     while step_count < max_steps:
         step_count += 1
         fire_sim.step()
+        if nav_field is not None:
+            nav_field.update(fire_sim.last_ignited)
+        if exit_router is not None:
+            exit_router.update(fire_sim.last_ignited)
+        if assembly_router is not None:
+            assembly_router.update(fire_sim.last_ignited)
+        crossing = occupancy.agents_crossing(fire_sim.last_ignited) if occupancy is not None else ()
+        
+        if population is not None:
+            navigator = nav_field if nav_field is not None else exit_router
+            population.step(grid, fire_sim.fire_map, fire_sim.fire_distance(ALERT_DISTANCE), navigator, assembly_router)
         
         active_agents = [a for a in agents if a.status == 'evacuating']
         escaped_agents = [a for a in agents if a.status == 'escaped']
         
         for agent in active_agents:
-            agent.update_state(fire_sim.fire_map)
+            agent.update_state(fire_sim.fire_map, fire_sim.fire_distance(ALERT_DISTANCE))
             
             # Recompute path periodically or if stuck
-            if not agent.path or step_count % 10 == 0:
+            if nav_field is not None:
+                agent.follow_field(nav_field)
+            elif exit_router is not None:
+                agent.follow_field(exit_router.field_for(agent.assigned_exit))
+            elif occupancy is not None:
+                # Replan only when fire has cut the remaining path
+                if (not agent.path and stranded_at.get(agent) != agent.pos) or agent in crossing:
+                    agent.compute_path(grid, agent.assigned_exit, fire_sim.fire_map)
+                    occupancy.set_path(agent, agent.path)
+                    stranded_at[agent] = None if agent.path else list(agent.pos)
+                    replans += 1
+            elif not agent.path or step_count % 10 == 0:
                 agent.compute_path(grid, agent.assigned_exit, fire_sim.fire_map)
+                replans += 1
             
-            agent.move(grid, fire_sim.fire_map)
+            agent.move(grid, fire_sim.fire_map, rng=rng)
             agent.check_status(fire_sim.fire_map, exits, assembly_point=assembly_point)
+            if occupancy is not None and agent.status != 'evacuating':
+                occupancy.remove(agent)
         
         # Handle agents moving to assembly point after escape
         if assembly_point is not None:
             for agent in escaped_agents:
-                agent.move_to_assembly(grid, assembly_point, fire_sim.fire_map)
+                agent.move_to_assembly(grid, assembly_point, fire_sim.fire_map, assembly_router, rng=rng)
                 agent.check_status(fire_sim.fire_map, exits, assembly_point=assembly_point)
         
         # Record frame (convert to frontend format [row, col])
-        fire_coords = np.argwhere(fire_sim.fire_map == 1).tolist()
-        agents_data = []
+        agents_data = population.frame_agents() if population is not None else []
         for agent in agents:
             agents_data.append({
                 "pos": [agent.pos[1], agent.pos[0]],  # Convert to [row, col]
@@ -769,15 +1269,14 @@ def run_heuristic_simulation(grid, agent_positions, fire_position, exits=None,
                 "state": agent.state,
                 "tripped": agent.tripped_timer > 0
             })
-        history.append({
-            "fire_map": fire_coords,
-            "agents": agents_data
-        })
+        recorder.record(agents_data)
         
         # Check if simulation is done
         # With assembly point: done when all agents are at_assembly or burned
         # Without assembly: done when all agents are escaped or burned
-        if assembly_point is not None:
+        if population is not None:
+            all_done = population.all_done(with_assembly=assembly_point is not None)
+        elif assembly_point is not None:
             all_done = all(a.status in ['at_assembly', 'burned'] for a in agents)
         else:
             all_done = all(a.status != 'evacuating' for a in agents)
@@ -786,6 +1285,12 @@ def run_heuristic_simulation(grid, agent_positions, fire_position, exits=None,
             print(f"[HEURISTIC] All agents done at step {step_count}", flush=True)
             break
     
+    if nav_field is not None or exit_router is not None:
+        navigator = nav_field if nav_field is not None else exit_router
+        print(f"[HEURISTIC] Navigation re-routed {navigator.repaired_cells} cells as fire spread", flush=True)
+    else:
+        print(f"[HEURISTIC] {replans} A* replans ({replan_policy})", flush=True)
+    
     # Extended fire spread demonstration
     if extended_fire_steps != 0:
         if extended_fire_steps == -1:
@@ -794,13 +1299,10 @@ def run_heuristic_simulation(grid, agent_positions, fire_position, exits=None,
             max_burn_steps = 2000  # Safety limit
             burn_step = 0
             while burn_step < max_burn_steps:
-                prev_fire_count = np.sum(fire_sim.fire_map)
                 fire_sim.step()
-                new_fire_count = np.sum(fire_sim.fire_map)
                 
-                fire_coords = np.argwhere(fire_sim.fire_map == 1).tolist()
                 # Keep agents frozen at final position
-                agents_data = []
+                agents_data = population.frame_agents(tripped=False) if population is not None else []
                 for agent in agents:
                     agents_data.append({
                         "pos": [agent.pos[1], agent.pos[0]],
@@ -808,15 +1310,12 @@ def run_heuristic_simulation(grid, agent_positions, fire_position, exits=None,
                         "state": agent.state,
                         "tripped": False
                     })
-                history.append({
-                    "fire_map": fire_coords,
-                    "agents": agents_data
-                })
+                recorder.record(agents_data)
                 
                 burn_step += 1
                 
-                # Stop if fire stopped spreading (no new cells burned)
-                if new_fire_count == prev_fire_count:
+                # Stop once no burning cell has anything left to ignite
+                if fire_sim.frontier_empty:
                     print(f"[HEURISTIC] Fire fully spread after {burn_step} extra steps", flush=True)
                     break
         else:
@@ -824,9 +1323,8 @@ def run_heuristic_simulation(grid, agent_positions, fire_position, exits=None,
             print(f"[HEURISTIC] Running {extended_fire_steps} extended fire steps", flush=True)
             for _ in range(extended_fire_steps):
                 fire_sim.step()
-                fire_coords = np.argwhere(fire_sim.fire_map == 1).tolist()
                 # Keep agents frozen
-                agents_data = []
+                agents_data = population.frame_agents(tripped=False) if population is not None else []
                 for agent in agents:
                     agents_data.append({
                         "pos": [agent.pos[1], agent.pos[0]],
@@ -834,20 +1332,25 @@ def run_heuristic_simulation(grid, agent_positions, fire_position, exits=None,
                         "state": agent.state,
                         "tripped": False
                     })
-                history.append({
-                    "fire_map": fire_coords,
-                    "agents": agents_data
-                })
+                recorder.record(agents_data)
     
     # Calculate statistics
-    escaped = sum(1 for a in agents if a.status in ['escaped', 'at_assembly'])
-    burned = sum(1 for a in agents if a.status == 'burned')
-    at_assembly = sum(1 for a in agents if a.status == 'at_assembly')
+    if population is not None:
+        from population import ESCAPED, BURNED, AT_ASSEMBLY
+        total_agents = len(population)
+        escaped = population.count(ESCAPED, AT_ASSEMBLY)
+        burned = population.count(BURNED)
+        at_assembly = population.count(AT_ASSEMBLY)
+    else:
+        total_agents = len(agents)
+        escaped = sum(1 for a in agents if a.status in ['escaped', 'at_assembly'])
+        burned = sum(1 for a in agents if a.status == 'burned')
+        at_assembly = sum(1 for a in agents if a.status == 'at_assembly')
     
-    print(f"[HEURISTIC] Complete: {escaped}/{len(agents)} escaped, {at_assembly} at assembly, {burned} burned", flush=True)
+    print(f"[HEURISTIC] Complete: {escaped}/{total_agents} escaped, {at_assembly} at assembly, {burned} burned", flush=True)
     
     # Prepare result
-    agent_results = []
+    agent_results = population.agent_results() if population is not None else []
     for i, agent in enumerate(agents):
         agent_results.append({
             "agent_id": i,
@@ -862,7 +1365,7 @@ def run_heuristic_simulation(grid, agent_positions, fire_position, exits=None,
     assembly_point_frontend = [assembly_point[1], assembly_point[0]] if assembly_point else None
     
     return {
-        "total_agents": len(agents),
+        "total_agents": total_agents,
         "escaped_count": escaped,
         "burned_count": burned,
         "at_assembly_count": at_assembly,
@@ -870,42 +1373,14 @@ def run_heuristic_simulation(grid, agent_positions, fire_position, exits=None,
         "agent_results": agent_results,
         "exits": exits_frontend,
         "assembly_point": assembly_point_frontend,
-        "commander_actions": history[:100],
-        "animation_data": {
-            "history": history
-        },
+        "commander_actions": recorder.history[:100],
+        "animation_data": recorder.animation_data(),
         "mode": "heuristic"
     }
 
 
 def auto_detect_exits_from_grid(grid, max_exits=50):
-    """Auto-detect exits from grid boundaries (standalone version)."""
-    height, width = grid.shape
-    exits = []
-    
-    # Check edges for free spaces
-    for x in range(width):
-        if grid[0, x] == CELL_FREE:
-            exits.append((x, 0))
-        if grid[height-1, x] == CELL_FREE:
-            exits.append((x, height-1))
-    
-    for y in range(height):
-        if grid[y, 0] == CELL_FREE:
-            exits.append((0, y))
-        if grid[y, width-1] == CELL_FREE:
-            exits.append((width-1, y))
-    
-    # Remove duplicates and filter to keep exits apart
-    exits = list(set(exits))
-    if len(exits) <= 1:
-        return exits
-    
-    filtered = [exits[0]]
-    for ex in exits[1:]:
-        if all(np.sqrt((ex[0]-f[0])**2 + (ex[1]-f[1])**2) > 15 for f in filtered):
-            filtered.append(ex)
-        if len(filtered) >= max_exits:
-            break
-    
-    return filtered
+    """Auto-detect exits from grid boundaries, more than 15 cells apart (standalone version, cached per grid)."""
+    from exit_detection import detect_exits, spaced_exits
+    return list(grid_cache.get(grid, ("auto_exits", max_exits),
+                               lambda g: spaced_exits(detect_exits(g, spacing=15), 15, max_exits)))
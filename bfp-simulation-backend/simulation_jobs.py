@@ -0,0 +1,580 @@
+import gc
+import os
+from typing import List, Tuple, Dict, Optional, Union
+
+import numpy as np
+import torch
+from pydantic import BaseModel
+from stable_baselines3 import PPO
+from sb3_contrib import MaskablePPO
+
+from simulation import EvacuationEnv, run_heuristic_simulation, nearest_free_cell
+from fire_ensemble import run_fire_ensemble
+from frames import FrameRecorder, read_spool
+from navigation import AssemblyRouter
+from binary_result import encode_binary_result, ignition_raster_from_result, BINARY_RESULT_VERSION
+from job_store import JobStore
+from grid_store import GridStore
+from grid_cache import grid_cache
+from exit_detection import detect_exits, capped_exits
+from grid_codec import decode_grid
+
+# Simulation and ensemble jobs, run in the job executor's worker processes. Workers
+# are spawned and import this module (not main), so it stays clear of the server's
+# image, chatbot and web dependencies.
+
+PPO_MODEL_VERSION = "500k_steps"  # Options: "v1.5", "v2.0_lite", "500k_steps", "v2.0"
+USE_MASKABLE_PPO = True  # Set to True for v2.0, False for v1.5
+PPO_MODEL_PATH = f"models/ppo_commander_{PPO_MODEL_VERSION}.zip"
+# Grids referenced by grid_id are stored here, least recently used evicted beyond MAX_GRID_BYTES
+GRIDS_DIR = "grids"
+MAX_GRID_BYTES = int(os.environ.get("MAX_GRID_BYTES", 512 * 1024 ** 2))
+MAX_GRID_CELLS = 4096 * 4096
+RESULTS_DIR = "results"
+
+# Shared with the server process through the database file and the grids directory
+job_store = JobStore("jobs.db")
+grid_store = GridStore(GRIDS_DIR, max_bytes=MAX_GRID_BYTES)
+
+ppo_model = None  # Set in worker processes by init_simulation_worker
+device = None
+
+def load_ppo_model(device):
+    """Load the PPO commander model, or return None if it is missing or fails to load."""
+    try:
+        model_path = PPO_MODEL_PATH
+        abs_path = os.path.abspath(model_path)
+        print(f"  Model path: {abs_path}")
+        print(f"  Using {'MaskablePPO' if USE_MASKABLE_PPO else 'Standard PPO'}")
+        
+        if not os.path.exists(model_path):
+            print(f"  [FAIL] ERROR: Model file not found!")
+            print(f"  Expected location: {abs_path}")
+            return None
+        
+        file_size = os.path.getsize(model_path) / (1024 * 1024)  # MB
+        print(f"  File size: {file_size:.2f} MB")
+        print(f"  Loading model...")
+        
+        if USE_MASKABLE_PPO:
+            model = MaskablePPO.load(model_path, device=device)
+        else:
+            model = PPO.load(model_path, device=device)
+        print(f"  [OK] PPO Commander {PPO_MODEL_VERSION} loaded successfully")
+        return model
+    except Exception as e:
+        print(f"  [FAIL] ERROR loading PPO model:")
+        print(f"  {type(e).__name__}: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+def init_simulation_worker():
+    """Runs once in every job worker process: loads the PPO model its RL simulations use."""
+    global ppo_model, device
+    device = torch.device("cpu")
+    print(f"\n[WORKER {os.getpid()}] Loading PPO Commander Model ({PPO_MODEL_VERSION})...", flush=True)
+    ppo_model = load_ppo_model(device)
+
+class PackedGrid(BaseModel):
+    """A grid as base64 uint8 cells or their runs (see grid_codec), much smaller and faster to parse than lists"""
+    encoding: str  # 'base64' or 'rle'
+    dtype: str = "uint8"
+    shape: Tuple[int, int]  # (rows, cols)
+    data: str
+
+class SimulationConfig(BaseModel):
+    grid: Optional[Union[List[List[int]], PackedGrid]] = None  # Either the grid inline...
+    grid_id: Optional[str] = None  # ...or a grid from the grid store (POST /api/grids, /api/process-image)
+    exits: Optional[List[Tuple[int, int]]] = None  # User-placed exits (row, col format from frontend)
+    fire_position: Tuple[int, int]  # (row, col) format from frontend
+    agent_positions: List[Tuple[int, int]]  # [(row, col), ...] format from frontend
+    # New configuration options
+    use_rl: bool = True  # If False, use heuristic mode (no 10-agent limit)
+    threshold: float = 0.5  # U-Net segmentation threshold
+    invert_mask: bool = True  # Whether to invert the mask
+    extended_fire_steps: int = 0  # Continue fire spread after all agents done
+    assembly_point: Optional[Tuple[int, int]] = None  # (row, col) for assembly area
+    navigation: str = "astar"  # 'astar' (A* per agent), 'field' (shared exit distance field) or 'incremental' (repaired per-exit fields)
+    replan_policy: str = "fire_intersection"  # A* replanning: 'fire_intersection' or 'interval' (every 10 steps)
+    agent_engine: str = "person"  # 'person', 'compact' (slotted agents) or 'population' (vectorized heuristic runs, needs field navigation)
+    history_format: str = "frames"  # 'frames' (burning cells per frame), 'ignition_raster' (one ignition-step raster + per-frame agents) or 'delta'
+    raster_encoding: str = "json"  # Ignition raster as 'json' lists or 'base64' int16 bytes
+    keyframe_interval: int = 50  # 'delta' format: frames between full keyframes
+    result_format: str = "json"  # 'json' (frames inline in the status result) or 'binary' (typed arrays from /api/result/{job_id}.bin)
+    seed: Optional[int] = None  # Set for a reproducible run; seeded runs are served from the result cache
+
+MAX_ENSEMBLE_REALIZATIONS = 5000
+
+class EnsembleConfig(BaseModel):
+    grid: Optional[Union[List[List[int]], PackedGrid]] = None
+    grid_id: Optional[str] = None  # Instead of grid
+    fire_position: Tuple[int, int]  # (row, col) format from frontend
+    num_realizations: int = 100  # Independent fire runs (max MAX_ENSEMBLE_REALIZATIONS)
+    max_steps: int = 2000  # Time horizon for arrival times
+    percentiles: List[float] = [10, 50, 90]  # Time-of-arrival percentiles to report
+    seed: Optional[int] = None  # Set for reproducible ensembles
+
+
+# Coordinate conversion utilities
+def frontend_to_backend(row: int, col: int) -> Tuple[int, int]:
+    """Convert frontend (row, col) to backend (x, y) coordinates.
+    Frontend uses row=y, col=x convention.
+    Backend A* and agent positions use (x, y).
+    """
+    return (col, row)  # x=col, y=row
+
+
+def backend_to_frontend(x: int, y: int) -> Tuple[int, int]:
+    """Convert backend (x, y) to frontend (row, col) coordinates."""
+    return (y, x)  # row=y, col=x
+
+# Result fields kept with the job as its summary, e.g. for batch summary tables
+RESULT_SUMMARY_FIELDS = ("mode", "total_agents", "escaped_count", "burned_count", "time_steps")
+
+# Database helper functions
+def update_job_status(job_id: str, status: str, result: Dict = None, error: str = None):
+    # A result's spool or .bin file counts towards its size for retention
+    files_size = sum(os.path.getsize(path) for path in (history_spool_path(job_id), binary_result_path(job_id))
+                     if os.path.exists(path)) if result else 0
+    summary = {field: result[field] for field in RESULT_SUMMARY_FIELDS if field in result} if result else None
+    job_store.set_status(job_id, status, result=result, error=error, files_size=files_size, summary=summary)
+
+def binary_result_path(job_id: str) -> str:
+    return os.path.join(RESULTS_DIR, f"{job_id}.bin")
+
+def history_spool_path(job_id: str) -> str:
+    return os.path.join(RESULTS_DIR, f"{job_id}.frames.ndjson")
+
+def store_binary_result(job_id: str, result: Dict) -> Dict:
+    """Write the spooled animation of a result to its .bin file and return the remaining (small) JSON result."""
+    animation = result.pop("animation_data")
+    result.pop("commander_actions", None)
+    spool = history_spool_path(job_id)
+    data = encode_binary_result(
+        read_spool(spool),
+        ignition_raster_from_result(animation),
+        metadata={"job_id": job_id, "mode": result.get("mode"), "time_steps": result.get("time_steps")},
+        num_frames=animation["spooled_frames"]
+    )
+    path = binary_result_path(job_id)
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+    os.remove(spool)  # The .bin file holds the same frames
+    result["binary_result"] = {
+        "url": f"/api/result/{job_id}.bin",
+        "version": BINARY_RESULT_VERSION,
+        "size": len(data),
+        "frames": animation["spooled_frames"]
+    }
+    return result
+
+def grid_array(grid: Union[List[List[int]], PackedGrid]) -> np.ndarray:
+    """An inline grid as an array; raises ValueError for a packed grid that does not decode"""
+    if isinstance(grid, PackedGrid):
+        if grid.shape[0] * grid.shape[1] > MAX_GRID_CELLS:
+            raise ValueError(f"grid must have at most {MAX_GRID_CELLS} cells")
+        return decode_grid(grid.encoding, grid.shape, grid.data, grid.dtype)
+    return np.array(grid)
+
+def load_grid(config: BaseModel) -> np.ndarray:
+    """The grid of a simulation or ensemble config as an array, inline or from the grid store.
+    A stored grid is its read-only int8 memory map, not a copy; simulations only read the grid."""
+    if config.grid_id is None:
+        return grid_array(config.grid)
+    try:
+        return grid_store.load(config.grid_id)
+    except KeyError:
+        raise ValueError(f"Grid {config.grid_id} is no longer in the grid store")
+
+def distribute_exits_to_model(user_exits: List[Tuple[int, int]], grid: np.ndarray, total_model_exits: int = 248) -> List[Tuple[int, int]]:
+    """
+    Distribute 248 model exits across user-defined exit points.
+    
+    IMPORTANT: Input exits should be in (x, y) format (backend convention).
+    Frontend sends (row, col) which should be converted to (x, y) = (col, row) before calling.
+    
+    Example:
+    - 1 user exit -> all 248 model exits at that location (with small offsets)
+    - 2 user exits -> 124 exits each
+    - 3 user exits -> 83, 83, 82 exits
+    
+    Args:
+        user_exits: List of (x, y) tuples (backend format)
+        grid: The grid array (256x256) where 0=free, 1=wall
+        total_model_exits: Total exits needed for model (default 248)
+    
+    Returns:
+        List of 248 (x, y) exit coordinates distributed across user exits
+    """
+    if not user_exits:
+        # Fallback: auto-detect exits from grid edges
+        return auto_detect_exits(grid, total_model_exits)
+    
+    num_user_exits = len(user_exits)
+    exits_per_location = total_model_exits // num_user_exits
+    remainder = total_model_exits % num_user_exits
+    
+    distributed_exits = []
+    
+    for i, (exit_x, exit_y) in enumerate(user_exits):
+        # Calculate how many exits for this location
+        count = exits_per_location + (1 if i < remainder else 0)
+        
+        for j in range(count):
+            # Add small random offset to prevent stacking (±2 pixels in a circle pattern)
+            angle = (2 * np.pi * j) / count if count > 1 else 0
+            radius = min(2, j % 3)  # Vary radius 0, 1, 2
+            offset_x = int(radius * np.cos(angle))
+            offset_y = int(radius * np.sin(angle))
+            
+            new_x = exit_x + offset_x
+            new_y = exit_y + offset_y
+            
+            # Clamp to grid bounds
+            new_x = max(0, min(255, new_x))
+            new_y = max(0, min(255, new_y))
+            
+            # Validate it's on free space (grid uses [y][x] indexing!)
+            if 0 <= new_y < grid.shape[0] and 0 <= new_x < grid.shape[1]:
+                if grid[new_y][new_x] == 0:
+                    distributed_exits.append((new_x, new_y))
+                else:
+                    # Fallback to original user position
+                    distributed_exits.append((exit_x, exit_y))
+            else:
+                distributed_exits.append((exit_x, exit_y))
+    
+    # Ensure exactly total_model_exits
+    while len(distributed_exits) < total_model_exits:
+        distributed_exits.append(user_exits[0])  # Pad with first exit
+    
+    return distributed_exits[:total_model_exits]
+
+def auto_detect_exits(grid: np.ndarray, max_exits: int = 248) -> List[Tuple[int, int]]:
+    """Fallback: one exit per boundary opening, spread over the model's max_exits slots (cached per grid)"""
+    return list(grid_cache.get(grid, ("model_exits", max_exits),
+                               lambda g: capped_exits(detect_exits(g), max_exits)))
+
+
+
+
+# Background simulation runner
+def run_simulation_task(job_id: str, config: SimulationConfig, frame_sink=None):
+    """Run simulation in a job worker process, passing each frame to frame_sink"""
+    try:
+        # Convert grid to numpy array
+        grid = load_grid(config)
+        
+        # Convert frontend (row, col) coordinates to backend (x, y) format
+        # Frontend sends: (row, col) where row=y, col=x
+        # Backend expects: (x, y)
+        agent_positions_xy = [frontend_to_backend(row, col) for row, col in config.agent_positions]
+        fire_position_xy = frontend_to_backend(config.fire_position[0], config.fire_position[1])
+        
+        # Convert exit positions to (x, y) format if provided
+        if config.exits and len(config.exits) > 0:
+            exits_xy = [frontend_to_backend(row, col) for row, col in config.exits]
+            print(f"[JOB {job_id[:8]}] Converted {len(config.exits)} exits from (row,col) to (x,y) format", flush=True)
+            
+            # Validate exits - ensure they're on free cells, not walls, and not near agents
+            MIN_EXIT_AGENT_DISTANCE = 20  # Exits must be at least 20 cells from any agent
+            validated_exits = []
+            for ex in exits_xy:
+                ex_x, ex_y = int(ex[0]), int(ex[1])
+                if 0 <= ex_y < grid.shape[0] and 0 <= ex_x < grid.shape[1]:
+                    if grid[ex_y][ex_x] == 1:  # CELL_WALL
+                        print(f"[JOB {job_id[:8]}] WARNING: Exit ({ex_x}, {ex_y}) is on WALL, finding nearest free cell...", flush=True)
+                        # Search for nearest free cell that's not near agents
+                        new_pos = nearest_free_cell(grid, (ex_x, ex_y), avoid=agent_positions_xy,
+                                                    min_distance=MIN_EXIT_AGENT_DISTANCE)
+                        if new_pos is not None:
+                            print(f"[JOB {job_id[:8]}] Fixed exit: ({ex_x}, {ex_y}) -> {new_pos}", flush=True)
+                            validated_exits.append(new_pos)
+                    else:
+                        validated_exits.append((ex_x, ex_y))
+            
+            if len(validated_exits) > 0:
+                exits_xy = validated_exits
+                print(f"[JOB {job_id[:8]}] Using {len(exits_xy)} validated exits", flush=True)
+            else:
+                exits_xy = None
+                print(f"[JOB {job_id[:8]}] No valid exits found, will auto-detect", flush=True)
+        else:
+            exits_xy = None
+        
+        print(f"[JOB {job_id[:8]}] Fire position: frontend={config.fire_position} -> backend={fire_position_xy}", flush=True)
+        print(f"[JOB {job_id[:8]}] Agent positions converted: {len(agent_positions_xy)} agents", flush=True)
+        
+        # Binary results are built from per-frame agents plus the ignition raster
+        if config.result_format == "binary":
+            history_format, raster_encoding = "ignition_raster", "base64"
+        else:
+            history_format, raster_encoding = config.history_format, config.raster_encoding
+        
+        # Choose simulation mode based on config
+        num_agents = len(agent_positions_xy)
+        use_heuristic = not config.use_rl or num_agents > 10 or ppo_model is None
+        
+        if use_heuristic:
+            print(f"[JOB {job_id[:8]}] Using HEURISTIC mode (agents={num_agents}, use_rl={config.use_rl})", flush=True)
+            result = run_heuristic_simulation(
+                grid=grid,
+                agent_positions=agent_positions_xy,
+                fire_position=fire_position_xy,
+                exits=exits_xy,
+                max_steps=500,
+                extended_fire_steps=config.extended_fire_steps,
+                assembly_point=frontend_to_backend(config.assembly_point[0], config.assembly_point[1]) if config.assembly_point else None,
+                navigation=config.navigation,
+                replan_policy=config.replan_policy,
+                agent_engine=config.agent_engine,
+                history_format=history_format,
+                raster_encoding=raster_encoding,
+                keyframe_interval=config.keyframe_interval,
+                frame_sink=frame_sink,
+                spool_path=history_spool_path(job_id),
+                seed=config.seed
+            )
+            if config.result_format == "binary":
+                result = store_binary_result(job_id, result)
+            update_job_status(job_id, "complete", result=result)
+            gc.collect()
+            return
+        
+        # RL Mode: Distribute user exits to 248 model exits
+        if exits_xy and len(exits_xy) > 0:
+            distributed_exits = distribute_exits_to_model(exits_xy, grid, total_model_exits=248)
+            print(f"[JOB {job_id[:8]}] Distributed {len(exits_xy)} user exits -> 248 model exits", flush=True)
+        else:
+            distributed_exits = auto_detect_exits(grid, max_exits=248)
+            print(f"[JOB {job_id[:8]}] Auto-detected {len(distributed_exits)} exits from grid boundaries", flush=True)
+        
+        # Create environment
+        env = EvacuationEnv(
+            grid=grid,
+            num_agents=len(agent_positions_xy),
+            max_steps=500,
+            agent_start_positions=agent_positions_xy,
+            fire_start_position=fire_position_xy,
+            exits=distributed_exits,  # Use distributed exits
+            max_agents=10,  # Zero-padding for 500k_steps model compatibility
+            navigation=config.navigation,
+            replan_policy=config.replan_policy,
+            # RL runs have at most 10 agents; the population engine only applies to heuristic runs
+            agent_engine="compact" if config.agent_engine == "compact" else "person"
+        )
+        
+        # Run simulation
+        obs, _ = env.reset(seed=config.seed)
+        terminated, truncated = False, False
+        recorder = FrameRecorder(env.fire_sim, history_format, raster_encoding, config.keyframe_interval,
+                                 frame_sink, history_spool_path(job_id))
+        step_count = 0
+        max_steps = 500
+        
+        print(f"[JOB {job_id[:8]}] Starting RL simulation: {len(agent_positions_xy)} agents, {len(env.exits)} exits", flush=True)
+        
+        while not terminated and not truncated and step_count < max_steps:
+            if USE_MASKABLE_PPO:
+                # For MaskablePPO, action_mask must match training dimensions (248)
+                num_exits = len(env.exits) if env.exits else 248
+                action_mask = np.zeros((1, 248), dtype=np.int8)  # Shape: [1, 248] for batch size 1
+                action_mask[0, :num_exits] = 1  # Only enable actual exits
+                action, _ = ppo_model.predict(obs, action_masks=action_mask, deterministic=True)
+            else:
+                # For standard PPO v1.5
+                action, _ = ppo_model.predict(obs, deterministic=True)
+                # Apply modulo guard for v1.5 fixed action space
+                action = int(action) % len(env.exits)
+            
+            obs, _, terminated, truncated, _ = env.step(int(action))
+            step_count += 1
+            
+            # Log progress every 50 steps
+            if step_count % 50 == 0:
+                active = sum(1 for a in env.agents if a.status == 'evacuating')
+                escaped = sum(1 for a in env.agents if a.status == 'escaped')
+                burned = sum(1 for a in env.agents if a.status == 'burned')
+                print(f"[JOB {job_id[:8]}] Step {step_count}/{max_steps}: {active} active, {escaped} escaped, {burned} burned", flush=True)
+            
+            # Store frame data (agent positions converted to [row,col] for frontend)
+            agents_data = []
+            for agent in env.agents:
+                # Convert agent position from (x,y) to [row,col] for frontend
+                agent_pos_frontend = [agent.pos[1], agent.pos[0]]  # [y, x] = [row, col]
+                agents_data.append({
+                    "pos": agent_pos_frontend,
+                    "status": agent.status,
+                    "state": agent.state,
+                    "tripped": agent.tripped_timer > 0
+                })
+            
+            recorder.record(agents_data)
+        
+        # Extended fire steps: continue fire spread after all agents are done
+        # Also move escaped agents to assembly point if provided
+        assembly_point_xy = frontend_to_backend(config.assembly_point[0], config.assembly_point[1]) if config.assembly_point else None
+        
+        if config.extended_fire_steps != 0:
+            if config.extended_fire_steps == -1:
+                # Burn until complete - continue fire until no more cells can burn
+                print(f"[JOB {job_id[:8]}] Burn until complete mode - spreading fire until fully consumed", flush=True)
+                assembly_router = None
+                if assembly_point_xy:
+                    print(f"[JOB {job_id[:8]}] Assembly point: {assembly_point_xy} - agents will move there after escaping", flush=True)
+                    assembly_router = AssemblyRouter(grid, assembly_point_xy, env.fire_sim.fire_map)
+                
+                max_burn_steps = 2000  # Safety limit
+                burn_step = 0
+                while burn_step < max_burn_steps:
+                    env.fire_sim.step()
+                    
+                    # Move escaped agents toward assembly point
+                    if assembly_point_xy:
+                        assembly_router.update(env.fire_sim.last_ignited)
+                        for agent in env.agents:
+                            if agent.status == 'escaped':
+                                agent.move_to_assembly(grid, assembly_point_xy, env.fire_sim.fire_map, assembly_router,
+                                                       rng=env.rng)
+                                agent.check_status(env.fire_sim.fire_map, env.exits, assembly_point=assembly_point_xy)
+                    
+                    agents_data = []
+                    for agent in env.agents:
+                        agent_pos_frontend = [agent.pos[1], agent.pos[0]]
+                        agents_data.append({
+                            "pos": agent_pos_frontend,
+                            "status": agent.status,
+                            "state": agent.state,
+                            "tripped": False
+                        })
+                    recorder.record(agents_data)
+                    
+                    burn_step += 1
+                    
+                    # Check if done: fire stopped AND all agents at assembly (or no assembly)
+                    fire_stopped = env.fire_sim.frontier_empty
+                    if assembly_point_xy:
+                        all_at_assembly = all(a.status in ['at_assembly', 'burned'] for a in env.agents)
+                        if fire_stopped and all_at_assembly:
+                            print(f"[JOB {job_id[:8]}] Fire fully spread and all agents at assembly after {burn_step} extra steps", flush=True)
+                            break
+                        elif fire_stopped:
+                            # Fire stopped but agents still moving to assembly - continue
+                            pass
+                    elif fire_stopped:
+                        print(f"[JOB {job_id[:8]}] Fire fully spread after {burn_step} extra steps", flush=True)
+                        break
+            else:
+                # Fixed number of extended steps
+                print(f"[JOB {job_id[:8]}] Running {config.extended_fire_steps} extended fire steps...", flush=True)
+                for extra_step in range(config.extended_fire_steps):
+                    env.fire_sim.step()
+                    # Keep last agent positions frozen
+                    agents_data = []
+                    for agent in env.agents:
+                        agent_pos_frontend = [agent.pos[1], agent.pos[0]]
+                        agents_data.append({
+                            "pos": agent_pos_frontend,
+                            "status": agent.status,
+                            "state": agent.state,
+                            "tripped": False
+                        })
+                    recorder.record(agents_data)
+        
+        # Calculate final statistics
+        # Count both 'escaped' and 'at_assembly' as successfully evacuated
+        escaped = sum(1 for agent in env.agents if agent.status in ["escaped", "at_assembly"])
+        burned = sum(1 for agent in env.agents if agent.status == "burned")
+        total_agents = len(env.agents)
+        
+        print(f"[JOB {job_id[:8]}] Simulation complete at step {step_count}: {escaped}/{total_agents} escaped, {burned} burned", flush=True)
+        
+        # Prepare agent results with detailed information
+        agent_results = []
+        for i, agent in enumerate(env.agents):
+            # Normalize status for frontend (at_assembly counts as escaped)
+            final_status = "escaped" if agent.status in ["escaped", "at_assembly"] else agent.status
+            agent_results.append({
+                "agent_id": i,
+                "status": final_status,
+                "exit_time": agent.escape_time if hasattr(agent, 'escape_time') and agent.status in ["escaped", "at_assembly"] else None,
+                "path_length": agent.steps_taken if hasattr(agent, 'steps_taken') else step_count
+            })
+        
+        # Convert exits to frontend format [row, col] for visualization
+        exits_frontend = [[y, x] for x, y in (exits_xy if exits_xy else [])]
+        
+        # Convert assembly point to frontend format if provided
+        assembly_point_frontend = None
+        if config.assembly_point:
+            assembly_point_frontend = [config.assembly_point[0], config.assembly_point[1]]  # Already in (row, col)
+        
+        # Prepare result with correct structure for frontend
+        result = {
+            "total_agents": total_agents,
+            "escaped_count": escaped,
+            "burned_count": burned,
+            "time_steps": step_count,
+            "agent_results": agent_results,
+            "exits": exits_frontend,  # Include exits for visualization
+            "assembly_point": assembly_point_frontend,  # Include assembly point
+            "commander_actions": recorder.history[:100],  # Limit to first 100 actions
+            "animation_data": recorder.animation_data(),
+            "mode": "rl"
+        }
+        if config.result_format == "binary":
+            result = store_binary_result(job_id, result)
+        
+        # Update job status to complete
+        update_job_status(job_id, "complete", result=result)
+        
+        # Clean up memory after simulation
+        del env
+        del recorder
+        del grid
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        
+    except Exception as e:
+        # Update job status to failed
+        print(f"[JOB {job_id[:8]}] FAILED with error: {str(e)}", flush=True)
+        import traceback
+        traceback.print_exc()
+        update_job_status(job_id, "failed", error=str(e))
+        # Clean up on error too
+        if os.path.exists(history_spool_path(job_id)):
+            os.remove(history_spool_path(job_id))
+        gc.collect()
+
+# Background fire ensemble runner
+def run_ensemble_task(job_id: str, config: EnsembleConfig):
+    """Run Monte Carlo fire ensemble in background"""
+    try:
+        grid = load_grid(config)
+        fire_position_xy = frontend_to_backend(config.fire_position[0], config.fire_position[1])
+        print(f"[JOB {job_id[:8]}] Starting fire ensemble: {config.num_realizations} realizations, fire at {fire_position_xy}", flush=True)
+        
+        result = run_fire_ensemble(
+            grid,
+            fire_position_xy,
+            num_realizations=config.num_realizations,
+            max_steps=config.max_steps,
+            percentiles=config.percentiles,
+            seed=config.seed
+        )
+        result["mode"] = "ensemble"
+        
+        print(f"[JOB {job_id[:8]}] Ensemble complete: mean burned area {result['final_burned_area']['mean']:.0f} cells", flush=True)
+        update_job_status(job_id, "complete", result=result)
+        del grid
+        gc.collect()
+    
+    except Exception as e:
+        print(f"[JOB {job_id[:8]}] Ensemble FAILED with error: {str(e)}", flush=True)
+        import traceback
+        traceback.print_exc()
+        update_job_status(job_id, "failed", error=str(e))
+        gc.collect()
@@ -0,0 +1,131 @@
+import json
+import threading
+from collections import deque
+from itertools import islice
+
+import numpy as np
+
+from binary_result import ignition_raster_from_result
+
+DEFAULT_CAPACITY = 256  # Frames kept for subscribers that lag behind
+
+
+class FrameStream:
+    """
+    Frames of a running job, published as they are recorded and read by any number
+    of live subscribers.
+
+    Only a window of the most recent frames is kept. publish() never waits: it is
+    called from the job executor's relay thread, which also enforces time limits and
+    cancellation. When the window is full the oldest frame is dropped, and a
+    subscriber that had not read it yet is told about the gap. Subscribers start at
+    any frame index, which is how clients resume.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.done = False
+        self._frames = deque()
+        self._first = 0  # Frame index of self._frames[0]
+        self._cursors = {}  # Subscriber id -> index of the next frame it reads
+        self._next_subscriber = 0
+        self._cond = threading.Condition()
+
+    @property
+    def frame_count(self):
+        return self._first + len(self._frames)
+
+    @property
+    def first_frame(self):
+        """Index of the oldest frame still in the window."""
+        return self._first
+
+    def has_subscribers(self):
+        """Whether anyone is reading; the job only sends frames while this is True."""
+        return bool(self._cursors)
+
+    def publish(self, index, frame):
+        """
+        Append frame number index. Frames before it that were never published (the
+        job skips frames while nobody subscribes) leave a gap.
+        """
+        with self._cond:
+            if index > self.frame_count:
+                self._frames.clear()  # The window holds consecutive frames only
+                self._first = index
+            if len(self._frames) >= self.capacity:
+                self._frames.popleft()
+                self._first += 1
+            self._frames.append(frame)
+            self._cond.notify_all()
+
+    def close(self):
+        """Mark the stream as finished; readers drain what is left and stop."""
+        with self._cond:
+            self.done = True
+            self._cond.notify_all()
+
+    def subscribe(self, from_frame=0):
+        with self._cond:
+            subscriber = self._next_subscriber
+            self._next_subscriber += 1
+            self._cursors[subscriber] = max(0, from_frame)
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._cond:
+            self._cursors.pop(subscriber, None)
+            self._cond.notify_all()
+
+    def read(self, subscriber, max_frames, timeout):
+        """
+        Wait up to timeout seconds for frames past the subscriber's cursor.
+
+        Returns:
+            (start index, frames, skipped, finished): skipped is the number of frames
+            that left the window before the subscriber read them, finished is True once
+            the stream is closed and the subscriber has read everything
+        """
+        with self._cond:
+            if self._cursors[subscriber] >= self.frame_count and not self.done:
+                self._cond.wait(timeout)
+            cursor = self._cursors[subscriber]
+            skipped = max(0, self._first - cursor)
+            cursor += skipped
+            frames = list(islice(self._frames, cursor - self._first, cursor - self._first + max_frames))
+            self._cursors[subscriber] = cursor + len(frames)
+            finished = self.done and self._cursors[subscriber] >= self.frame_count
+            return cursor, frames, skipped, finished
+
+
+def replay_frames(animation_data, history, from_frame=0):
+    """
+    The frames of a finished result as a live stream sends them, starting at from_frame.
+
+    Args:
+        animation_data: The result's animation_data
+        history: Its frames from the first on, as a list or a read_spool() iterator
+
+    'ignition_raster' results are split back into the cells each frame ignited.
+    """
+    frames = islice(history, from_frame, None)
+    if animation_data.get("format") != "ignition_raster":
+        yield from frames
+        return
+    flat = ignition_raster_from_result(animation_data).ravel()
+    order = np.argsort(flat, kind="stable")  # Row-major within each frame
+    steps = flat[order]
+    cols = animation_data["grid_shape"][1]
+    for index, frame in enumerate(frames, from_frame):
+        start, end = np.searchsorted(steps, (index, index + 1))
+        rows, columns = np.divmod(order[start:end], cols)
+        yield {"ignited": np.stack((rows, columns), axis=1).tolist(), "agents": frame["agents"]}
+
+
+def format_sse(event, data, event_id=None):
+    """One Server-Sent Events message."""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
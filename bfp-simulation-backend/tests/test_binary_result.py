@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from binary_result import decode_binary_result, encode_binary_result, parse_byte_range
+from population import STATE_NAMES, STATUS_NAMES
+
+
+def agent(row, col, status, state, tripped=False):
+    return {"pos": [row, col], "status": status, "state": state, "tripped": tripped}
+
+
+def test_round_trip():
+    history = [
+        {"agents": [agent(1, 2, STATUS_NAMES[0], STATE_NAMES[0]), agent(3, 4, STATUS_NAMES[0], STATE_NAMES[0])]},
+        {"agents": [agent(1, 3, STATUS_NAMES[1], STATE_NAMES[1], True), agent(4, 4, STATUS_NAMES[0], STATE_NAMES[0])]},
+    ]
+    ignition_step = np.full((5, 6), -1, dtype=np.int16)
+    ignition_step[2, 3] = 0
+    ignition_step[2, 4] = 1
+
+    header, arrays = decode_binary_result(encode_binary_result(history, ignition_step, metadata={"steps": 2}))
+
+    assert header["metadata"] == {"steps": 2}
+    assert header["status_names"] == list(STATUS_NAMES)
+    assert header["state_names"] == list(STATE_NAMES)
+    assert arrays["positions"].tolist() == [[[1, 2], [3, 4]], [[1, 3], [4, 4]]]
+    assert arrays["status"].tolist() == [[0, 0], [1, 0]]
+    assert arrays["state"].tolist() == [[0, 0], [1, 0]]
+    assert arrays["tripped"].tolist() == [[0, 0], [1, 0]]
+    np.testing.assert_array_equal(arrays["ignition_step"], ignition_step)
+
+
+def test_round_trip_from_an_iterator():
+    history = ({"agents": [agent(t, t, STATUS_NAMES[0], STATE_NAMES[0])]} for t in range(3))
+    _, arrays = decode_binary_result(encode_binary_result(history, np.zeros((2, 2)), num_frames=3))
+    assert arrays["positions"].tolist() == [[[0, 0]], [[1, 1]], [[2, 2]]]
+
+
+def test_empty_history():
+    _, arrays = decode_binary_result(encode_binary_result([], np.zeros((2, 2))))
+    assert arrays["positions"].shape == (0, 0, 2)
+
+
+def test_other_data_is_rejected():
+    with pytest.raises(ValueError, match="Not a binary simulation result"):
+        decode_binary_result(b"PK\x03\x04" + bytes(16))
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=5-", (5, 9)),
+    ("bytes=-3", (7, 9)),
+    ("bytes=-50", (0, 9)),
+    ("bytes=8-100", (8, 9)),
+    (" bytes = 2-4", (2, 4)),
+])
+def test_satisfiable_ranges(header, expected):
+    assert parse_byte_range(header, 10) == expected
+
+
+@pytest.mark.parametrize("header", [
+    None,
+    "",
+    "items=0-4",
+    "bytes=0-1,4-5",
+    "bytes=a-b",
+    "bytes=1-x",
+    "bytes=-",
+    "bytes=4",
+    "bytes=+1-2",
+    "bytes=5-3",
+])
+def test_malformed_ranges_give_the_whole_body(header):
+    assert parse_byte_range(header, 10) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=10-", "bytes=10-12", "bytes=-0"])
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(ValueError, match="not satisfiable"):
+        parse_byte_range(header, 10)
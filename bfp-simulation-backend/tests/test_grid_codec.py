@@ -0,0 +1,79 @@
+import base64
+
+import numpy as np
+import pytest
+
+from grid_codec import RUN_DTYPE, decode_grid, decode_runs, encode_grid, encode_runs
+
+
+def sample_grid():
+    grid = np.zeros((6, 9), dtype=np.uint8)
+    grid[0, :] = 1
+    grid[2:5, 3] = 2
+    grid[5, 7:] = 3
+    return grid
+
+
+@pytest.mark.parametrize("encoding", ["base64", "rle"])
+def test_encoded_grid_decodes_to_the_same_cells(encoding):
+    grid = sample_grid()
+    packed = encode_grid(grid, encoding)
+    decoded = decode_grid(packed["encoding"], packed["shape"], packed["data"], packed["dtype"])
+    assert decoded.dtype == np.uint8
+    np.testing.assert_array_equal(decoded, grid)
+
+
+def test_runs_merge_equal_neighbours_across_rows():
+    cells = np.array([[4, 4], [4, 1]], dtype=np.uint8)
+    runs = np.frombuffer(encode_runs(cells), dtype=RUN_DTYPE)
+    assert runs["value"].tolist() == [4, 1]
+    assert runs["length"].tolist() == [3, 1]
+    np.testing.assert_array_equal(decode_runs(encode_runs(cells), 4), cells.ravel())
+
+
+def test_runs_of_an_empty_grid_are_empty():
+    assert encode_runs(np.zeros((0, 3), dtype=np.uint8)) == b""
+
+
+def test_partial_run_is_rejected():
+    data = encode_runs(sample_grid())
+    with pytest.raises(ValueError, match="whole number"):
+        decode_runs(data[:-1], sample_grid().size)
+
+
+@pytest.mark.parametrize("size", [53, 55])
+def test_runs_must_cover_the_grid_exactly(size):
+    with pytest.raises(ValueError, match="RLE runs cover 54 cells"):
+        decode_runs(encode_runs(sample_grid()), size)
+
+
+def test_zero_length_run_is_rejected():
+    runs = np.array([(1, 4), (2, 0)], dtype=RUN_DTYPE)
+    with pytest.raises(ValueError):
+        decode_runs(runs.tobytes(), 4)
+
+
+def test_base64_length_must_match_shape():
+    data = base64.b64encode(bytes(10)).decode("ascii")
+    with pytest.raises(ValueError, match="Expected 12 bytes"):
+        decode_grid("base64", [3, 4], data)
+
+
+def test_invalid_base64_is_rejected():
+    with pytest.raises(ValueError, match="not valid base64"):
+        decode_grid("base64", [1, 2], "AA*=")
+
+
+@pytest.mark.parametrize("encoding, shape, dtype", [
+    ("json", [1, 1], "uint8"),
+    ("base64", [1, 1], "int16"),
+    ("base64", [0, 4], "uint8"),
+])
+def test_unsupported_fields_are_rejected(encoding, shape, dtype):
+    with pytest.raises(ValueError):
+        decode_grid(encoding, shape, "AA==", dtype)
+
+
+def test_unknown_encoding_cannot_be_encoded():
+    with pytest.raises(ValueError, match="grid encoding must be one of"):
+        encode_grid(sample_grid(), "png")
@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+
+from job_store import JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    store.init()
+    return store
+
+
+def test_cached_job_follows_the_job_status(store):
+    assert store.cached_job("key") is None
+    store.set_status("job-1", "processing")
+    store.set_cached_job("key", "job-1")
+    assert store.cached_job("key") == ("job-1", "processing")
+    store.set_status("job-1", "complete", result={"steps": 3})
+    assert store.cached_job("key") == ("job-1", "complete")
+    store.set_status("job-1", "failed", error="boom")
+    assert store.cached_job("key") is None
+
+
+def test_newer_job_replaces_the_cached_one(store):
+    for job_id in ("job-1", "job-2"):
+        store.set_status(job_id, "complete", result={"job": job_id})
+        store.set_cached_job("key", job_id)
+    assert store.cached_job("key") == ("job-2", "complete")
+    assert store.cache_entries() == 1
+
+
+def test_restart_fails_processing_jobs_and_drops_their_entries(store):
+    store.set_status("running", "processing")
+    store.set_cached_job("running-key", "running")
+    store.set_status("done", "complete", result={"steps": 1})
+    store.set_cached_job("done-key", "done")
+
+    assert store.fail_processing_jobs("Server restarted") == 1
+
+    assert store.cached_job("running-key") is None
+    assert store.get("running", include_result=False)["status"] == "failed"
+    assert store.cached_job("done-key") == ("done", "complete")
+
+
+def test_late_cancel_keeps_a_stored_result(store):
+    store.set_status("job-1", "complete", result={"steps": 3})
+    assert not store.end_processing_job("job-1", "cancelled", "Job cancelled")
+    assert store.get("job-1", include_result=False)["status"] == "complete"
+
+
+class FakeExecutor:
+    def __init__(self, job_ids=()):
+        self.job_ids = set(job_ids)
+
+    def has_job(self, job_id):
+        return job_id in self.job_ids
+
+
+@pytest.fixture
+def server(store, monkeypatch):
+    """main with its job store replaced by store; skipped without the server's dependencies."""
+    main = pytest.importorskip("main")
+    monkeypatch.setattr(main, "job_store", store)
+    monkeypatch.setattr(main, "result_cache_counters", {"hits": 0, "misses": 0})
+    return main
+
+
+def simulation_config(main, grid, **options):
+    return main.SimulationConfig(grid=grid, fire_position=(1, 1), agent_positions=[(2, 2)], seed=7, **options)
+
+
+def test_seeded_request_hits_after_a_miss(server):
+    grid = np.zeros((4, 4), dtype=np.uint8)
+    key = server.result_cache_key("simulation", simulation_config(server, grid.tolist()), grid)
+
+    assert server.cached_job_id(key, FakeExecutor()) is None
+    server.job_store.set_status("job-1", "complete", result={"steps": 3})
+    server.job_store.set_cached_job(key, "job-1")
+    assert server.cached_job_id(key, FakeExecutor()) == "job-1"
+    assert server.result_cache_counters == {"hits": 1, "misses": 1}
+
+
+def test_unseeded_request_is_not_counted(server):
+    assert server.cached_job_id(None, FakeExecutor()) is None
+    assert server.result_cache_counters == {"hits": 0, "misses": 0}
+
+
+def test_processing_job_only_hits_while_the_executor_has_it(server):
+    grid = np.zeros((4, 4), dtype=np.uint8)
+    key = server.result_cache_key("simulation", simulation_config(server, grid.tolist()), grid)
+    server.job_store.set_status("job-1", "processing")
+    server.job_store.set_cached_job(key, "job-1")
+
+    assert server.cached_job_id(key, FakeExecutor()) is None
+    assert server.cached_job_id(key, FakeExecutor(["job-1"])) == "job-1"
+
+
+def test_cache_key_depends_on_grid_content_and_options(server):
+    grid = np.zeros((4, 4), dtype=np.uint8)
+    other = grid.copy()
+    other[0, 0] = 1
+    config = simulation_config(server, grid.tolist())
+    key = server.result_cache_key("simulation", config, grid)
+
+    by_id = simulation_config(server, None).model_copy(update={"grid_id": server.grid_id(grid)})
+    assert server.result_cache_key("simulation", by_id) == key
+    assert server.result_cache_key("simulation", config, other) != key
+    assert server.result_cache_key("simulation", simulation_config(server, grid.tolist(), navigation="field"),
+                                   grid) != key
+    assert server.result_cache_key("ensemble", config, grid) != key